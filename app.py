@@ -1,10 +1,10 @@
 import streamlit as st
-import torch
 import os
+import threading
 from PIL import Image
 import time
-from vsams.models.classifier import SurfaceClassifier
-from vsams.utils.db_handler import query_recommendation, load_db, save_db
+from vsams.prediction_cache import PredictionCache, content_hash, model_fingerprint
+from vsams.utils.db_handler import query_recommendation, rank_recommendations, recommend_from_neighbors, load_db, upsert_product
 
 # ... (Existing Language Dict - omitted for brevity in replacement, but I need to make sure I don't delete it.
 # Actually, I should probably append the Admin strings to the dictionary first or handle it inline if it's easier.
@@ -18,23 +18,59 @@ st.set_page_config(
     layout="wide"
 )
 
-# Load Model (Cached)
-# Load Model (Cached)
-@st.cache_resource
-def load_model():
+# --- Model Loading (Background) ---
+# torch / timm / torchvision은 사용자 데모 모드에서만, 백그라운드 스레드에서 import됩니다.
+# 관리자(DB) 모드는 torch를 전혀 import하지 않으며, 사용자 모드도 모델 로딩 중에 UI를 먼저 표시합니다.
+# 백그라운드 스레드에서는 st.* 호출이 화면에 표시되지 않으므로 경고는 모아서 메인 스레드에서 출력합니다.
+def load_model(warnings):
+    import torch
+    from vsams.inference import get_device
+    from vsams.quantization import QUANTIZED_PATH, load_quantized
+    from vsams.export import EXPORTED_PATH
+    from vsams.checkpoint import check_compatible
+    from vsams.runtime import load_exported
+
     checkpoint_path = 'checkpoints/v_sams_model.pth'
-    model = SurfaceClassifier(num_materials=6, num_finishes=7)
+    
+    # GPU가 없는 현장 PC에서는 INT8 양자화 모델(python -m vsams.quantization)을 우선 사용
+    # 재학습 후 다시 양자화하지 않은 INT8 모델은 이전 가중치이므로 사용하지 않음 (TorchScript와 같은 기준)
+    int8_stale = (os.path.exists(QUANTIZED_PATH) and os.path.exists(checkpoint_path)
+                  and os.path.getmtime(QUANTIZED_PATH) < os.path.getmtime(checkpoint_path))
+    if int8_stale and get_device().type == "cpu":
+        warnings.append("INT8 모델이 체크포인트보다 오래되어 FP32 모델을 사용합니다. "
+                        "python -m vsams.quantization 으로 다시 생성하세요.")
+    if os.path.exists(QUANTIZED_PATH) and not int8_stale and get_device().type == "cpu":
+        try:
+            # INT8/TorchScript 모델은 체크포인트에서 만들어지므로 체크포인트 메타데이터로 클래스 구성을 확인
+            if os.path.exists(checkpoint_path):
+                check_compatible(checkpoint_path)
+            model = load_quantized(QUANTIZED_PATH)
+            return model, "INT8 양자화 모델 가동 중 (분석 장치: cpu)", "real"
+        except Exception as e:
+            warnings.append(f"INT8 모델 로드 실패, FP32 모델로 전환합니다: {e}")
+    
+    # Export된 TorchScript 모델(python -m vsams.export)이 최신이면 timm 없이 바로 로드
+    if os.path.exists(EXPORTED_PATH) and (not os.path.exists(checkpoint_path) or os.path.getmtime(EXPORTED_PATH) >= os.path.getmtime(checkpoint_path)):
+        try:
+            if os.path.exists(checkpoint_path):
+                check_compatible(checkpoint_path)
+            device = get_device()
+            model = load_exported(EXPORTED_PATH, device=device)
+            return model, f"실제 AI 모델 가동 중 (TorchScript, 분석 장치: {device})", "real"
+        except Exception as e:
+            warnings.append(f"TorchScript 모델 로드 실패, 체크포인트로 전환합니다: {e}")
+    
+    from vsams.models.classifier import SurfaceClassifier
+    model = SurfaceClassifier(num_materials=6, num_finishes=7, pretrained=not os.path.exists(checkpoint_path))
     
     msg = ""
     status = "mock"
     
     if os.path.exists(checkpoint_path):
         try:
-            # MacBook Pro M2 Pro (Apple Silicon) MPS 가동
-            if torch.backends.mps.is_available():
-                device = torch.device("mps")
-            else:
-                device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+            device = get_device()
+            # 메타데이터(checkpoints/v_sams_model.json)로 클래스 구성이 맞는지 먼저 확인
+            check_compatible(checkpoint_path)
             state_dict = torch.load(checkpoint_path, map_location=device)
             model.load_state_dict(state_dict)
             model.to(device)
@@ -50,51 +86,138 @@ def load_model():
     model.eval()
     return model, msg, status
 
-model_obj, load_msg, load_status = load_model()
+def load_predictor(model):
+    from vsams.inference import BatchPredictor
+    from vsams.preprocess import PreprocessPool
 
-# UI 상단에 로드 상태 표시
-if load_status == "real":
-    st.toast(load_msg)
-elif load_status == "mock":
-    st.toast(load_msg)
-else:
-    st.error(load_msg)
+    # 추론 정밀도 모드 (fp32 / bf16 / channels_last / bf16+channels_last)
+    # 디코딩/리사이즈는 전처리 풀에서 수행 (JPEG는 축소 디코딩)
+    pool = PreprocessPool(size=224, workers=int(os.environ.get("VSAMS_DECODE_WORKERS", "0")) or None)
+    return BatchPredictor(model, batch_size=16, precision=os.environ.get("VSAMS_PRECISION", "fp32"), preprocess_pool=pool)
+
+def load_feature_index(warnings, index_dir=os.path.join("dataset", "feature_index")):
+    from vsams.feature_index import FeatureIndex
+
+    # python -m vsams.feature_index 로 생성된 유사 표면 검색 인덱스 (없으면 None)
+    if not os.path.exists(os.path.join(index_dir, "meta.json")):
+        return None
+    index = FeatureIndex.load(index_dir)
+    # 재학습 전 모델로 만든 벡터는 현재 모델의 특징과 비교할 수 없으므로 사용하지 않음
+    if index.model_id != model_fingerprint(['checkpoints/v_sams_model.pth']):
+        warnings.append("유사 표면 인덱스가 현재 모델과 맞지 않아 사용하지 않습니다. "
+                        "python -m vsams.feature_index 로 다시 생성하세요.")
+        return None
+    return index
+
+def load_prediction_cache():
+    from vsams.quantization import QUANTIZED_PATH
+    from vsams.export import EXPORTED_PATH
+
+    # 같은 사진을 다시 올리거나 위젯 클릭으로 rerun될 때 추론을 건너뜀 (이미지 내용 + 모델 해시 기준)
+    model_id = model_fingerprint([QUANTIZED_PATH, EXPORTED_PATH, 'checkpoints/v_sams_model.pth'])
+    return PredictionCache(
+        model_id,
+        max_items=int(os.environ.get("VSAMS_CACHE_ITEMS", "256")),
+        disk_dir=os.environ.get("VSAMS_CACHE_DIR") or None,
+        max_disk_mb=float(os.environ.get("VSAMS_CACHE_MB", "512")),
+    )
+
+def load_inference_stack():
+    import torch
+
+    warnings = []
+    model, msg, status = load_model(warnings)
+    predictor = load_predictor(model)
+    if status == "real":
+        # 첫 추론의 메모리 할당/커널 선택 비용을 첫 업로드 전에 미리 처리 (warm-up)
+        predictor.forward_probs(torch.zeros(1, 3, 224, 224))
+    return {
+        "model": model,
+        "msg": msg,
+        "status": status,
+        "warnings": warnings,
+        "predictor": predictor,
+        "feature_index": load_feature_index(warnings),
+        "prediction_cache": load_prediction_cache(),
+    }
+
+class BackgroundLoader:
+    """
+    Runs fn once on a daemon thread; get() blocks until it has finished.
+    """
+    def __init__(self, fn):
+        self.result = None
+        self.error = None
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(fn,), name="vsams-model-loader", daemon=True)
+        self._thread.start()
+
+    def _run(self, fn):
+        try:
+            self.result = fn()
+        except Exception as e:
+            self.error = e
+        finally:
+            self._done.set()
+
+    def ready(self):
+        return self._done.is_set()
+
+    def get(self, timeout=None):
+        self._done.wait(timeout)
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+@st.cache_resource
+def start_model_loading():
+    # 서버 프로세스당 한 번만 시작되며, 모든 세션이 같은 로더를 공유
+    return BackgroundLoader(load_inference_stack)
+
+# 모델 로딩이 끝나기 전에는 아래 값들이 비어 있으며, 분석 직전에 use_inference_stack()으로 채워짐
+predictor = None
+feature_index = None
+prediction_cache = None
+load_status = "loading"
+
+def use_inference_stack(stack):
+    global predictor, feature_index, prediction_cache, load_status
+    predictor = stack["predictor"]
+    feature_index = stack["feature_index"]
+    prediction_cache = stack["prediction_cache"]
+    load_status = stack["status"]
+
+def show_load_status(stack):
+    # UI 상단에 로드 상태 표시
+    for warning in stack["warnings"]:
+        st.warning(warning)
+    if stack["status"] == "real":
+        st.toast(stack["msg"])
+    elif stack["status"] == "mock":
+        st.toast(stack["msg"])
+    else:
+        st.error(stack["msg"])
 
 # --- Prediction Logic ---
-def predict(image, image_name):
+def predict(image, image_name, tiled=False, image_bytes=None):
     """
     학습된 모델이 있으면 실제 추론을 수행하고, 없으면 시뮬레이션 엔진을 가동합니다.
+    tiled=True이면 원본 해상도에서 224 패치 단위로 분석하여 미세 텍스처를 보존합니다.
+    image_bytes가 주어지면 예측 캐시를 사용합니다.
     """
     if load_status == "real":
-        from torchvision import transforms
-        preprocess = transforms.Compose([
-            transforms.Resize((224, 224)),
-            transforms.ToTensor(),
-            transforms.Normalize(mean=(0.485, 0.456, 0.406), std=(0.229, 0.224, 0.225)),
-        ])
-        
-        device = next(model_obj.parameters()).device
-        input_tensor = preprocess(image).unsqueeze(0).to(device)
-        
-        with torch.no_grad():
-            mat_logits, fin_logits = model_obj(input_tensor)
-            mat_probs = torch.softmax(mat_logits, dim=1)[0]
-            fin_probs = torch.softmax(fin_logits, dim=1)[0]
-            
-        MATERIALS = ["Metal", "Plastic", "Glass", "Painted", "Wood", "Other"]
-        FINISHES = ["Mirror", "Rough", "Hairline", "Matte", "Glossy", "Pattern", "Other"]
-        
-        mat_idx = torch.argmax(mat_probs).item()
-        fin_idx = torch.argmax(fin_probs).item()
-        
-        return {
-            "Material": MATERIALS[mat_idx],
-            "Finish": FINISHES[fin_idx],
-            "Scores": {
-                MATERIALS[mat_idx]: mat_probs[mat_idx].item(),
-                FINISHES[fin_idx]: fin_probs[fin_idx].item()
-            }
-        }
+        if tiled:
+            from vsams.tiling import predict_tiled
+            predict_fn = lambda images: [predict_tiled(predictor, img) for img in images]
+        else:
+            predict_fn = predictor.predict
+            # 원본 바이트를 넘기면 전체 해상도 디코딩 없이 224px 근처 크기로 바로 디코딩
+            if image_bytes is not None:
+                image = image_bytes
+        if image_bytes is None:
+            return predict_fn([image])[0]
+        variant = f"tiled={tiled}|{predictor.precision}"
+        return prediction_cache.predict(predict_fn, [image], [content_hash(image_bytes)], variant=variant)[0]
     
     # Simulation logic (Mock)
     time.sleep(1.0) 
@@ -119,6 +242,11 @@ LANG_DICT = {
         "upload_label": "Upload Product Image",
         "upload_tip": "💡 Tip: Try uploading images of metal or plastic surfaces.",
         "debug_checkbox": "Show Debug Info",
+        "tiled_checkbox": "High-Resolution Tiled Analysis",
+        "tiled_help": "Analyzes the full-resolution image in overlapping 224px patches to preserve micro-texture.",
+        "heatmap_caption": "Per-patch probability",
+        "model_loading": "Loading the AI model in the background... You can upload an image in the meantime.",
+        "model_load_failed": "Model loading failed",
         "img_acq": "1. Image Acquisition",
         "img_caption": "Preprocessed Input",
         "ai_analysis": "2. AI Analysis Result",
@@ -134,6 +262,9 @@ LANG_DICT = {
         "specs_label": "#### Specs",
         "report_btn": "📄 Generate Report",
         "no_match": "No perfect match found in current database.",
+        "match_score": "Expected Match",
+        "similar_title": "Most Similar Labeled Surfaces",
+        "alternatives": "#### Other Candidates",
         "welcome_title": "### Welcome to V-SAMS Demo",
         "welcome_msg": """
         This system analyzes surface properties to recommend protective films.
@@ -166,6 +297,11 @@ LANG_DICT = {
         "upload_label": "제품 이미지 업로드",
         "upload_tip": "💡 팁: 금속이나 플라스틱 표면 사진을 업로드해보세요.",
         "debug_checkbox": "디버그 정보 표시",
+        "tiled_checkbox": "고해상도 타일 분석",
+        "tiled_help": "원본 해상도 이미지를 겹치는 224px 패치로 나누어 분석하여 미세 텍스처를 보존합니다.",
+        "heatmap_caption": "패치별 확률",
+        "model_loading": "AI 모델을 백그라운드에서 불러오는 중입니다... 그동안 이미지를 업로드할 수 있습니다.",
+        "model_load_failed": "모델 로드 실패",
         "img_acq": "1. 이미지 획득 (Image Acquisition)",
         "img_caption": "전처리된 입력 이미지",
         "ai_analysis": "2. AI 분석 결과 (AI Analysis)",
@@ -181,6 +317,9 @@ LANG_DICT = {
         "specs_label": "#### 상세 스펙",
         "report_btn": "📄 리포트 생성",
         "no_match": "현재 데이터베이스에서 완벽하게 일치하는 제품을 찾을 수 없습니다.",
+        "match_score": "기대 매칭 점수",
+        "similar_title": "가장 유사한 기존 라벨링 표면",
+        "alternatives": "#### 기타 후보 제품",
         "welcome_title": "### V-SAMS 데모에 오신 것을 환영합니다",
         "welcome_msg": """
         이 시스템은 표면 특성을 분석하여 최적의 보호 필름을 추천합니다.
@@ -222,20 +361,34 @@ with st.sidebar:
     st.divider()
     
     if mode == txt["mode_user"]:
+        # 사용자 모드에 들어오면 모델을 백그라운드에서 로드하기 시작 (이미 시작했으면 기존 로더 재사용)
+        model_loader = start_model_loading()
         st.header(txt["sidebar_header"])
         uploaded_file = st.file_uploader(txt["upload_label"], type=['jpg', 'png', 'jpeg'])
         st.info(txt["upload_tip"])
+        tiled_mode = st.checkbox(txt["tiled_checkbox"], help=txt["tiled_help"])
         
         if st.checkbox(txt["debug_checkbox"]):
             st.write("System Status: Online")
             st.write("Model: ResNet50-DualHead")
             st.write("Database: v1.0 (JSON)")
+            st.write("Model:", "Ready" if model_loader.ready() else "Loading...")
+            if model_loader.ready() and model_loader.error is None:
+                st.write("Prediction Cache:", model_loader.result["prediction_cache"].stats())
 
 # User Mode UI
 if mode == txt["mode_user"]:
     st.title(txt["title"])
     st.markdown(txt["subtitle"])
 
+    if model_loader.ready():
+        if model_loader.error is not None:
+            st.error(f"{txt['model_load_failed']}: {model_loader.error}")
+        else:
+            show_load_status(model_loader.result)
+    else:
+        st.caption(txt["model_loading"])
+
     col1, col2 = st.columns([1, 1])
 
     if uploaded_file is not None:
@@ -251,7 +404,16 @@ if mode == txt["mode_user"]:
             st.subheader(txt["ai_analysis"])
             
             with st.spinner(txt["analyzing"]):
-                result = predict(image, uploaded_file.name)
+                # 백그라운드 로딩이 아직 진행 중이면 여기서만 기다림
+                try:
+                    stack = model_loader.get()
+                except Exception as e:
+                    st.error(f"{txt['model_load_failed']}: {e}")
+                    # 실패한 로더를 버려 다음 실행(rerun)에서 모델 로딩을 다시 시도
+                    start_model_loading.clear()
+                    st.stop()
+                use_inference_stack(stack)
+                result = predict(image, uploaded_file.name, tiled=tiled_mode, image_bytes=uploaded_file.getvalue())
             
             # Visualize Confidence
             st.success(txt["success"])
@@ -264,17 +426,48 @@ if mode == txt["mode_user"]:
                 
             st.progress(result['Scores'][result['Material']], text=f"{txt['mat_conf']}: {result['Material']}")
             st.progress(result['Scores'][result['Finish']], text=f"{txt['finish_conf']}: {result['Finish']}")
+            
+            if "Heatmap" in result:
+                # 패치별 최종 마감(Finish) 확률 히트맵
+                fin_idx = list(result["Probabilities"]["Finish"]).index(result["Finish"])
+                heatmap = result["Heatmap"]["Finish"][:, :, fin_idx]
+                rows, cols = result["Tiles"]["grid"]
+                st.image(Image.fromarray((heatmap * 255).astype("uint8")).resize((cols * 32, rows * 32), Image.NEAREST),
+                         caption=f"{txt['heatmap_caption']}: {result['Finish']} ({result['Tiles']['count']} patches)")
+
+        # 유사 표면 검색 (이전에 라벨링된 샘플 중 가장 비슷한 표면)
+        neighbors = None
+        if feature_index is not None and load_status == "real":
+            query_vec = predictor.extract_features([image])[0].cpu().numpy()
+            neighbors = feature_index.search(query_vec, k=5)
+            samples = [(score, meta) for score, meta in neighbors if meta.get("kind") == "sample" and os.path.exists(meta["path"])]
+            if samples:
+                st.subheader(txt["similar_title"])
+                sim_cols = st.columns(len(samples))
+                for sim_col, (score, meta) in zip(sim_cols, samples):
+                    with sim_col:
+                        st.image(meta["path"], caption=f"{meta['material']}/{meta['finish']} ({score:.2f})", use_container_width=True)
 
         st.divider()
 
         # 3. Recommendation
         st.header(txt["recommendation"])
         
-        recommendations = query_recommendation(result['Material'], result['Finish'])
+        # 실제 모델 결과에는 전체 확률 분포가 있으므로 기대 매칭 점수로 순위를 매김
+        if "Probabilities" in result:
+            ranked = rank_recommendations(result["Probabilities"]["Material"], result["Probabilities"]["Finish"], top_k=3)
+            # 어떤 제품도 예측 분포를 커버하지 못하면 유사 표면의 제품으로 대체
+            if neighbors and (not ranked or ranked[0]["score"] < 1e-3):
+                ranked = [{"product": p, "score": None} for p in recommend_from_neighbors(neighbors)] or ranked
+        else:
+            ranked = [{"product": p, "score": None} for p in query_recommendation(result['Material'], result['Finish'], neighbors=neighbors)]
+        recommendations = [r["product"] for r in ranked]
         
         if recommendations:
             best_match = recommendations[0]
             st.markdown(f"{txt['best_match']}: {best_match['name']}")
+            if ranked[0]["score"] is not None:
+                st.progress(ranked[0]["score"], text=f"{txt['match_score']}: {ranked[0]['score']*100:.1f}%")
             
             rec_col1, rec_col2 = st.columns([1, 2])
             
@@ -293,6 +486,11 @@ if mode == txt["mode_user"]:
                 st.json(best_match['specs'])
                 
                 st.button(txt["report_btn"])
+            
+            if len(ranked) > 1 and ranked[0]["score"] is not None:
+                st.markdown(txt["alternatives"])
+                for r in ranked[1:]:
+                    st.write(f"- {r['product']['name']} ({r['score']*100:.1f}%)")
         else:
             st.warning(txt["no_match"])
 
@@ -353,8 +551,8 @@ else:
                     "image_url": "images/placeholder.png"
                 }
                 
-                current_db.append(new_product)
-                save_db(current_db)
+                # 전체 파일을 다시 쓰지 않고 제품 한 건만 저장 (동일 ID는 갱신)
+                upsert_product(new_product)
                 st.success(txt["saved_msg"])
                 time.sleep(1)
                 st.rerun()
@@ -1,74 +1,248 @@
-import torch
 import numpy as np
-from vsams.models.classifier import SurfaceClassifier
+import time
+from concurrent.futures import ThreadPoolExecutor
+from vsams.preprocess import iter_chunks
 import sys
 import os
 
 # DeepDrop Project Path (Relative to V-SAMS)
-sys.path.append(os.path.join(os.path.dirname(__file__), '../DeepDrop-SFE/src'))
-
-try:
-    from ai_engine import AIContactAngleAnalyzer  # Real AI Engine
-    from physics_engine import DropletPhysics     # Physics Engine
-    print("✅ DeepDrop Module Loaded.")
-except ImportError:
-    print("⚠️ DeepDrop module not found. Using Mock.")
+DEEPDROP_SRC = os.path.join(os.path.dirname(__file__), '../DeepDrop-SFE/src')
+
+
+class MockContactAngleAnalyzer:
     # Fallback Mock Class
-    class AIContactAngleAnalyzer:
-        def __init__(self):
-            print("DeepDrop Analyzer (Mock) Initialized")
-        
-        def analyze(self, image):
-            # Mock analysis result
-            return 45.0 
+    def __init__(self):
+        print("DeepDrop Analyzer (Mock) Initialized")
+    
+    def analyze(self, image):
+        # Mock analysis result
+        return 45.0 
+
+
+def load_deepdrop():
+    """
+    Imports the DeepDrop engine on first use (not at module import), falling back to the mock.
+    """
+    if DEEPDROP_SRC not in sys.path:
+        sys.path.append(DEEPDROP_SRC)
+    try:
+        from ai_engine import AIContactAngleAnalyzer  # Real AI Engine
+        from physics_engine import DropletPhysics     # Physics Engine
+        print("✅ DeepDrop Module Loaded.")
+        return AIContactAngleAnalyzer
+    except ImportError:
+        print("⚠️ DeepDrop module not found. Using Mock.")
+        return MockContactAngleAnalyzer
+
+
+def _is_tensor(value):
+    # A tensor can only exist once torch is imported, so no import is needed for the check
+    torch = sys.modules.get("torch")
+    return torch is not None and isinstance(value, torch.Tensor)
+
+
+REGRESSOR_PATH = 'checkpoints/holding_power_regressor.joblib'
 
 class HoldingPowerPredictor:
-    def __init__(self, vsams_checkpoint=None):
+    def __init__(self, vsams_checkpoint=None, regressor_path=REGRESSOR_PATH, execution_mode="sequential", chunk_size=32):
+        """
+        execution_mode: "sequential" runs V-SAMS then DeepDrop; "concurrent" runs the two
+        branches on separate threads (both release the GIL in native code) and pipelines
+        chunk_size-sample chunks so V-SAMS on chunk n+1 overlaps DeepDrop on chunk n.
+        """
+        # torch / timm are imported here rather than at module import
+        import torch
+        from vsams.inference import BatchPredictor
+
         # 1. Initialize V-SAMS
-        self.vsams = SurfaceClassifier()
-        if vsams_checkpoint:
-            self.vsams.load_state_dict(torch.load(vsams_checkpoint, map_location='cpu'))
+        # Exported models (python -m vsams.export) skip timm and pretrained weight download
+        if vsams_checkpoint and vsams_checkpoint.endswith(('.ts', '.onnx')):
+            from vsams.runtime import load_exported
+            self.vsams = load_exported(vsams_checkpoint)
+        else:
+            from vsams.models.classifier import SurfaceClassifier
+            self.vsams = SurfaceClassifier(pretrained=vsams_checkpoint is None)
+            if vsams_checkpoint:
+                self.vsams.load_state_dict(torch.load(vsams_checkpoint, map_location='cpu'))
         self.vsams.eval()
+        self.batch_predictor = BatchPredictor(self.vsams)
         
         # 2. Initialize DeepDrop
-        self.deepdrop = AIContactAngleAnalyzer()
+        self.deepdrop = load_deepdrop()()
         
-        # 3. XGBoost or other Regression Model (To be trained later)
-        self.regressor = None 
+        self.execution_mode = execution_mode
+        self.chunk_size = chunk_size
+        self.last_timing = {}
+        
+        # 3. Fusion + Regression Model (PCA fitted once and persisted with the regressor)
+        self.regressor_path = regressor_path
+        self.regressor = None
+        self.pca = None
+        self.tabular_keys = []
+        if regressor_path and os.path.exists(regressor_path):
+            self.load_regressor(regressor_path)
         print("HoldingPowerPredictor Launchpad Ready.")
 
+    def load_regressor(self, path):
+        import joblib
+        bundle = joblib.load(path)
+        self.regressor = bundle["regressor"]
+        self.pca = bundle["pca"]
+        self.tabular_keys = bundle["tabular_keys"]
+        print(f"Holding power regressor loaded from {path}")
+
+    def save_regressor(self, path=None):
+        import joblib
+        path = path or self.regressor_path
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        joblib.dump({"regressor": self.regressor, "pca": self.pca, "tabular_keys": self.tabular_keys}, path)
+        print(f"Holding power regressor saved to {path}")
+
+    def _vision_branch(self, surface_images):
+        start = time.perf_counter()
+        vision = self.batch_predictor.extract_features(surface_images).float().cpu().numpy()
+        return vision, time.perf_counter() - start
+
+    def _deepdrop_branch(self, contact_angle_images):
+        start = time.perf_counter()
+        angles = np.array([self.deepdrop.analyze(img) for img in contact_angle_images], dtype=np.float32)
+        return angles, time.perf_counter() - start
+
+    def extract_branches(self, surface_images, contact_angle_images, execution_mode=None):
+        """
+        Runs both branches over many samples.
+        Returns (vision [N, 2048] float32, contact_angles [N] float32).
+        Per-branch and wall-clock timings are stored in self.last_timing.
+        """
+        mode = execution_mode or self.execution_mode
+        start = time.perf_counter()
+
+        if mode == "concurrent":
+            if _is_tensor(surface_images):
+                surface_chunks = list(surface_images.split(self.chunk_size))
+            else:
+                surface_chunks = list(iter_chunks(surface_images, self.chunk_size))
+            angle_chunks = list(iter_chunks(contact_angle_images, self.chunk_size))
+
+            # One worker per branch: each branch runs its chunks in order, so the
+            # vision branch moves on to chunk n+1 while DeepDrop handles chunk n
+            with ThreadPoolExecutor(max_workers=1, thread_name_prefix="vsams") as vision_pool, \
+                 ThreadPoolExecutor(max_workers=1, thread_name_prefix="deepdrop") as drop_pool:
+                vision_futures = [vision_pool.submit(self._vision_branch, c) for c in surface_chunks]
+                drop_futures = [drop_pool.submit(self._deepdrop_branch, c) for c in angle_chunks]
+                vision_parts = [f.result() for f in vision_futures]
+                drop_parts = [f.result() for f in drop_futures]
+
+            vision = np.concatenate([v for v, _ in vision_parts]) if vision_parts else np.zeros((0, 0), dtype=np.float32)
+            angles = np.concatenate([a for a, _ in drop_parts]) if drop_parts else np.zeros(0, dtype=np.float32)
+            vision_sec = sum(t for _, t in vision_parts)
+            deepdrop_sec = sum(t for _, t in drop_parts)
+        else:
+            vision, vision_sec = self._vision_branch(surface_images)
+            angles, deepdrop_sec = self._deepdrop_branch(contact_angle_images)
+
+        wall_sec = time.perf_counter() - start
+        self.last_timing = {
+            "mode": mode,
+            "vision_sec": vision_sec,
+            "deepdrop_sec": deepdrop_sec,
+            "wall_sec": wall_sec,
+            # Time hidden by running the branches side by side
+            "overlap_sec": max(0.0, vision_sec + deepdrop_sec - wall_sec),
+        }
+        return vision, angles
+
+    def tabular_matrix(self, tabular_rows):
+        # Column order is fixed at fit time; missing keys default to 0
+        return np.array([[float(row.get(k, 0.0)) for k in self.tabular_keys] for row in tabular_rows],
+                        dtype=np.float32).reshape(len(tabular_rows), len(self.tabular_keys))
+
+    def fuse(self, vision, angles, tabular_rows):
+        """
+        Builds the [N, D] regression matrix: (PCA-reduced) vision | contact angle | tabular.
+        """
+        if self.pca is not None:
+            vision = self.pca.transform(vision).astype(np.float32)
+        return np.hstack([vision, angles.reshape(-1, 1), self.tabular_matrix(tabular_rows)])
+
+    def fit(self, surface_images, contact_angle_images, tabular_rows, holding_power,
+            n_components=32, regressor_type="gbr", save=True):
+        """
+        Trains (and persists) the holding power regressor.
+
+        Args:
+            surface_images: list of PIL Images / paths or a preprocessed [N, 3, 224, 224] Tensor
+            contact_angle_images: list of N images for DeepDrop
+            tabular_rows: list of N dicts of physical properties
+            holding_power: N measured holding power values
+            n_components: PCA size for the vision vector (None keeps all 2048 dims)
+            regressor_type: "gbr" (gradient boosting) or "linear" (ridge)
+        """
+        from sklearn.decomposition import PCA
+        from sklearn.ensemble import HistGradientBoostingRegressor
+        from sklearn.linear_model import Ridge
+
+        vision, angles = self.extract_branches(surface_images, contact_angle_images)
+        self.tabular_keys = sorted({k for row in tabular_rows for k in row})
+
+        self.pca = None
+        if n_components:
+            self.pca = PCA(n_components=min(n_components, *vision.shape)).fit(vision)
+
+        X = self.fuse(vision, angles, tabular_rows)
+        y = np.asarray(holding_power, dtype=np.float32)
+        self.regressor = HistGradientBoostingRegressor() if regressor_type == "gbr" else Ridge(alpha=1.0)
+        self.regressor.fit(X, y)
+        print(f"Regressor ({regressor_type}) trained on {X.shape[0]} samples x {X.shape[1]} features")
+
+        if save and self.regressor_path:
+            self.save_regressor()
+        return self
+
+    def predict_many(self, surface_images, contact_angle_images, tabular_rows, execution_mode=None):
+        """
+        Batch inference: one vision pass in micro-batches, one fused matrix,
+        one regressor call for all rows.
+        """
+        vision, angles = self.extract_branches(surface_images, contact_angle_images, execution_mode)
+        predicted = None
+        if self.regressor is not None:
+            predicted = self.regressor.predict(self.fuse(vision, angles, tabular_rows))
+
+        return {
+            "roughness_vector": vision,
+            "contact_angle": angles,
+            "predicted_holding_power": predicted
+        }
+
     def predict(self, img_surface, img_contact_angle, tabular_data):
         """
         Final Inferences by fusing multiple data sources.
         
         Args:
-            img_surface: PIL Image or Tensor for V-SAMS
+            img_surface: PIL Image, image path or preprocessed [1, 3, 224, 224] Tensor for V-SAMS
             img_contact_angle: Image for DeepDrop analysis
-            tabular_data: Dictionary or List of physical properties
+            tabular_data: Dictionary of physical properties
         """
-        # 1. Vision Feature Extraction (V-SAMS)
-        # Assuming img_surface is already preprocessed to [1, 3, 224, 224]
-        with torch.no_grad():
-            vec_roughness = self.vsams.extract_features(img_surface)
-        
-        # 2. Surface Physics Analysis (DeepDrop)
-        val_energy = self.deepdrop.analyze(img_contact_angle)
-
-        # 3. Data Fusion
-        # features = torch.cat([vec_roughness, torch.tensor([[val_energy]]), ...], dim=1)
+        if not _is_tensor(img_surface):
+            img_surface = [img_surface]
+        result = self.predict_many(img_surface, [img_contact_angle], [tabular_data])
         
         print("--- Pipeline Execution ---")
-        print(f"V-SAMS Feature Shape: {vec_roughness.shape}")
-        print(f"DeepDrop Value: {val_energy}")
-        print("Fusion and Regression pending training data.")
+        print(f"V-SAMS Feature Shape: {result['roughness_vector'].shape}")
+        print(f"DeepDrop Value: {result['contact_angle'][0]}")
+        if self.regressor is None:
+            print("Regressor not trained yet. Call fit() with measured holding power data.")
         
         return {
-            "roughness_vector": vec_roughness.cpu().numpy(),
-            "contact_angle": val_energy,
-            "predicted_holding_power": None # Final result
+            "roughness_vector": result["roughness_vector"],
+            "contact_angle": float(result["contact_angle"][0]),
+            "predicted_holding_power": None if result["predicted_holding_power"] is None else float(result["predicted_holding_power"][0])
         }
 
 if __name__ == "__main__":
+    import torch
+
     # Test Skeleton
     predictor = HoldingPowerPredictor()
     
@@ -79,3 +253,18 @@ if __name__ == "__main__":
     
     result = predictor.predict(mock_surface_img, mock_droplet_img, mock_tabular)
     print("Inference Test Successful.")
+    
+    # Batch fit / predict on synthetic rows (regressor is not saved)
+    n = 64
+    mock_surfaces = torch.randn(n, 3, 224, 224)
+    mock_tabular_rows = [{"temperature": 20.0 + i % 10, "humidity": 40.0 + i % 7} for i in range(n)]
+    mock_targets = np.random.rand(n) * 500
+    predictor.fit(mock_surfaces, [None] * n, mock_tabular_rows, mock_targets, n_components=16, save=False)
+    batch = predictor.predict_many(mock_surfaces, [None] * n, mock_tabular_rows)
+    print(f"Batch Prediction Shape: {batch['predicted_holding_power'].shape}")
+    
+    # Sequential vs concurrent branch execution
+    for mode in ("sequential", "concurrent"):
+        predictor.predict_many(mock_surfaces, [None] * n, mock_tabular_rows, execution_mode=mode)
+        t = predictor.last_timing
+        print(f"[{mode}] wall {t['wall_sec']:.2f}s | V-SAMS {t['vision_sec']:.2f}s | DeepDrop {t['deepdrop_sec']:.2f}s | overlap {t['overlap_sec']:.2f}s")
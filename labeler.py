@@ -4,19 +4,39 @@ import shutil
 from datetime import datetime
 from PIL import Image
 import hashlib
+from vsams.utils.ingest_index import IngestIndex
+from vsams.data.manifest import DatasetManifest
 
 # --- Config ---
 DATASET_ROOT = "dataset"
 MATERIALS = ["Metal", "Plastic", "Glass", "Painted", "Wood", "Other"]
 FINISHES = ["Mirror", "Rough", "Hairline", "Matte", "Glossy", "Pattern", "Other"]
 
+INGEST_INDEX_PATH = os.path.join(DATASET_ROOT, "ingest_index.json")
+
 st.set_page_config(page_title="V-SAMS Data Labeler", page_icon="🏷️", layout="centered")
 
+@st.cache_resource
+def load_ingest_index():
+    # 중복 업로드 방지용 인덱스 (정확한 중복: 내용 해시 / 유사 중복: 지각 해시)
+    return IngestIndex(INGEST_INDEX_PATH)
+
+@st.cache_resource
+def load_manifest():
+    # 데이터셋 매니페스트 (경로/클래스/크기/해시/수정시각). 최초 1회만 전체 폴더를 스캔
+    manifest = DatasetManifest.for_train_dir(os.path.join(DATASET_ROOT, "train"))
+    if not manifest.exists():
+        manifest.rebuild(os.path.join(DATASET_ROOT, "train"))
+    return manifest
+
+ingest_index = load_ingest_index()
+manifest = load_manifest()
+
 # --- Helper Functions ---
 def get_class_name(material, finish):
     return f"{material}_{finish}"
 
-def save_image(uploaded_file, material, finish):
+def save_image(uploaded_file, material, finish, sha1=None):
     # 1. Prepare Directory
     class_name = get_class_name(material, finish)
     save_dir = os.path.join(DATASET_ROOT, "train", class_name)
@@ -35,20 +55,16 @@ def save_image(uploaded_file, material, finish):
     # 3. Save
     with open(save_path, "wb") as f:
         f.write(uploaded_file.getbuffer())
+    
+    # 4. Manifest (incremental, no directory walk)
+    manifest.add(save_path, class_name, sha1=sha1)
         
     return save_path
 
 def count_stats():
-    stats = {}
-    if not os.path.exists(os.path.join(DATASET_ROOT, "train")):
-        return stats
-        
-    for class_name in os.listdir(os.path.join(DATASET_ROOT, "train")):
-        class_dir = os.path.join(DATASET_ROOT, "train", class_name)
-        if os.path.isdir(class_dir):
-            count = len([f for f in os.listdir(class_dir) if f.lower().endswith(('.png', '.jpg', '.jpeg'))])
-            stats[class_name] = count
-    return stats
+    # 다른 프로세스(download_datasets 등)가 추가한 항목도 반영
+    manifest.reload_if_changed()
+    return manifest.class_counts()
 
 # --- UI Layout ---
 st.title("🏷️ 간편 데이터 라벨러")
@@ -62,6 +78,13 @@ with st.expander("📊 현재 수집 현황 보기", expanded=False):
         st.write(stats)
     else:
         st.info("아직 수집된 데이터가 없습니다.")
+    
+    # DTD/MINC 부트스트래핑 이후 기존 데이터 전체를 중복 검사 인덱스에 반영
+    if st.button(f"🔄 중복 검사 인덱스 / 매니페스트 재구축 (현재 {len(ingest_index)}장)"):
+        with st.spinner("인덱스 재구축 중..."):
+            ingest_index.rebuild(os.path.join(DATASET_ROOT, "train"))
+            manifest.rebuild(os.path.join(DATASET_ROOT, "train"))
+        st.success(f"{len(ingest_index)}장 인덱싱 완료")
 
 st.divider()
 
@@ -86,17 +109,39 @@ if uploaded_files:
     target_class = get_class_name(selected_material, selected_finish)
     st.info(f"📂 저장될 폴더명: **dataset/train/{target_class}/**")
     
+    allow_near = st.checkbox("유사 중복 이미지도 저장 (각도/조명만 다른 사진 등)", value=False)
+    
     if st.button("💾 이 설정으로 모든 사진 저장하기", use_container_width=True, type="primary"):
         progress_bar = st.progress(0)
         saved_count = 0
+        skipped = []
+        invalid = []
+        # download_datasets.py 등 다른 프로세스가 등록한 이미지도 중복 검사에 반영
+        ingest_index.reload_if_changed()
         
         for i, file in enumerate(uploaded_files):
-            save_path = save_image(file, selected_material, selected_finish)
-            saved_count += 1
+            status, existing, sha, phash = ingest_index.check(file.getvalue())
+            if status == "invalid":
+                invalid.append(file.name)
+            elif status == "duplicate" or (status == "near_duplicate" and not allow_near):
+                skipped.append((file.name, status, existing))
+            else:
+                save_path = save_image(file, selected_material, selected_finish, sha1=sha)
+                ingest_index.add(sha, phash, save_path)
+                saved_count += 1
             progress_bar.progress((i + 1) / len(uploaded_files))
+        ingest_index.save()
             
         st.success(f"✅ {saved_count}장의 사진을 '{target_class}' 폴더에 저장했습니다!")
-        st.balloons()
+        if invalid:
+            st.error(f"❌ 이미지로 읽을 수 없는 파일 {len(invalid)}개를 건너뛰었습니다: {', '.join(invalid)}")
+        if skipped:
+            with st.expander(f"⏭️ 중복으로 건너뛴 사진 {len(skipped)}장"):
+                for name, status, existing in skipped:
+                    label = "동일 이미지" if status == "duplicate" else "유사 이미지"
+                    st.write(f"- {name}: {label} → `{existing}`")
+        if saved_count:
+            st.balloons()
         
     # Preview
     st.divider()
@@ -0,0 +1,92 @@
+import asyncio
+import functools
+import os
+from contextlib import asynccontextmanager
+
+import torch
+from fastapi import FastAPI, File, HTTPException, Query, UploadFile
+
+from vsams.batching import MicroBatcher
+from vsams.inference import BatchPredictor, load_classifier
+from vsams.preprocess import decode_image
+from vsams.worker_pool import InferenceWorkerPool
+from vsams.utils.db_handler import rank_recommendations
+
+# --- Config (Environment Variables) ---
+CHECKPOINT_PATH = os.environ.get("VSAMS_CHECKPOINT", "checkpoints/v_sams_model.pth")
+MAX_BATCH_SIZE = int(os.environ.get("VSAMS_MAX_BATCH", "16"))
+MAX_WAIT_MS = float(os.environ.get("VSAMS_MAX_WAIT_MS", "5"))
+PRECISION = os.environ.get("VSAMS_PRECISION", "fp32")
+EXPORTED_PATH = os.environ.get("VSAMS_EXPORTED", "checkpoints/v_sams_model.ts")
+# >0: run the model in N processes sharing the weights (see python -m vsams.worker_pool)
+NUM_WORKERS = int(os.environ.get("VSAMS_WORKERS", "0"))
+NUM_THREADS = int(os.environ.get("VSAMS_THREADS", "0")) or None
+
+state = {}
+
+
+@asynccontextmanager
+async def lifespan(app):
+    if NUM_WORKERS > 0:
+        # Worker processes share the eager model's weights; exported graphs cannot be shared
+        if PRECISION != "fp32" or "VSAMS_EXPORTED" in os.environ:
+            raise RuntimeError("VSAMS_WORKERS runs the eager FP32 model; unset VSAMS_PRECISION / VSAMS_EXPORTED "
+                               "or set VSAMS_WORKERS=0")
+        model, status = load_classifier(CHECKPOINT_PATH, device=torch.device("cpu"))
+        predictor = InferenceWorkerPool(model, NUM_WORKERS, NUM_THREADS, batch_size=MAX_BATCH_SIZE)
+    else:
+        model, status = load_classifier(CHECKPOINT_PATH, exported_path=EXPORTED_PATH)
+        predictor = BatchPredictor(model, batch_size=MAX_BATCH_SIZE, precision=PRECISION)
+    if status == "mock":
+        print(f"⚠️ Checkpoint not found at {CHECKPOINT_PATH}. Serving untrained heads.")
+
+    # An image that fails inside the batch only fails its own request
+    predict_fn = predictor.predict if NUM_WORKERS > 0 else functools.partial(predictor.predict, return_errors=True)
+    batcher = MicroBatcher(predict_fn, max_batch_size=MAX_BATCH_SIZE, max_wait_ms=MAX_WAIT_MS)
+    await batcher.start()
+    state.update(batcher=batcher, status=status)
+    print(f"V-SAMS server ready (batch={MAX_BATCH_SIZE}, window={MAX_WAIT_MS}ms, precision={predictor.precision}, "
+          f"workers={NUM_WORKERS or 'in-process'}, model={status})")
+    yield
+    await batcher.stop()
+    if NUM_WORKERS > 0:
+        predictor.close()
+    state.clear()
+
+
+app = FastAPI(title="V-SAMS", lifespan=lifespan)
+
+
+@app.get("/health")
+async def health():
+    return {"status": "ok", "model": state.get("status")}
+
+
+@app.get("/stats")
+async def stats():
+    return state["batcher"].get_stats()
+
+
+@app.post("/predict")
+async def predict(file: UploadFile = File(...), top_k: int = Query(3, gt=0)):
+    data = await file.read()
+    try:
+        # Decode (reduced-size JPEG decode) and resize off the event loop so concurrent
+        # uploads keep filling the batch window; the batch worker only stacks uint8 arrays
+        image = await asyncio.to_thread(decode_image, data, 224)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Invalid image: {e}")
+
+    try:
+        result = await state["batcher"].submit(image)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid image: {e}")
+    probs = result["Probabilities"]
+    result["Recommendations"] = rank_recommendations(probs["Material"], probs["Finish"], top_k=top_k)
+    result["Model"] = state["status"]
+    return result
+
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host="0.0.0.0", port=int(os.environ.get("VSAMS_PORT", "8000")))
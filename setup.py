@@ -12,6 +12,11 @@ setup(
         "torchvision"
         # Add other dependencies from requirements.txt if needed
     ],
+    entry_points={
+        "console_scripts": [
+            "vsams=vsams.cli:main",
+        ],
+    },
     author="V-SAMS Team",
     description="Visual-based Surface Analysis & Matching System",
 )
@@ -0,0 +1,111 @@
+"""
+Offline bootstrap (utils/download_datasets.py) on tiny MINC parquet / DTD tar fixtures.
+
+    python -m pytest tests
+"""
+import io
+import json
+import os
+import sys
+import tarfile
+
+import pytest
+from PIL import Image
+
+pa = pytest.importorskip("pyarrow")
+pq = pytest.importorskip("pyarrow.parquet")
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# utils/ is a script folder, not a package; the worker pool needs an importable module name
+sys.path.insert(0, os.path.join(ROOT, "utils"))
+import download_datasets  # noqa: E402
+
+
+def jpeg_bytes(color):
+    buf = io.BytesIO()
+    Image.new("RGB", (8, 8), color).save(buf, format="JPEG")
+    return buf.getvalue()
+
+
+def write_minc_fixture(minc_dir):
+    # label ids from MINC_LABELS: 9 metal, 14 plastic, 4 foliage (not mapped)
+    labels = [9, 9, 9, 14, 4]
+    data_dir = os.path.join(minc_dir, "data")
+    os.makedirs(data_dir)
+    table = pa.table({
+        "image": [{"bytes": jpeg_bytes((i * 40, 0, 0)), "path": f"{i}.jpg"} for i in range(len(labels))],
+        "label": labels,
+    })
+    # Two row groups, so resumable progress is tracked per group
+    pq.write_table(table, os.path.join(data_dir, "train-00000.parquet"), row_group_size=3)
+
+
+def write_dtd_fixture(tar_path, tmp_path):
+    src = tmp_path / "dtd_src"
+    for c, (cls, n) in enumerate((("glossy", 2), ("bumpy", 1), ("banded", 1))):
+        (src / "dtd" / "images" / cls).mkdir(parents=True)
+        for i in range(n):
+            # Distinct contents, so every file has its own sha1
+            Image.new("RGB", (8, 8), (0, i * 50, 100 + c * 50)).save(src / "dtd" / "images" / cls / f"{cls}_{i}.jpg")
+    with tarfile.open(tar_path, "w:gz") as tar:
+        tar.add(src / "dtd", arcname="dtd")
+
+
+def count_files(dataset_root):
+    return {name: len(os.listdir(os.path.join(dataset_root, name)))
+            for name in os.listdir(dataset_root) if os.path.isdir(os.path.join(dataset_root, name))}
+
+
+def test_offline_bootstrap(tmp_path):
+    minc_dir = tmp_path / "minc-2500"
+    write_minc_fixture(str(minc_dir))
+    dtd_tar = tmp_path / "dtd.tar.gz"
+    write_dtd_fixture(str(dtd_tar), tmp_path)
+    dataset_root = tmp_path / "dataset" / "train"
+
+    kwargs = dict(dataset_root=str(dataset_root), dtd_tar=str(dtd_tar),
+                  # Not named "dtd": the tarball's top-level folder must still land here
+                  dtd_dir=str(tmp_path / "textures"),
+                  minc_dir=str(minc_dir), offline=True, workers=1, per_class_limit=2)
+    download_datasets.setup_full_dataset(**kwargs)
+
+    assert os.path.isdir(tmp_path / "textures" / "images" / "glossy")
+    expected = {
+        # metal capped at per_class_limit, foliage is not mapped
+        "Metal_Other": 2, "Plastic_Other": 1,
+        "Other_Glossy": 2, "Other_Rough": 1, "Other_Other": 1,
+    }
+    assert count_files(str(dataset_root)) == expected
+
+    with open(dataset_root / download_datasets.MANIFEST_NAME, encoding="utf-8") as f:
+        progress = json.load(f)
+    assert progress["minc_counts"] == {"Metal_Other": 2, "Plastic_Other": 1}
+    assert sorted(progress["dtd_done"]) == ["banded", "bumpy", "glossy"]
+
+    manifest = download_datasets.DatasetManifest.for_train_dir(str(dataset_root))
+    assert manifest.class_counts() == expected
+
+    # Downloaded images are registered in the labeler's dedupe index
+    ingest_index = download_datasets.IngestIndex(str(tmp_path / "dataset" / download_datasets.INGEST_INDEX_NAME))
+    assert len(ingest_index) == sum(expected.values())
+    copied = (tmp_path / "textures" / "images" / "glossy" / "glossy_0.jpg").read_bytes()
+    assert ingest_index.check(copied)[0] == "duplicate"
+
+    # Re-running is idempotent: nothing is copied or counted twice
+    download_datasets.setup_full_dataset(**kwargs)
+    assert count_files(str(dataset_root)) == expected
+    assert download_datasets.DatasetManifest.for_train_dir(str(dataset_root)).class_counts() == expected
+
+
+def test_extract_dtd_rejects_path_traversal(tmp_path):
+    if not hasattr(tarfile, "data_filter"):
+        pytest.skip("tarfile extraction filters are not available")
+    tar_path = tmp_path / "evil.tar.gz"
+    payload = tmp_path / "payload.txt"
+    payload.write_text("x")
+    with tarfile.open(tar_path, "w:gz") as tar:
+        tar.add(payload, arcname="dtd/../../escaped.txt")
+
+    with pytest.raises(tarfile.FilterError):
+        download_datasets.extract_dtd(str(tar_path), str(tmp_path / "out" / "textures"))
+    assert not (tmp_path / "escaped.txt").exists()
@@ -1,25 +1,28 @@
 import torch
 import torch.nn as nn
 import torch.optim as optim
-from torch.utils.data import DataLoader, Dataset
+from torch.utils.data import DataLoader, Dataset, TensorDataset, Subset, WeightedRandomSampler
 from torchvision import transforms
 from vsams.models.classifier import SurfaceClassifier
+from vsams.labels import MATERIALS, FINISHES
+from vsams.data.packed import PackedSurfaceDataset, list_samples, pack_is_current
+from vsams.data.feature_cache import FeatureCache, backbone_fingerprint
+from vsams.inference import BatchPredictor, get_device
+from vsams.preprocess import open_rgb
+from vsams.checkpoint import build_metadata, save_checkpoint, last_checkpoint_path
 import os
-import glob
-from PIL import Image
+import argparse
+import time
 import numpy as np
 import albumentations as A
 from albumentations.pytorch import ToTensorV2
 
-# Define Class Mappings (Synchronized with labeler.py)
-MATERIALS = ["Metal", "Plastic", "Glass", "Painted", "Wood", "Other"]
-FINISHES = ["Mirror", "Rough", "Hairline", "Matte", "Glossy", "Pattern", "Other"]
-
+# Class Mappings (Synchronized with labeler.py via vsams.labels)
 MAT_MAP = {name: i for i, name in enumerate(MATERIALS)}
 FIN_MAP = {name: i for i, name in enumerate(FINISHES)}
 
 class SurfaceDataset(Dataset):
-    def __init__(self, root_dir, transform=None):
+    def __init__(self, root_dir, transform=None, samples=None):
         self.root_dir = root_dir
         self.transform = transform
         self.samples = []
@@ -29,32 +32,26 @@ class SurfaceDataset(Dataset):
             return
 
         # Folder structure: dataset/train/Material_Finish/*.jpg
-        for class_folder in os.listdir(root_dir):
-            folder_path = os.path.join(root_dir, class_folder)
-            if not os.path.isdir(folder_path):
-                continue
-            
-            # Parse labels from folder name
-            try:
-                mat_name, fin_name = class_folder.split('_')
-                mat_idx = MAT_MAP.get(mat_name, MAT_MAP["Other"])
-                fin_idx = FIN_MAP.get(fin_name, FIN_MAP["Other"])
-            except ValueError:
-                print(f"Skipping folder with invalid format: {class_folder}")
-                continue
-
-            for img_path in glob.glob(os.path.join(folder_path, "*.[jJ][pP][gG]")) + \
-                             glob.glob(os.path.join(folder_path, "*.[pP][nN][gG]")):
-                self.samples.append((img_path, mat_idx, fin_idx))
+        # samples: an existing list_samples() result, so several datasets share one listing
+        self.samples = samples if samples is not None else list_samples(root_dir)
         
         print(f"Loaded {len(self.samples)} images from {root_dir}")
 
     def __len__(self):
         return len(self.samples)
 
+    def get_labels(self):
+        return np.array([s[1] for s in self.samples], dtype=np.int64), np.array([s[2] for s in self.samples], dtype=np.int64)
+
     def __getitem__(self, idx):
         img_path, mat_label, fin_label = self.samples[idx]
-        image = np.array(Image.open(img_path).convert("RGB"))
+        # JPEGs are decoded at reduced scale (still >= 224px) before augmentation
+        try:
+            image = np.array(open_rgb(img_path, draft_size=(224, 224)))
+        except FileNotFoundError:
+            # Samples may come from the manifest without a per-file check
+            raise FileNotFoundError(f"{img_path} is listed in the dataset manifest but no longer exists. "
+                                    f"Rebuild it with `python -m vsams.data.manifest --root {self.root_dir}`")
         
         if self.transform:
             augmented = self.transform(image=image)
@@ -62,34 +59,173 @@ class SurfaceDataset(Dataset):
         
         return image, mat_label, fin_label
 
-def train_model(num_epochs=10, batch_size=32, lr=1e-4):
-    if torch.backends.mps.is_available():
-        device = torch.device("mps")
-    elif torch.cuda.is_available():
-        device = torch.device("cuda")
-    else:
-        device = torch.device("cpu")
-    print(f"학습 장치 설정: {device}")
-    
-    # 1. Augmentations (Albumentations)
-    train_transform = A.Compose([
-        A.Resize(224, 224),
+def build_eval_transform(resize=True):
+    steps = [A.Resize(224, 224)] if resize else []
+    return A.Compose(steps + [
+        A.Normalize(mean=(0.485, 0.456, 0.406), std=(0.229, 0.224, 0.225)),
+        ToTensorV2(),
+    ])
+
+def build_train_transform(resize=True):
+    # Packed datasets are already resized, so only the random augmentations remain
+    steps = [A.Resize(224, 224)] if resize else []
+    return A.Compose(steps + [
         A.HorizontalFlip(p=0.5),
         A.RandomBrightnessContrast(p=0.2),
         A.Rotate(limit=15, p=0.3),
         A.Normalize(mean=(0.485, 0.456, 0.406), std=(0.229, 0.224, 0.225)),
         ToTensorV2(),
     ])
+
+def sync_device(device):
+    # GPU kernels run asynchronously; synchronize so compute time is measured correctly
+    if device.type == "cuda":
+        torch.cuda.synchronize()
+    elif device.type == "mps":
+        torch.mps.synchronize()
+
+def split_indices(mat_labels, fin_labels, val_split=0.1, seed=0):
+    """
+    Stratified train/val split over the material x finish grid.
+    Classes with a single sample stay in the training set.
+    """
+    rng = np.random.default_rng(seed)
+    grid = mat_labels * len(FINISHES) + fin_labels
+    train_idx, val_idx = [], []
+    for cls in np.unique(grid):
+        idx = rng.permutation(np.flatnonzero(grid == cls))
+        n_val = int(round(len(idx) * val_split)) if len(idx) > 1 else 0
+        val_idx.extend(idx[:n_val].tolist())
+        train_idx.extend(idx[n_val:].tolist())
+    return sorted(train_idx), sorted(val_idx)
+
+def build_balanced_sampler(mat_labels, fin_labels, epoch_size=None):
+    """
+    Samples every occupied cell of the 6x7 material/finish grid equally often.
+    epoch_size sets the number of samples drawn per epoch (default: dataset size).
+    """
+    grid = mat_labels * len(FINISHES) + fin_labels
+    counts = np.bincount(grid, minlength=len(MATERIALS) * len(FINISHES))
+    weights = 1.0 / counts[grid]
+    return WeightedRandomSampler(torch.as_tensor(weights, dtype=torch.double),
+                                 num_samples=epoch_size or len(grid), replacement=True)
+
+@torch.no_grad()
+def evaluate(model, dataloader, device):
+    """
+    Returns (mean loss, material confusion matrix, finish confusion matrix).
+    Rows are true classes, columns are predictions.
+    """
+    model.eval()
+    criterion = nn.CrossEntropyLoss(reduction='sum')
+    mat_conf = torch.zeros(len(MATERIALS), len(MATERIALS), dtype=torch.long)
+    fin_conf = torch.zeros(len(FINISHES), len(FINISHES), dtype=torch.long)
+    total_loss, total = 0.0, 0
+
+    for images, mat_labels, fin_labels in dataloader:
+        images = images.to(device)
+        mat_labels = mat_labels.to(device)
+        fin_labels = fin_labels.to(device)
+        mat_out, fin_out = model(images)
+        total_loss += (criterion(mat_out, mat_labels) + criterion(fin_out, fin_labels)).item()
+        total += images.size(0)
+
+        mat_conf += torch.bincount((mat_labels * len(MATERIALS) + mat_out.argmax(1)).cpu(),
+                                   minlength=len(MATERIALS) ** 2).reshape(len(MATERIALS), len(MATERIALS))
+        fin_conf += torch.bincount((fin_labels * len(FINISHES) + fin_out.argmax(1)).cpu(),
+                                   minlength=len(FINISHES) ** 2).reshape(len(FINISHES), len(FINISHES))
+
+    return total_loss / max(total, 1), mat_conf, fin_conf
+
+def per_class_metrics(conf, names):
+    """
+    Returns {"accuracy", "macro_recall", "classes": {name: {precision, recall, support}}}.
+    """
+    conf = conf.double()
+    tp = conf.diag()
+    support = conf.sum(1)
+    predicted = conf.sum(0)
+    precision = torch.where(predicted > 0, tp / predicted.clamp(min=1), torch.zeros_like(tp))
+    recall = torch.where(support > 0, tp / support.clamp(min=1), torch.zeros_like(tp))
+    present = support > 0
+    return {
+        "accuracy": (tp.sum() / conf.sum().clamp(min=1)).item(),
+        "macro_recall": recall[present].mean().item() if present.any() else 0.0,
+        "classes": {name: {"precision": precision[i].item(), "recall": recall[i].item(), "support": int(support[i].item())}
+                    for i, name in enumerate(names)},
+    }
+
+def print_metrics(title, metrics):
+    print(f"  [{title}] acc {metrics['accuracy']*100:.1f}% | macro recall {metrics['macro_recall']*100:.1f}%")
+    for name, m in metrics["classes"].items():
+        if m["support"] > 0:
+            print(f"    {name:<9} P {m['precision']*100:5.1f}%  R {m['recall']*100:5.1f}%  (n={m['support']})")
+
+def build_dataloader(dataset, batch_size, device, num_workers=4, prefetch_factor=2, persistent_workers=True,
+                     shuffle=True, sampler=None):
+    loader_kwargs = dict(
+        batch_size=batch_size,
+        shuffle=shuffle and sampler is None,
+        sampler=sampler,
+        num_workers=num_workers,
+        pin_memory=device.type == "cuda",
+    )
+    # prefetch_factor / persistent_workers are only valid with worker processes
+    if num_workers > 0:
+        loader_kwargs["prefetch_factor"] = prefetch_factor
+        loader_kwargs["persistent_workers"] = persistent_workers
+    return DataLoader(dataset, **loader_kwargs)
+
+def train_model(num_epochs=10, batch_size=32, lr=1e-4, packed_dir=None,
+                train_dir=os.path.join("dataset", "train"), checkpoint_path='checkpoints/v_sams_model.pth',
+                num_workers=4, prefetch_factor=2, persistent_workers=True,
+                val_split=0.1, balanced=True, epoch_size=None, patience=5, min_delta=1e-4):
+    """
+    Trains the full model with per-epoch validation.
+
+    The best epoch (lowest validation loss) is written to checkpoint_path and the most
+    recent one to <checkpoint>_last.pth, each with a metadata sidecar (vsams.checkpoint).
+    The learning rate is halved when validation loss plateaus for 2 epochs, and training
+    stops after `patience` epochs without improvement (patience=0 disables early stopping).
+    Without a validation split, the training loss is monitored instead.
+    """
+    device = get_device()
+    print(f"학습 장치 설정: {device}")
     
-    # 2. Dataset & Dataloader
-    train_dir = os.path.join("dataset", "train")
-    dataset = SurfaceDataset(train_dir, transform=train_transform)
+    # 1. Augmentations (Albumentations) & 2. Dataset
+    # packed_dir: output of `python -m vsams.data.packed` (no per-epoch JPEG decoding)
+    # One listing for the pack check and both datasets, so the split indices refer to the same images
+    samples = list_samples(train_dir)
+    use_pack = packed_dir and pack_is_current(packed_dir, train_dir, samples=samples)
+    if packed_dir and not use_pack:
+        print(f"Pack {packed_dir} is missing or older than {train_dir}; reading images directly "
+              f"(rebuild with `python -m vsams.data.packed`)")
+    if use_pack:
+        dataset = PackedSurfaceDataset(packed_dir, transform=build_train_transform(resize=False))
+        eval_dataset = PackedSurfaceDataset(packed_dir, transform=build_eval_transform(resize=False))
+    else:
+        dataset = SurfaceDataset(train_dir, transform=build_train_transform(), samples=samples)
+        eval_dataset = SurfaceDataset(train_dir, transform=build_eval_transform(), samples=samples)
     
     if len(dataset) == 0:
         print("No data found. Please collect data using labeler.py first.")
         return
 
-    dataloader = DataLoader(dataset, batch_size=batch_size, shuffle=True)
+    # Stratified validation split (same indices into the augmented / plain datasets)
+    mat_labels, fin_labels = dataset.get_labels()
+    train_idx, val_idx = split_indices(mat_labels, fin_labels, val_split)
+    train_set = Subset(dataset, train_idx)
+    print(f"Train: {len(train_idx)} / Validation: {len(val_idx)}")
+
+    # Class-balanced sampling across the material x finish grid
+    sampler = build_balanced_sampler(mat_labels[train_idx], fin_labels[train_idx], epoch_size) if balanced else None
+    dataloader = build_dataloader(train_set, batch_size, device, num_workers=num_workers,
+                                  prefetch_factor=prefetch_factor, persistent_workers=persistent_workers, sampler=sampler)
+    val_loader = None
+    if val_idx:
+        val_loader = build_dataloader(Subset(eval_dataset, val_idx), batch_size * 2, device, num_workers=num_workers,
+                                      prefetch_factor=prefetch_factor, persistent_workers=persistent_workers, shuffle=False)
+    non_blocking = device.type == "cuda"
     
     # 3. Model
     model = SurfaceClassifier(
@@ -101,16 +237,31 @@ def train_model(num_epochs=10, batch_size=32, lr=1e-4):
     criterion_material = nn.CrossEntropyLoss()
     criterion_finish = nn.CrossEntropyLoss()
     optimizer = optim.Adam(model.parameters(), lr=lr)
+    scheduler = optim.lr_scheduler.ReduceLROnPlateau(optimizer, mode='min', factor=0.5, patience=2)
+    
+    best_loss = float('inf')
+    best_epoch = 0
+    epochs_without_improvement = 0
+    last_path = last_checkpoint_path(checkpoint_path)
     
     print("Starting Training Loop...")
     for epoch in range(num_epochs):
         model.train()
         running_loss = 0.0
+        data_time = 0.0
+        compute_time = 0.0
+        num_images = 0
+        epoch_start = time.perf_counter()
         
+        batch_start = time.perf_counter()
         for images, mat_labels, fin_labels in dataloader:
-            images = images.to(device)
-            mat_labels = mat_labels.to(device)
-            fin_labels = fin_labels.to(device)
+            # Time spent blocked on the DataLoader (decode + augmentation not hidden by workers)
+            data_time += time.perf_counter() - batch_start
+            compute_start = time.perf_counter()
+            
+            images = images.to(device, non_blocking=non_blocking)
+            mat_labels = mat_labels.to(device, non_blocking=non_blocking)
+            fin_labels = fin_labels.to(device, non_blocking=non_blocking)
             
             optimizer.zero_grad()
             mat_out, fin_out = model(images)
@@ -123,13 +274,165 @@ def train_model(num_epochs=10, batch_size=32, lr=1e-4):
             optimizer.step()
             
             running_loss += total_loss.item()
+            sync_device(device)
+            compute_time += time.perf_counter() - compute_start
+            num_images += images.size(0)
+            batch_start = time.perf_counter()
             
+        epoch_time = time.perf_counter() - epoch_start
+        train_loss = running_loss / len(dataloader)
+        print(f"Epoch [{epoch+1}/{num_epochs}], Loss: {train_loss:.4f}, LR: {optimizer.param_groups[0]['lr']:.2e}")
+        print(f"  Time: {epoch_time:.1f}s (data wait {data_time:.1f}s / {100*data_time/epoch_time:.0f}%, "
+              f"compute {compute_time:.1f}s) | {num_images/epoch_time:.1f} images/sec")
+        
+        metrics = {"train_loss": train_loss}
+        monitored = train_loss
+        if val_loader is not None:
+            val_loss, mat_conf, fin_conf = evaluate(model, val_loader, device)
+            mat_metrics = per_class_metrics(mat_conf, MATERIALS)
+            fin_metrics = per_class_metrics(fin_conf, FINISHES)
+            print(f"  Val Loss: {val_loss:.4f}")
+            print_metrics("Material", mat_metrics)
+            print_metrics("Finish", fin_metrics)
+            metrics.update({
+                "val_loss": val_loss,
+                "material_accuracy": mat_metrics["accuracy"],
+                "finish_accuracy": fin_metrics["accuracy"],
+                "material_macro_recall": mat_metrics["macro_recall"],
+                "finish_macro_recall": fin_metrics["macro_recall"],
+            })
+            monitored = val_loss
+        
+        scheduler.step(monitored)
+        
+        # 5. Save Model (last every epoch, best on improvement)
+        save_checkpoint(model.state_dict(), last_path, build_metadata(epoch=epoch + 1, metrics=metrics))
+        if monitored < best_loss - min_delta:
+            best_loss = monitored
+            best_epoch = epoch + 1
+            epochs_without_improvement = 0
+            save_checkpoint(model.state_dict(), checkpoint_path, build_metadata(epoch=epoch + 1, metrics=metrics))
+            print(f"  New best model (epoch {best_epoch}) saved to {checkpoint_path}")
+        else:
+            epochs_without_improvement += 1
+            if patience and epochs_without_improvement >= patience:
+                print(f"Early stopping: no improvement for {patience} epochs.")
+                break
+
+    print(f"Training Complete. Best epoch {best_epoch} saved to {checkpoint_path} (last: {last_path})")
+
+def train_heads(num_epochs=30, batch_size=256, lr=1e-3, train_dir=os.path.join("dataset", "train"),
+                checkpoint_path='checkpoints/v_sams_model.pth', cache_dir=os.path.join("dataset", "feature_cache")):
+    """
+    Retrains only material_head / finish_head on cached backbone features.
+    Images are embedded once (content-hash keyed), so adding a few labeled samples
+    only costs their forward passes plus a few seconds of head training.
+    """
+    device = get_device()
+    print(f"학습 장치 설정: {device}")
+
+    # Every image is embedded, so drop manifest entries whose file is gone
+    samples = list_samples(train_dir, verify=True)
+    if not samples:
+        print("No data found. Please collect data using labeler.py first.")
+        return
+
+    model = SurfaceClassifier(num_materials=len(MATERIALS), num_finishes=len(FINISHES),
+                              pretrained=not os.path.exists(checkpoint_path))
+    if os.path.exists(checkpoint_path):
+        model.load_state_dict(torch.load(checkpoint_path, map_location='cpu'))
+    else:
+        print(f"Warning: {checkpoint_path} not found. Training heads on the ImageNet backbone.")
+    model.to(device)
+
+    # 1. Features (only new/changed images go through the backbone)
+    cache = FeatureCache(cache_dir, backbone_fingerprint(model))
+    predictor = BatchPredictor(model, batch_size=64, device=device, precision="fp32")
+    embed = lambda paths: predictor.extract_features(paths).float().cpu().numpy()
+    features = cache.update([s[0] for s in samples], embed)
+
+    dataset = TensorDataset(
+        torch.from_numpy(features),
+        torch.tensor([s[1] for s in samples]),
+        torch.tensor([s[2] for s in samples]),
+    )
+    dataloader = DataLoader(dataset, batch_size=batch_size, shuffle=True)
+
+    # 2. Heads only
+    for param in model.backbone.parameters():
+        param.requires_grad = False
+    head_params = list(model.material_head.parameters()) + list(model.finish_head.parameters())
+    optimizer = optim.Adam(head_params, lr=lr)
+    criterion = nn.CrossEntropyLoss()
+
+    print(f"Training heads on {len(dataset)} cached feature vectors...")
+    start = time.perf_counter()
+    for epoch in range(num_epochs):
+        model.material_head.train()
+        model.finish_head.train()
+        running_loss = 0.0
+
+        for feats, mat_labels, fin_labels in dataloader:
+            feats = feats.to(device)
+            mat_labels = mat_labels.to(device)
+            fin_labels = fin_labels.to(device)
+
+            optimizer.zero_grad()
+            total_loss = criterion(model.material_head(feats), mat_labels) + criterion(model.finish_head(feats), fin_labels)
+            total_loss.backward()
+            optimizer.step()
+            running_loss += total_loss.item()
+
         print(f"Epoch [{epoch+1}/{num_epochs}], Loss: {running_loss/len(dataloader):.4f}")
+    print(f"Head training took {time.perf_counter() - start:.1f}s")
+
+    save_checkpoint(model.state_dict(), checkpoint_path,
+                    build_metadata(epoch=num_epochs, metrics={"train_loss": running_loss / len(dataloader)}, heads_only=True))
+    print(f"Heads updated. Model saved to {checkpoint_path}")
 
-    # 5. Save Model
-    os.makedirs('checkpoints', exist_ok=True)
-    torch.save(model.state_dict(), 'checkpoints/v_sams_model.pth')
-    print("Training Complete. Model saved to checkpoints/v_sams_model.pth")
+def parse_args():
+    parser = argparse.ArgumentParser(description="V-SAMS training")
+    parser.add_argument("--epochs", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--lr", type=float, default=1e-4)
+    parser.add_argument("--train-dir", default=os.path.join("dataset", "train"))
+    parser.add_argument("--packed-dir", default=None, help="Packed dataset from `python -m vsams.data.packed`")
+    parser.add_argument("--checkpoint", default='checkpoints/v_sams_model.pth')
+    parser.add_argument("--workers", type=int, default=4, help="DataLoader worker processes (0 = main process)")
+    parser.add_argument("--prefetch-factor", type=int, default=2, help="Batches prefetched per worker")
+    parser.add_argument("--no-persistent-workers", action="store_true", help="Restart workers every epoch")
+    parser.add_argument("--val-split", type=float, default=0.1, help="Held-out fraction for validation / early stopping")
+    parser.add_argument("--no-balance", action="store_true", help="Plain shuffling instead of class-balanced sampling")
+    parser.add_argument("--epoch-size", type=int, default=None, help="Samples drawn per epoch with balanced sampling")
+    parser.add_argument("--patience", type=int, default=5, help="Early stopping patience in epochs (0 = off)")
+    parser.add_argument("--heads-only", action="store_true", help="Retrain only the heads on cached backbone features")
+    parser.add_argument("--feature-cache", default=os.path.join("dataset", "feature_cache"))
+    return parser.parse_args()
 
 if __name__ == "__main__":
-    train_model(num_epochs=5)
+    args = parse_args()
+    if args.heads_only:
+        train_heads(
+            num_epochs=args.epochs,
+            batch_size=args.batch_size,
+            lr=args.lr,
+            train_dir=args.train_dir,
+            checkpoint_path=args.checkpoint,
+            cache_dir=args.feature_cache,
+        )
+    else:
+        train_model(
+            num_epochs=args.epochs,
+            batch_size=args.batch_size,
+            lr=args.lr,
+            packed_dir=args.packed_dir,
+            train_dir=args.train_dir,
+            checkpoint_path=args.checkpoint,
+            num_workers=args.workers,
+            prefetch_factor=args.prefetch_factor,
+            persistent_workers=not args.no_persistent_workers,
+            val_split=args.val_split,
+            balanced=not args.no_balance,
+            epoch_size=args.epoch_size,
+            patience=args.patience,
+        )
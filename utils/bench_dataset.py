@@ -0,0 +1,50 @@
+"""
+Compares images/sec of the folder loader (train.SurfaceDataset) against the
+memory-mapped pack (vsams.data.packed.PackedSurfaceDataset).
+
+    python utils/bench_dataset.py --root dataset/train --packed dataset/packed --samples 1000
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from train import SurfaceDataset, build_train_transform
+from vsams.data.packed import PackedSurfaceDataset, pack_dataset
+
+
+def measure(dataset, num_samples):
+    num_samples = min(num_samples, len(dataset))
+    start = time.perf_counter()
+    for i in range(num_samples):
+        dataset[i]
+    elapsed = time.perf_counter() - start
+    return num_samples / elapsed if elapsed > 0 else float("inf")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Folder vs packed dataset throughput")
+    parser.add_argument("--root", default="dataset/train")
+    parser.add_argument("--packed", default="dataset/packed")
+    parser.add_argument("--samples", type=int, default=1000)
+    args = parser.parse_args()
+
+    pack_dataset(args.root, args.packed)
+
+    folder = SurfaceDataset(args.root, transform=build_train_transform())
+    packed = PackedSurfaceDataset(args.packed, transform=build_train_transform(resize=False))
+    if len(folder) == 0:
+        print("No data found.")
+        return
+
+    folder_ips = measure(folder, args.samples)
+    packed_ips = measure(packed, args.samples)
+    print(f"Folder loader : {folder_ips:8.1f} images/sec")
+    print(f"Packed loader : {packed_ips:8.1f} images/sec")
+    print(f"Speedup       : {packed_ips / folder_ips:8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
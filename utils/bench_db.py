@@ -0,0 +1,105 @@
+"""
+Compares query and insert latency of the JSON catalog against the SQLite store
+on a synthetic catalog (written to a temporary directory, the real database is untouched).
+
+    python utils/bench_db.py --products 20000 --queries 1000 --inserts 50
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from vsams.labels import MATERIALS, FINISHES
+from vsams.utils.db_handler import ProductCatalog
+from vsams.utils.product_store import SQLiteProductStore
+
+
+def make_product(i, rng):
+    return {
+        "id": f"PF-{i:06d}",
+        "name": f"Synthetic-{i}",
+        "description": "Synthetic benchmark product",
+        "specs": {"base_material": "PE", "adhesive": "Acrylic", "tack_force": f"{rng.randint(10, 500)} gf/25mm"},
+        "target_condition": {
+            "material_category": rng.sample(MATERIALS, rng.randint(1, 3)),
+            "finish_type": rng.sample(FINISHES, rng.randint(1, 3)),
+            "risk_residue": "Medium",
+        },
+        "image_url": "images/placeholder.png",
+    }
+
+
+def timed(fn, repeats):
+    samples = []
+    for i in range(repeats):
+        start = time.perf_counter()
+        fn(i)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples), max(samples)
+
+
+def json_scan_query(path, material, finish):
+    # Original db_handler behaviour: load and scan the whole file per query
+    with open(path, 'r', encoding='utf-8') as f:
+        products = json.load(f)
+    return [p for p in products
+            if material in p['target_condition']['material_category'] and finish in p['target_condition']['finish_type']]
+
+
+def json_insert(path, product):
+    # Original save path: load, append, re-serialize everything
+    with open(path, 'r', encoding='utf-8') as f:
+        products = json.load(f)
+    products.append(product)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(products, f, indent=2, ensure_ascii=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="JSON vs SQLite product store latency")
+    parser.add_argument("--products", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--inserts", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    products = [make_product(i, rng) for i in range(args.products)]
+    pairs = [(rng.choice(MATERIALS), rng.choice(FINISHES)) for _ in range(args.queries)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        json_path = os.path.join(tmp, "database.json")
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump(products, f, indent=2, ensure_ascii=False)
+
+        store = SQLiteProductStore(os.path.join(tmp, "database.sqlite"))
+        start = time.perf_counter()
+        store.import_json(json_path)
+        print(f"Imported {args.products} products into SQLite in {time.perf_counter() - start:.2f}s")
+
+        json_catalog = ProductCatalog(json_path)
+        json_catalog.refresh()
+
+        scan_repeats = min(args.queries, 20)
+        results = [
+            ("query  json (load + scan)", timed(lambda i: json_scan_query(json_path, *pairs[i]), scan_repeats)),
+            ("query  json (indexed cache)", timed(lambda i: json_catalog.query(*pairs[i]), args.queries)),
+            ("query  sqlite", timed(lambda i: store.query(*pairs[i]), args.queries)),
+            ("insert json (rewrite file)", timed(lambda i: json_insert(json_path, make_product(args.products + i, rng)), args.inserts)),
+            ("insert sqlite (upsert)", timed(lambda i: store.upsert(make_product(2 * args.products + i, rng)), args.inserts)),
+        ]
+        store.close()
+
+    print(f"{'operation':<30}{'p50 ms':>10}{'max ms':>10}")
+    for name, (p50, worst) in results:
+        print(f"{name:<30}{p50:>10.3f}{worst:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
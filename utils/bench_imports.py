@@ -0,0 +1,106 @@
+"""
+Import-time / cold-start benchmark based on `python -X importtime`.
+
+Each target is imported in a fresh interpreter. The report shows the total import
+time, whether torch was pulled in, and the slowest modules by self time. Targets
+marked light (admin DB mode, labeler, CLI entry point) must never import torch;
+the script exits 1 if one does or if --budget-ms is exceeded, so it can guard
+against regressions in CI.
+
+    python utils/bench_imports.py
+    python utils/bench_imports.py --targets admin,labeler --budget-ms 300
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# name -> (modules imported, must stay torch-free)
+TARGETS = {
+    "vsams": (["vsams"], True),
+    # app.py top-level imports (everything the admin DB mode needs)
+    "admin": (["vsams.prediction_cache", "vsams.utils.db_handler"], True),
+    "labeler": (["vsams.utils.ingest_index", "vsams.data.manifest"], True),
+    "cli": (["vsams.cli"], True),
+    "integration": (["integration_pipeline"], True),
+    # Reference: the full inference stack
+    "inference": (["vsams.inference"], False),
+}
+
+HEAVY_MODULES = ("torch", "torchvision", "timm")
+
+
+def parse_importtime(stderr):
+    """
+    Returns [(module, self_us, cumulative_us), ...] from -X importtime output.
+    """
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+            rows.append((name.strip(), int(self_us), int(cumulative_us)))
+        except ValueError:
+            continue
+    return rows
+
+
+def measure(modules, repeats=3):
+    """
+    Imports modules in a fresh interpreter (best of repeats) and returns the parsed rows.
+    """
+    code = "; ".join(f"import {m}" for m in modules)
+    best = None
+    for _ in range(repeats):
+        proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=ROOT,
+                              capture_output=True, text=True)
+        if proc.returncode != 0:
+            raise RuntimeError(f"import {', '.join(modules)} failed:\n{proc.stderr.strip().splitlines()[-1]}")
+        rows = parse_importtime(proc.stderr)
+        total = sum(r[1] for r in rows)
+        if best is None or total < best[0]:
+            best = (total, rows)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import time / cold start per entry point")
+    parser.add_argument("--targets", default=",".join(TARGETS), help=f"Comma separated subset of {list(TARGETS)}")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--top", type=int, default=5, help="Slowest modules listed per target")
+    parser.add_argument("--budget-ms", type=float, default=None, help="Fail if a light target takes longer")
+    args = parser.parse_args()
+
+    failures = []
+    for name in args.targets.split(","):
+        modules, light = TARGETS[name]
+        try:
+            total_us, rows = measure(modules, args.repeats)
+        except RuntimeError as e:
+            print(f"[{name}] {e}")
+            failures.append(name)
+            continue
+
+        imported = {r[0].split(".")[0] for r in rows}
+        heavy = [m for m in HEAVY_MODULES if m in imported]
+        print(f"[{name}] {total_us / 1000:8.1f} ms | {len(rows)} modules | heavy: {', '.join(heavy) or 'none'}")
+        for module, self_us, _ in sorted(rows, key=lambda r: -r[1])[:args.top]:
+            print(f"    {self_us / 1000:8.1f} ms  {module}")
+
+        if light and heavy:
+            print(f"  ✗ {name} must not import {', '.join(heavy)}")
+            failures.append(name)
+        if light and args.budget_ms is not None and total_us / 1000 > args.budget_ms:
+            print(f"  ✗ {name} exceeds the {args.budget_ms:.0f} ms budget")
+            failures.append(name)
+
+    if failures:
+        print(f"FAILED: {', '.join(sorted(set(failures)))}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
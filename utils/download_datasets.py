@@ -1,11 +1,68 @@
 import os
-import requests
+import io
+import json
+import argparse
 import tarfile
 import shutil
-from tqdm import tqdm
-from huggingface_hub import snapshot_download
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from vsams.data.manifest import DatasetManifest
+from vsams.utils.ingest_index import IngestIndex, file_hashes
+
+DTD_URL = "https://www.robots.ox.ac.uk/~vgg/data/dtd/download/dtd-r1.0.1.tar.gz"
+MINC_REPO = "mcimpoi/minc-2500_split_1"
+MANIFEST_NAME = "bootstrap_manifest.json"
+# Dedupe index shared with labeler.py (dataset/ingest_index.json next to dataset/train)
+INGEST_INDEX_NAME = "ingest_index.json"
+
+minc_map = {
+    "metal": "Metal",
+    "plastic": "Plastic",
+    "glass": "Glass",
+    "painted": "Painted",
+    "wood": "Wood",
+    "other": "Other",
+    "ceramic": "Other",
+    "carpet": "Other",
+    "leather": "Other",
+    "paper": "Other",
+    "stone": "Other"
+}
+
+dtd_map = {
+    "glossy": "Glossy",
+    "bumpy": "Rough",
+    "pitted": "Rough",
+    "grooved": "Hairline",
+    "matted": "Matte",
+    "dotted": "Pattern",
+    "striped": "Pattern",
+    "grid": "Pattern",
+    "scaly": "Rough",
+    "meshed": "Pattern"
+}
+
+# MINC Label ID Mapping (from README.md)
+MINC_LABELS = {
+    0: "brick", 1: "carpet", 2: "ceramic", 3: "fabric", 4: "foliage",
+    5: "food", 6: "glass", 7: "hair", 8: "leather", 9: "metal",
+    10: "mirror", 11: "other", 12: "painted", 13: "paper", 14: "plastic",
+    15: "polishedstone", 16: "skin", 17: "sky", 18: "stone", 19: "tile",
+    20: "wallpaper", 21: "water", 22: "wood"
+}
+
+DEFAULT_MAT = "Other"
+DEFAULT_FIN = "Other"
+
 
 def download_file(url, filename):
+    import requests
+    from tqdm import tqdm
+
     if os.path.exists(filename):
         print(f"Skipping download: {filename} already exists.")
         return
@@ -13,130 +70,245 @@ def download_file(url, filename):
     total_size = int(response.headers.get('content-length', 0))
     block_size = 1024
     t = tqdm(total=total_size, unit='iB', unit_scale=True, desc=filename)
-    with open(filename, 'wb') as f:
+    # Download to a temp name so an interrupted run is not mistaken for a finished file
+    with open(filename + ".part", 'wb') as f:
         for data in response.iter_content(block_size):
             t.update(len(data))
             f.write(data)
     t.close()
+    os.replace(filename + ".part", filename)
 
-def setup_full_dataset():
-    # 1. DTD (Describable Textures Dataset)
-    dtd_url = "https://www.robots.ox.ac.uk/~vgg/data/dtd/download/dtd-r1.0.1.tar.gz"
-    dtd_tar = "dtd.tar.gz"
-    download_file(dtd_url, dtd_tar)
-    
-    if not os.path.exists("dtd"):
-        print("Extracting DTD...")
+
+def extract_dtd(dtd_tar, dtd_dir):
+    """
+    Extracts the DTD tarball (top-level dtd/ folder) so its contents end up in dtd_dir,
+    whatever dtd_dir is called.
+    """
+    parent = os.path.dirname(os.path.abspath(dtd_dir))
+    os.makedirs(parent, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(prefix=".dtd-extract-", dir=parent)
+    try:
         with tarfile.open(dtd_tar, "r:gz") as tar:
-            tar.extractall()
-    
-    # 2. MINC-2500 (Materials in Context) - Hugging Face 사용
-    print("Downloading MINC-2500 from Hugging Face...")
-    minc_path = snapshot_download(repo_id="mcimpoi/minc-2500_split_1", repo_type="dataset", local_dir="minc-2500")
+            # filter="data" rejects absolute paths, ".." and links outside the target (Python 3.12+, backported)
+            if hasattr(tarfile, "data_filter"):
+                tar.extractall(tmp_dir, filter="data")
+            else:
+                tar.extractall(tmp_dir)
+        src = os.path.join(tmp_dir, "dtd")
+        if not os.path.isdir(src):
+            raise RuntimeError(f"{dtd_tar} has no top-level dtd/ folder")
+        shutil.move(src, dtd_dir)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+# --- Resumable Manifest ---
+def load_manifest(dataset_root):
+    path = os.path.join(dataset_root, MANIFEST_NAME)
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    return {"minc_done": [], "minc_counts": {}, "dtd_done": []}
 
-    # 3. V-SAMS 구조로 매핑
-    dataset_root = "dataset/train"
-    if os.path.exists(dataset_root):
-        shutil.rmtree(dataset_root)
-    os.makedirs(dataset_root, exist_ok=True)
 
-    minc_map = {
-        "metal": "Metal",
-        "plastic": "Plastic",
-        "glass": "Glass",
-        "painted": "Painted",
-        "wood": "Wood",
-        "other": "Other",
-        "ceramic": "Other",
-        "carpet": "Other",
-        "leather": "Other",
-        "paper": "Other",
-        "stone": "Other"
-    }
-
-    dtd_map = {
-        "glossy": "Glossy",
-        "bumpy": "Rough",
-        "pitted": "Rough",
-        "grooved": "Hairline",
-        "matted": "Matte",
-        "dotted": "Pattern",
-        "striped": "Pattern",
-        "grid": "Pattern",
-        "scaly": "Rough",
-        "meshed": "Pattern"
-    }
-
-    DEFAULT_MAT = "Other"
-    DEFAULT_FIN = "Other"
-
-    # 이미지 수집 루프 (MINC)
-    print("Mapping MINC images from Parquet files...")
-    import pandas as pd
-    import io
+def save_manifest(dataset_root, manifest):
+    path = os.path.join(dataset_root, MANIFEST_NAME)
+    with open(path + ".tmp", 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+# --- Workers (run in the process pool) ---
+def save_minc_image(job):
+    """
+    Decodes one MINC image and saves it as JPG. Returns (save_path, success, sha1, dhash).
+    """
     from PIL import Image
 
-    # MINC Label ID Mapping (from README.md)
-    MINC_LABELS = {
-        0: "brick", 1: "carpet", 2: "ceramic", 3: "fabric", 4: "foliage",
-        5: "food", 6: "glass", 7: "hair", 8: "leather", 9: "metal",
-        10: "mirror", 11: "other", 12: "painted", 13: "paper", 14: "plastic",
-        15: "polishedstone", 16: "skin", 17: "sky", 18: "stone", 19: "tile",
-        20: "wallpaper", 21: "water", 22: "wood"
-    }
-
-    minc_data_dir = os.path.join("minc-2500", "data")
-    if os.path.exists(minc_data_dir):
-        parquet_files = [f for f in os.listdir(minc_data_dir) if f.endswith(".parquet")]
-        
-        for p_file in parquet_files:
-            print(f"Processing {p_file}...")
-            df = pd.read_parquet(os.path.join(minc_data_dir, p_file))
-            
-            # Iterate rows
-            for idx, row in df.iterrows():
-                label_id = row['label']
-                label_name = MINC_LABELS.get(label_id, "unknown")
-                
-                # Check if this class is in our target map
-                if label_name in minc_map:
+    img_bytes, save_path = job
+    if not os.path.exists(save_path):
+        try:
+            img = Image.open(io.BytesIO(img_bytes)).convert("RGB")
+            img.save(save_path + ".tmp.jpg", format="JPEG")
+            os.replace(save_path + ".tmp.jpg", save_path)
+        except Exception as e:
+            print(f"Failed to save {save_path}: {e}")
+            return save_path, False, None, None
+    return (save_path, True) + file_hashes(save_path)
+
+
+def copy_file(job):
+    src, dst = job
+    if not (os.path.exists(dst) and os.path.getsize(dst) == os.path.getsize(src)):
+        shutil.copyfile(src, dst)
+    return (dst,) + file_hashes(dst)
+
+
+# --- MINC (Parquet, streamed in row-group batches) ---
+def map_minc(minc_data_dir, dataset_root, manifest, dataset_manifest, ingest_index, pool, per_class_limit=300,
+             batch_rows=256):
+    import pyarrow.parquet as pq
+
+    counts = manifest["minc_counts"]
+    target_folders = {f"{mat}_{DEFAULT_FIN}" for mat in minc_map.values()}
+    parquet_files = sorted(f for f in os.listdir(minc_data_dir) if f.endswith(".parquet"))
+
+    for p_file in parquet_files:
+        pf = pq.ParquetFile(os.path.join(minc_data_dir, p_file))
+        stem = os.path.splitext(p_file)[0]
+
+        for rg in range(pf.num_row_groups):
+            unit = f"{p_file}:{rg}"
+            if unit in manifest["minc_done"]:
+                continue
+
+            # All capped classes are full: nothing left to take from any file
+            if all(counts.get(folder, 0) >= per_class_limit for folder in target_folders):
+                print("All MINC classes reached the per-class limit.")
+                return
+
+            print(f"Processing {unit}...")
+            row_offset = sum(pf.metadata.row_group(i).num_rows for i in range(rg))
+            for batch in pf.iter_batches(batch_size=batch_rows, row_groups=[rg], columns=["image", "label"]):
+                labels = batch.column("label").to_pylist()
+                images = batch.column("image")
+
+                jobs = []
+                for i, label_id in enumerate(labels):
+                    label_name = MINC_LABELS.get(label_id, "unknown")
+                    # Check if this class is in our target map
+                    if label_name not in minc_map:
+                        continue
                     mat = minc_map[label_name]
                     vsams_folder = f"{mat}_{DEFAULT_FIN}"
+                    if counts.get(vsams_folder, 0) >= per_class_limit:
+                        continue
+                    counts[vsams_folder] = counts.get(vsams_folder, 0) + 1
+
                     target_dir = os.path.join(dataset_root, vsams_folder)
                     os.makedirs(target_dir, exist_ok=True)
-                    
-                    # Limit samples per class per file to avoid too many small files if not needed
-                    # But since we want to retrain properly, let's take a good amount.
-                    # Simple check: if folder has > 300 items, skip.
-                    if len(os.listdir(target_dir)) >= 300:
-                        continue
-                        
-                    # Save Image
-                    img_bytes = row['image']['bytes']
-                    img = Image.open(io.BytesIO(img_bytes))
-                    
-                    # Save as JPG
-                    save_path = os.path.join(target_dir, f"minc_{label_name}_{idx}.jpg")
-                    img.save(save_path)
-
-
-    # 이미지 수집 루프 (DTD)
-    print("Mapping DTD images...")
-    dtd_images_base = os.path.join("dtd", "images")
-    if os.path.exists(dtd_images_base):
-        for dtd_class in os.listdir(dtd_images_base):
-            src_dir = os.path.join(dtd_images_base, dtd_class)
-            if not os.path.isdir(src_dir): continue
-            
-            fin = dtd_map.get(dtd_class, DEFAULT_FIN)
-            vsams_folder = f"{DEFAULT_MAT}_{fin}"
-            target_dir = os.path.join(dataset_root, vsams_folder)
-            os.makedirs(target_dir, exist_ok=True)
-            
-            for img in os.listdir(src_dir):
-                shutil.copy(os.path.join(src_dir, img), os.path.join(target_dir, img))
-
-    print("Full Dataset Bootstrapping Complete.")
+                    save_path = os.path.join(target_dir, f"minc_{label_name}_{stem}_{row_offset + i}.jpg")
+                    jobs.append((images[i].as_py()["bytes"], save_path))
+
+                row_offset += len(labels)
+                entries = []
+                for save_path, ok, sha1, phash in pool.map(save_minc_image, jobs, chunksize=16):
+                    if ok:
+                        entries.append(dataset_manifest.make_entry(save_path, sha1=sha1))
+                        ingest_index.add(sha1, phash, save_path)
+                    else:
+                        folder = os.path.basename(os.path.dirname(save_path))
+                        counts[folder] -= 1
+                dataset_manifest.add_entries(entries)
+
+            # Row group finished: checkpoint progress so an interrupted run resumes here
+            manifest["minc_done"].append(unit)
+            ingest_index.save()
+            save_manifest(dataset_root, manifest)
+
+
+# --- DTD (Folder copy) ---
+def map_dtd(dtd_images_base, dataset_root, manifest, dataset_manifest, ingest_index, pool):
+    for dtd_class in sorted(os.listdir(dtd_images_base)):
+        src_dir = os.path.join(dtd_images_base, dtd_class)
+        if not os.path.isdir(src_dir) or dtd_class in manifest["dtd_done"]:
+            continue
+
+        fin = dtd_map.get(dtd_class, DEFAULT_FIN)
+        vsams_folder = f"{DEFAULT_MAT}_{fin}"
+        target_dir = os.path.join(dataset_root, vsams_folder)
+        os.makedirs(target_dir, exist_ok=True)
+
+        jobs = [(os.path.join(src_dir, img), os.path.join(target_dir, img)) for img in os.listdir(src_dir)]
+        entries = []
+        for dst, sha1, phash in pool.map(copy_file, jobs, chunksize=32):
+            entries.append(dataset_manifest.make_entry(dst, vsams_folder, sha1))
+            ingest_index.add(sha1, phash, dst)
+        dataset_manifest.add_entries(entries)
+
+        manifest["dtd_done"].append(dtd_class)
+        ingest_index.save()
+        save_manifest(dataset_root, manifest)
+
+
+def setup_full_dataset(dataset_root="dataset/train", dtd_tar="dtd.tar.gz", dtd_dir="dtd", minc_dir="minc-2500",
+                       offline=False, clean=False, workers=None, per_class_limit=300):
+    """
+    Bootstraps dataset/train from DTD and MINC-2500.
+
+    The run is resumable and idempotent: progress (finished MINC row groups, per-class
+    counts, finished DTD classes) is kept in dataset/train/bootstrap_manifest.json.
+    offline=True skips downloads and uses existing dtd_tar / dtd_dir / minc_dir
+    (e.g. local fixture files).
+    """
+    # 1. DTD (Describable Textures Dataset)
+    if not os.path.exists(dtd_dir):
+        if not offline:
+            download_file(DTD_URL, dtd_tar)
+        if os.path.exists(dtd_tar):
+            print("Extracting DTD...")
+            extract_dtd(dtd_tar, dtd_dir)
+
+    # 2. MINC-2500 (Materials in Context) - Hugging Face 사용
+    if not offline:
+        from huggingface_hub import snapshot_download
+        print("Downloading MINC-2500 from Hugging Face...")
+        snapshot_download(repo_id=MINC_REPO, repo_type="dataset", local_dir=minc_dir)
+
+    # 3. V-SAMS 구조로 매핑
+    if clean and os.path.exists(dataset_root):
+        shutil.rmtree(dataset_root)
+    os.makedirs(dataset_root, exist_ok=True)
+    manifest = load_manifest(dataset_root)
+    
+    # dataset/manifest.jsonl (shared with labeler.py / SurfaceDataset) is updated as files are written
+    dataset_manifest = DatasetManifest.for_train_dir(dataset_root)
+    if clean or not dataset_manifest.exists():
+        dataset_manifest.rebuild(dataset_root)
+
+    # Downloaded images are registered as they are written, so labeler.py uploads of the same image are caught
+    ingest_index = IngestIndex(os.path.join(os.path.dirname(os.path.abspath(dataset_root)), INGEST_INDEX_NAME))
+    if clean:
+        ingest_index.rebuild(dataset_root)
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # 이미지 수집 루프 (MINC)
+        minc_data_dir = os.path.join(minc_dir, "data")
+        if os.path.exists(minc_data_dir):
+            print("Mapping MINC images from Parquet files...")
+            map_minc(minc_data_dir, dataset_root, manifest, dataset_manifest, ingest_index, pool,
+                     per_class_limit=per_class_limit)
+
+        # 이미지 수집 루프 (DTD)
+        dtd_images_base = os.path.join(dtd_dir, "images")
+        if os.path.exists(dtd_images_base):
+            print("Mapping DTD images...")
+            map_dtd(dtd_images_base, dataset_root, manifest, dataset_manifest, ingest_index, pool)
+
+    ingest_index.save()
+    save_manifest(dataset_root, manifest)
+    print(f"Full Dataset Bootstrapping Complete. MINC counts: {manifest['minc_counts']}")
+
 
 if __name__ == "__main__":
-    setup_full_dataset()
+    parser = argparse.ArgumentParser(description="Bootstrap dataset/train from DTD and MINC-2500")
+    parser.add_argument("--dataset-root", default="dataset/train")
+    parser.add_argument("--dtd-tar", default="dtd.tar.gz")
+    parser.add_argument("--dtd-dir", default="dtd")
+    parser.add_argument("--minc-dir", default="minc-2500")
+    parser.add_argument("--offline", action="store_true", help="Skip downloads and use local files only")
+    parser.add_argument("--clean", action="store_true", help="Delete dataset_root before mapping (old behavior)")
+    parser.add_argument("--workers", type=int, default=None, help="Decode/write processes (default: CPU count)")
+    parser.add_argument("--per-class-limit", type=int, default=300)
+    args = parser.parse_args()
+
+    setup_full_dataset(
+        dataset_root=args.dataset_root,
+        dtd_tar=args.dtd_tar,
+        dtd_dir=args.dtd_dir,
+        minc_dir=args.minc_dir,
+        offline=args.offline,
+        clean=args.clean,
+        workers=args.workers,
+        per_class_limit=args.per_class_limit,
+    )
@@ -0,0 +1,107 @@
+"""
+Local load generator for server.py.
+
+Starts the server once per batch-window setting (or targets an already running
+server with --url), fires concurrent /predict requests and reports throughput and
+latency percentiles.
+
+    python utils/load_test.py --image pre-buff-1.png --windows 0,2,5,10 --concurrency 32
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+
+
+def wait_for_server(url, timeout=120.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if requests.get(f"{url}/health", timeout=1.0).ok:
+                return True
+        except requests.ConnectionError:
+            pass
+        time.sleep(0.5)
+    return False
+
+
+def run_load(url, image_bytes, image_name, num_requests, concurrency):
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_maxsize=concurrency)
+    session.mount("http://", adapter)
+
+    def one_request(_):
+        start = time.perf_counter()
+        response = session.post(f"{url}/predict", files={"file": (image_name, image_bytes)})
+        response.raise_for_status()
+        return time.perf_counter() - start
+
+    # Warm-up (first batch pays lazy init costs)
+    for _ in range(min(concurrency, 4)):
+        one_request(None)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(one_request, range(num_requests)))
+    elapsed = time.perf_counter() - start
+
+    latencies_ms = np.array(latencies) * 1000.0
+    server_stats = session.get(f"{url}/stats").json()
+    return {
+        "throughput": num_requests / elapsed,
+        "p50": float(np.percentile(latencies_ms, 50)),
+        "p95": float(np.percentile(latencies_ms, 95)),
+        "p99": float(np.percentile(latencies_ms, 99)),
+        "avg_batch": server_stats.get("avg_batch_size", 0.0),
+    }
+
+
+def print_report(rows):
+    print(f"{'window(ms)':>10} {'req/s':>8} {'p50(ms)':>9} {'p95(ms)':>9} {'p99(ms)':>9} {'avg batch':>10}")
+    for window, r in rows:
+        print(f"{window:>10} {r['throughput']:>8.1f} {r['p50']:>9.1f} {r['p95']:>9.1f} {r['p99']:>9.1f} {r['avg_batch']:>10.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="V-SAMS server load generator")
+    parser.add_argument("--image", default="pre-buff-1.png")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--windows", default="0,2,5,10", help="Comma separated VSAMS_MAX_WAIT_MS values")
+    parser.add_argument("--max-batch", type=int, default=16)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--url", default=None, help="Use an already running server instead of spawning one")
+    args = parser.parse_args()
+
+    with open(args.image, "rb") as f:
+        image_bytes = f.read()
+    image_name = os.path.basename(args.image)
+
+    if args.url:
+        print_report([("server", run_load(args.url, image_bytes, image_name, args.requests, args.concurrency))])
+        return
+
+    url = f"http://127.0.0.1:{args.port}"
+    rows = []
+    for window in args.windows.split(","):
+        env = dict(os.environ, VSAMS_MAX_WAIT_MS=window, VSAMS_MAX_BATCH=str(args.max_batch), VSAMS_PORT=str(args.port))
+        proc = subprocess.Popen([sys.executable, "server.py"], env=env)
+        try:
+            if not wait_for_server(url):
+                print(f"Server failed to start for window={window}ms")
+                continue
+            rows.append((window, run_load(url, image_bytes, image_name, args.requests, args.concurrency)))
+        finally:
+            proc.terminate()
+            proc.wait()
+
+    print_report(rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Checks a reduced-precision inference mode against the fp32 reference.
+
+Runs every image of a held-out folder (Material_Finish layout, or a flat folder of
+images) through both paths and reports top-1 agreement and throughput.
+
+    python utils/validate_precision.py --data dataset/val --precision bf16
+"""
+import argparse
+import copy
+import glob
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from vsams.data.packed import IMAGE_PATTERNS, list_samples
+from vsams.inference import PRECISION_MODES, BatchPredictor, load_classifier
+
+
+def list_images(data_dir):
+    samples = list_samples(data_dir, verify=True)
+    if samples:
+        return [s[0] for s in samples]
+    paths = []
+    for pattern in IMAGE_PATTERNS:
+        paths.extend(glob.glob(os.path.join(data_dir, pattern)))
+    return sorted(paths)
+
+
+def run(predictor, paths):
+    start = time.perf_counter()
+    mat_probs, fin_probs = predictor.predict_probs(paths)
+    return mat_probs, fin_probs, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare an inference precision mode against fp32")
+    parser.add_argument("--data", required=True, help="Held-out image folder")
+    parser.add_argument("--precision", default="bf16", choices=[m for m in PRECISION_MODES if m != "fp32"])
+    parser.add_argument("--checkpoint", default="checkpoints/v_sams_model.pth")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--min-agreement", type=float, default=0.99, help="Exit with code 1 below this agreement")
+    args = parser.parse_args()
+
+    paths = list_images(args.data)
+    if not paths:
+        print(f"No images found under {args.data}")
+        sys.exit(1)
+
+    model, status = load_classifier(args.checkpoint)
+    print(f"Model: {status} | Images: {len(paths)} | Mode: {args.precision}")
+
+    reference = BatchPredictor(model, batch_size=args.batch_size, precision="fp32")
+    # Separate copy so channels_last conversion does not touch the reference model
+    candidate = BatchPredictor(copy.deepcopy(model), batch_size=args.batch_size, precision=args.precision)
+
+    # Warm-up
+    reference.predict_probs(paths[:args.batch_size])
+    candidate.predict_probs(paths[:args.batch_size])
+
+    ref_mat, ref_fin, ref_time = run(reference, paths)
+    cand_mat, cand_fin, cand_time = run(candidate, paths)
+
+    mat_agree = (ref_mat.argmax(1) == cand_mat.argmax(1)).float().mean().item()
+    fin_agree = (ref_fin.argmax(1) == cand_fin.argmax(1)).float().mean().item()
+    max_diff = max((ref_mat - cand_mat).abs().max().item(), (ref_fin - cand_fin).abs().max().item())
+
+    print(f"Material top-1 agreement : {mat_agree*100:.2f}%")
+    print(f"Finish top-1 agreement   : {fin_agree*100:.2f}%")
+    print(f"Max probability diff     : {max_diff:.4f}")
+    print(f"fp32 : {len(paths)/ref_time:8.1f} images/sec")
+    print(f"{args.precision:<5}: {len(paths)/cand_time:8.1f} images/sec ({ref_time/cand_time:.2f}x)")
+
+    if min(mat_agree, fin_agree) < args.min_agreement:
+        print(f"❌ Agreement below {args.min_agreement*100:.1f}%. Keep VSAMS_PRECISION=fp32.")
+        sys.exit(1)
+    print(f"✅ Safe to enable: VSAMS_PRECISION={args.precision}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,2 +1,33 @@
 # V-SAMS Library
 __version__ = '0.1.0'
+
+# Lightweight entry points: `import vsams` stays cheap, and torch / timm / torchvision
+# are imported only when one of the names below is first accessed.
+_LAZY_ATTRS = {
+    "MATERIALS": "vsams.labels",
+    "FINISHES": "vsams.labels",
+    "load_classifier": "vsams.inference",
+    "BatchPredictor": "vsams.inference",
+    "SurfaceClassifier": "vsams.models.classifier",
+    "load_exported": "vsams.runtime",
+    "PreprocessPool": "vsams.preprocess",
+    "PredictionCache": "vsams.prediction_cache",
+    "FeatureIndex": "vsams.feature_index",
+    "InferenceWorkerPool": "vsams.worker_pool",
+    "query_recommendation": "vsams.utils.db_handler",
+    "rank_recommendations": "vsams.utils.db_handler",
+}
+
+
+def __getattr__(name):
+    module_name = _LAZY_ATTRS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module 'vsams' has no attribute {name!r}")
+    import importlib
+    value = getattr(importlib.import_module(module_name), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + list(_LAZY_ATTRS))
@@ -0,0 +1,5 @@
+import sys
+
+from vsams.cli import main
+
+sys.exit(main())
@@ -0,0 +1,109 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent requests into batches for a single model worker.
+
+    Requests are collected from an asyncio queue until either max_batch_size items
+    are waiting or max_wait_ms has passed since the first one arrived. The batch is
+    then handed to predict_fn (list in, list out) on one dedicated worker thread,
+    so the model never runs two batches at the same time. An exception instance in
+    the returned list fails only that item's request.
+    """
+    def __init__(self, predict_fn, max_batch_size=16, max_wait_ms=5.0, max_queue_size=1024):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_queue_size = max_queue_size
+        self.queue = None
+        self.executor = None
+        self.worker_task = None
+        self.stats = {"requests": 0, "batches": 0, "errors": 0, "busy_sec": 0.0}
+
+    async def start(self):
+        self.queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="vsams-model")
+        self.worker_task = asyncio.create_task(self._worker())
+
+    async def stop(self):
+        if self.worker_task is not None:
+            self.worker_task.cancel()
+            try:
+                await self.worker_task
+            except asyncio.CancelledError:
+                pass
+            self.worker_task = None
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+
+    async def submit(self, item):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((item, future))
+        return await future
+
+    async def _collect(self):
+        batch = [await self.queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            # Drain whatever is already waiting without yielding to the loop
+            if not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+                continue
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            items = [item for item, _ in batch]
+
+            start = time.perf_counter()
+            try:
+                results = await loop.run_in_executor(self.executor, self.predict_fn, items)
+            except Exception as e:
+                self.stats["errors"] += 1
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            finally:
+                self.stats["busy_sec"] += time.perf_counter() - start
+
+            self.stats["requests"] += len(batch)
+            self.stats["batches"] += 1
+            if len(results) < len(batch):
+                # zip() below would leave the unmatched requests waiting forever
+                self.stats["errors"] += 1
+                error = RuntimeError(f"predict_fn returned {len(results)} results for a batch of {len(batch)}")
+                for _, future in batch[len(results):]:
+                    if not future.done():
+                        future.set_exception(error)
+            for (_, future), result in zip(batch, results):
+                if future.done():
+                    continue
+                # predict_fn may return an exception for a single item (e.g. an undecodable image)
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats["avg_batch_size"] = stats["requests"] / stats["batches"] if stats["batches"] else 0.0
+        stats["queue_depth"] = self.queue.qsize() if self.queue is not None else 0
+        stats["max_batch_size"] = self.max_batch_size
+        stats["max_wait_ms"] = self.max_wait * 1000.0
+        return stats
@@ -0,0 +1,86 @@
+"""
+Checkpoint saving with a JSON metadata sidecar.
+
+The weights file stays a plain state_dict (checkpoints/v_sams_model.pth) so every
+existing loader keeps working. Next to it, checkpoints/v_sams_model.json records the
+class lists, input size, epoch and validation metrics, so inference code can verify
+compatibility without loading the weights.
+
+Both files are written to a temporary path and moved into place with os.replace,
+so an interrupted save never leaves a truncated checkpoint behind.
+"""
+import json
+import os
+import time
+
+from vsams.labels import MATERIALS, FINISHES
+
+
+def metadata_path(checkpoint_path):
+    return os.path.splitext(checkpoint_path)[0] + ".json"
+
+
+def last_checkpoint_path(checkpoint_path):
+    root, ext = os.path.splitext(checkpoint_path)
+    return f"{root}_last{ext}"
+
+
+def build_metadata(input_size=224, epoch=None, metrics=None, **extra):
+    metadata = {
+        "materials": list(MATERIALS),
+        "finishes": list(FINISHES),
+        "input_size": input_size,
+        "epoch": epoch,
+        "metrics": metrics or {},
+        "saved_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    metadata.update(extra)
+    return metadata
+
+
+def save_checkpoint(state_dict, checkpoint_path, metadata):
+    """
+    Atomically writes the state_dict and its metadata sidecar.
+    The weights are replaced first, so the sidecar never describes missing weights.
+    """
+    import torch
+
+    os.makedirs(os.path.dirname(checkpoint_path) or '.', exist_ok=True)
+    tmp = checkpoint_path + ".tmp"
+    torch.save(state_dict, tmp)
+    os.replace(tmp, checkpoint_path)
+
+    meta_path = metadata_path(checkpoint_path)
+    with open(meta_path + ".tmp", 'w', encoding='utf-8') as f:
+        json.dump(metadata, f, ensure_ascii=False, indent=2)
+    os.replace(meta_path + ".tmp", meta_path)
+    return checkpoint_path
+
+
+def read_metadata(checkpoint_path):
+    """
+    Returns the metadata dict, or None for checkpoints saved before metadata existed.
+    """
+    path = metadata_path(checkpoint_path)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def check_compatible(checkpoint_path, input_size=None):
+    """
+    Raises ValueError if the checkpoint was trained with different class lists
+    (or a different input size). Checkpoints without metadata are accepted as-is.
+    """
+    metadata = read_metadata(checkpoint_path)
+    if metadata is None:
+        return None
+    if metadata.get("materials") != list(MATERIALS) or metadata.get("finishes") != list(FINISHES):
+        raise ValueError(
+            f"{checkpoint_path} was trained with materials={metadata.get('materials')} "
+            f"finishes={metadata.get('finishes')}, expected {MATERIALS} / {FINISHES}"
+        )
+    if input_size is not None and metadata.get("input_size", input_size) != input_size:
+        raise ValueError(f"{checkpoint_path} expects input size {metadata.get('input_size')}, got {input_size}")
+    return metadata
@@ -0,0 +1,394 @@
+"""
+`vsams` command line interface (registered as a console script in setup.py).
+
+Bulk analysis of an inspection folder or ZIP archive:
+
+    vsams analyze /data/inspection/2026-10-18 --out results.csv
+    vsams analyze inspection.zip --out results.parquet --workers 8 --batch-size 64
+
+Images are decoded and resized in a process pool (vsams.preprocess) while the main
+process runs the classifier, so decode and inference overlap. Results are written as they are
+produced (CSV rows are appended and flushed per batch; Parquet output is a directory
+of part files), and re-running the same command skips images that are already in the
+output. Pass --overwrite to start over.
+"""
+import argparse
+import csv
+import os
+import sys
+import time
+import zipfile
+from functools import partial
+
+import numpy as np
+
+from vsams.labels import MATERIALS, FINISHES
+from vsams.preprocess import PreprocessPool, decode_batch, iter_chunks
+
+IMAGE_EXTS = ('.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff', '.webp')
+
+FIELDS = (
+    ["path", "sha1", "material", "material_score", "finish", "finish_score"]
+    + [f"mat_{m}" for m in MATERIALS]
+    + [f"fin_{f}" for f in FINISHES]
+    + ["recommendations", "recommendation_names", "error"]
+)
+
+
+# --- Sources (directory or ZIP) ---
+
+def list_images(source):
+    """
+    Returns sorted image names: paths relative to a directory, or ZIP member names.
+    """
+    if zipfile.is_zipfile(source):
+        with zipfile.ZipFile(source) as zf:
+            names = [n for n in zf.namelist() if n.lower().endswith(IMAGE_EXTS) and not n.startswith('__MACOSX/')]
+        return sorted(names)
+
+    names = []
+    for root, _, files in os.walk(source):
+        for name in files:
+            if name.lower().endswith(IMAGE_EXTS):
+                names.append(os.path.relpath(os.path.join(root, name), source).replace(os.sep, '/'))
+    return sorted(names)
+
+
+# One open ZipFile per worker process
+_zip_handles = {}
+
+
+def read_bytes(source, name):
+    if os.path.isdir(source):
+        with open(os.path.join(source, name), 'rb') as f:
+            return f.read()
+    zf = _zip_handles.get(source)
+    if zf is None:
+        zf = _zip_handles[source] = zipfile.ZipFile(source)
+    return zf.read(name)
+
+
+# --- Incremental writers ---
+
+class CsvResultWriter:
+    def __init__(self, path, overwrite=False):
+        self.path = path
+        if overwrite and os.path.exists(path):
+            os.remove(path)
+        self._repair()
+        write_header = not os.path.exists(path) or os.path.getsize(path) == 0
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._file = open(path, 'a', newline='', encoding='utf-8')
+        self._writer = csv.DictWriter(self._file, fieldnames=FIELDS)
+        if write_header:
+            self._writer.writeheader()
+            self._file.flush()
+
+    def _repair(self):
+        # Drop a partially written last line left by an interrupted run
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'rb+') as f:
+            data = f.read()
+            if data and not data.endswith(b'\n'):
+                f.truncate(data.rfind(b'\n') + 1)
+
+    def done_keys(self):
+        if not os.path.exists(self.path):
+            return set()
+        with open(self.path, newline='', encoding='utf-8') as f:
+            # Failed rows are not done: they are retried on resume (see drop_failed)
+            return {row["path"] for row in csv.DictReader(f) if not row.get("error")}
+
+    def drop_failed(self, paths):
+        """
+        Removes the error rows of paths that are about to be retried, so a resumed
+        run leaves one row per image.
+        """
+        with open(self.path, newline='', encoding='utf-8') as f:
+            rows = list(csv.DictReader(f))
+        kept = [row for row in rows if not (row.get("error") and row["path"] in paths)]
+        if len(kept) == len(rows):
+            return
+        self._file.close()
+        with open(self.path + ".tmp", 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=FIELDS)
+            writer.writeheader()
+            writer.writerows(kept)
+        os.replace(self.path + ".tmp", self.path)
+        self._file = open(self.path, 'a', newline='', encoding='utf-8')
+        self._writer = csv.DictWriter(self._file, fieldnames=FIELDS)
+
+    def write(self, rows):
+        self._writer.writerows(rows)
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class ParquetResultWriter:
+    """
+    Writes a directory of part-XXXXX.parquet files (readable with pandas.read_parquet(dir)).
+    Each part is written atomically once flush_rows rows are buffered.
+    """
+    def __init__(self, path, overwrite=False, flush_rows=2048):
+        import pyarrow.parquet as pq
+
+        self._pq = pq
+        self.path = path
+        self.flush_rows = flush_rows
+        self._buffer = []
+        if overwrite and os.path.isdir(path):
+            for name in os.listdir(path):
+                if name.startswith("part-"):
+                    os.remove(os.path.join(path, name))
+        os.makedirs(path, exist_ok=True)
+        self._parts = sorted(n for n in os.listdir(path) if n.startswith("part-") and n.endswith(".parquet"))
+
+    def done_keys(self):
+        keys = set()
+        for name in self._parts:
+            table = self._pq.read_table(os.path.join(self.path, name), columns=["path", "error"])
+            keys.update(path for path, error in zip(table.column("path").to_pylist(), table.column("error").to_pylist())
+                        if not error)
+        return keys
+
+    def drop_failed(self, paths):
+        """
+        Rewrites the parts holding error rows of paths that are about to be retried,
+        so a resumed run leaves one row per image. Emptied parts are kept (part numbering).
+        """
+        for name in self._parts:
+            part = os.path.join(self.path, name)
+            rows = self._pq.read_table(part).to_pylist()
+            kept = [row for row in rows if not (row.get("error") and row["path"] in paths)]
+            if len(kept) != len(rows):
+                self._write_part(kept, part)
+
+    def write(self, rows):
+        self._buffer.extend(rows)
+        if len(self._buffer) >= self.flush_rows:
+            self._flush()
+
+    def _write_part(self, rows, part):
+        import pyarrow as pa
+
+        # Fixed schema so parts with only failed images still match the others
+        schema = pa.schema([(field, pa.float64() if field.endswith("_score") or field.startswith(("mat_", "fin_")) else pa.string())
+                            for field in FIELDS])
+        self._pq.write_table(pa.Table.from_pylist(rows, schema=schema), part + ".tmp")
+        os.replace(part + ".tmp", part)
+
+    def _flush(self):
+        if not self._buffer:
+            return
+        name = f"part-{len(self._parts):05d}.parquet"
+        self._write_part(self._buffer, os.path.join(self.path, name))
+        self._parts.append(name)
+        self._buffer = []
+
+    def close(self):
+        self._flush()
+
+
+def open_writer(path, overwrite=False, flush_rows=2048):
+    if path.lower().endswith(".parquet"):
+        return ParquetResultWriter(path, overwrite=overwrite, flush_rows=flush_rows)
+    return CsvResultWriter(path, overwrite=overwrite)
+
+
+# --- analyze ---
+
+class Progress:
+    def __init__(self, total, every=10.0):
+        self.total = total
+        self.every = every
+        self.done = 0
+        self.errors = 0
+        self.start = time.perf_counter()
+        self._last = self.start
+
+    def update(self, count, errors=0, force=False):
+        self.done += count
+        self.errors += errors
+        now = time.perf_counter()
+        if not force and now - self._last < self.every:
+            return
+        self._last = now
+        elapsed = now - self.start
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        eta = (self.total - self.done) / rate if rate > 0 else float('inf')
+        print(f"[{self.done}/{self.total}] {rate:.1f} images/sec | errors {self.errors} | ETA {eta/60:.1f} min", flush=True)
+
+
+def build_rows(names, hashes, errors, probs, recommend):
+    rows = []
+    for name, sha1, error in zip(names, hashes, errors):
+        row = dict.fromkeys(FIELDS)
+        row.update(path=name, sha1=sha1, error=error)
+        if error is None:
+            mat_row, fin_row = probs[sha1]
+            mat_idx = int(np.argmax(mat_row))
+            fin_idx = int(np.argmax(fin_row))
+            row.update(material=MATERIALS[mat_idx], material_score=float(mat_row[mat_idx]),
+                       finish=FINISHES[fin_idx], finish_score=float(fin_row[fin_idx]))
+            row.update({f"mat_{m}": float(p) for m, p in zip(MATERIALS, mat_row)})
+            row.update({f"fin_{f}": float(p) for f, p in zip(FINISHES, fin_row)})
+            products = recommend(row["material"], row["finish"])
+            row["recommendations"] = ";".join(str(p.get('id', '')) for p in products)
+            row["recommendation_names"] = ";".join(str(p.get('name', '')) for p in products)
+        rows.append(row)
+    return rows
+
+
+def analyze(args):
+    # Heavy imports only for the analyze command
+    from vsams.export import EXPORTED_PATH
+    from vsams.inference import BatchPredictor, load_classifier, uint8_to_input
+    from vsams.prediction_cache import PredictionCache, model_fingerprint
+    from vsams.utils.db_handler import query_recommendation
+
+    if not os.path.exists(args.input):
+        print(f"Input not found: {args.input}")
+        return 1
+
+    if args.procs > 0 and (args.precision != "fp32" or args.exported):
+        print("--procs runs the eager FP32 model in worker processes; it cannot be combined with --precision or --exported")
+        return 1
+
+    names = list_images(args.input)
+    writer = open_writer(args.out, overwrite=args.overwrite, flush_rows=args.flush_rows)
+    done = writer.done_keys()
+    todo = [n for n in names if n not in done]
+    writer.drop_failed(set(todo))
+    print(f"{len(names)} images found, {len(done)} already in {args.out}, {len(todo)} to analyze")
+    if not todo:
+        writer.close()
+        return 0
+
+    exported = args.exported if args.exported else EXPORTED_PATH
+    pool_model = None
+    if args.procs > 0:
+        # Multi-process CPU inference: workers share the eager model's weights
+        import torch
+        from vsams.worker_pool import InferenceWorkerPool
+
+        model, status = load_classifier(args.checkpoint, device=torch.device("cpu"))
+        pool_model = InferenceWorkerPool(model, args.procs, args.threads, batch_size=args.batch_size, input_size=args.input_size)
+    else:
+        model, status = load_classifier(args.checkpoint, exported_path=exported)
+        predictor = BatchPredictor(model, batch_size=args.batch_size, input_size=args.input_size, precision=args.precision)
+    if status == "mock":
+        print(f"Warning: {args.checkpoint} not found. Results come from an untrained model.")
+    cache = None
+    if args.cache_dir:
+        cache = PredictionCache(model_fingerprint([args.checkpoint, exported]), disk_dir=args.cache_dir)
+
+    recommendations = {}
+
+    def recommend(material, finish):
+        if (material, finish) not in recommendations:
+            recommendations[(material, finish)] = query_recommendation(material, finish)
+        return recommendations[(material, finish)]
+
+    def run_model(batch):
+        if pool_model is not None:
+            mat_probs, fin_probs = pool_model.predict_probs(batch)
+        else:
+            mat_probs, fin_probs = (p.numpy() for p in predictor.forward_probs(uint8_to_input(batch)))
+        return list(zip(mat_probs, fin_probs))
+
+    progress = Progress(len(todo), every=args.report_every)
+    decode_wait = 0.0
+    model_time = 0.0
+
+    def handle(chunk, batch, errors, hashes):
+        nonlocal model_time
+        ok = [i for i, e in enumerate(errors) if e is None]
+        start = time.perf_counter()
+        probs = {}
+        if ok:
+            ok_hashes = [hashes[i] for i in ok]
+            if cache is not None:
+                outputs = cache.predict(lambda idx: run_model(batch[idx]), ok, ok_hashes, variant=f"{args.precision}|{args.input_size}")
+            else:
+                outputs = run_model(batch[ok])
+            probs = dict(zip(ok_hashes, outputs))
+        model_time += time.perf_counter() - start
+        writer.write(build_rows(chunk, hashes, errors, probs, recommend))
+        progress.update(len(chunk), errors=len(chunk) - len(ok))
+
+    reader = partial(read_bytes, args.input)
+    draft = not args.no_draft
+    pool = None
+    try:
+        if args.workers <= 0:
+            batches = ((chunk,) + decode_batch(chunk, args.input_size, draft, reader, True)
+                       for chunk in iter_chunks(todo, args.batch_size))
+        else:
+            # Bounded number of decoded chunks in flight keeps memory flat on huge folders
+            pool = PreprocessPool(size=args.input_size, workers=args.workers, queue_size=args.workers * 2,
+                                  draft=draft, use_processes=True, reader=reader, with_hash=True)
+            batches = pool.iter_batches(todo, args.batch_size)
+
+        while True:
+            start = time.perf_counter()
+            item = next(batches, None)
+            decode_wait += time.perf_counter() - start
+            if item is None:
+                break
+            handle(*item)
+    finally:
+        if pool is not None:
+            pool.close()
+        if pool_model is not None:
+            pool_model.close()
+        writer.close()
+
+    elapsed = time.perf_counter() - progress.start
+    progress.update(0, force=True)
+    print(f"Done: {progress.done} images in {elapsed:.1f}s ({progress.done / elapsed:.1f} images/sec), "
+          f"{progress.errors} errors")
+    print(f"  decode wait {decode_wait:.1f}s | model {model_time:.1f}s")
+    if cache is not None:
+        print(f"  cache hit rate {cache.stats()['hit_rate']*100:.1f}%")
+    print(f"Results written to {args.out}")
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="vsams", description="V-SAMS command line tools")
+    sub = parser.add_subparsers(dest="command")
+
+    p = sub.add_parser("analyze", help="Analyze every image in a folder or ZIP archive")
+    p.add_argument("input", help="Image folder or .zip archive")
+    p.add_argument("--out", default="vsams_results.csv", help="Output .csv file or .parquet directory")
+    p.add_argument("--checkpoint", default='checkpoints/v_sams_model.pth')
+    p.add_argument("--exported", default=None, help="TorchScript/ONNX model (default: checkpoints/v_sams_model.ts if fresh)")
+    p.add_argument("--precision", default="fp32", help="fp32 / bf16 / channels_last / bf16+channels_last")
+    p.add_argument("--batch-size", type=int, default=32)
+    p.add_argument("--input-size", type=int, default=224)
+    p.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) - 1), help="Decode processes (0 = main process)")
+    p.add_argument("--procs", type=int, default=0, help="Inference processes sharing the model weights (0 = in-process)")
+    p.add_argument("--threads", type=int, default=None, help="torch threads per inference process (with --procs)")
+    p.add_argument("--no-draft", action="store_true", help="Decode JPEGs at full resolution before resizing")
+    p.add_argument("--cache-dir", default=None, help="On-disk prediction cache (skips re-analysis of identical images)")
+    p.add_argument("--flush-rows", type=int, default=2048, help="Rows per Parquet part file")
+    p.add_argument("--report-every", type=float, default=10.0, help="Seconds between progress reports")
+    p.add_argument("--overwrite", action="store_true", help="Discard existing results instead of resuming")
+    p.set_defaults(func=analyze)
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if not getattr(args, "func", None):
+        parser.print_help()
+        return 1
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,105 @@
+"""
+Content-hash keyed on-disk cache of backbone feature vectors.
+
+Used for head-only retraining: every image is embedded once with
+SurfaceClassifier.extract_features and only new or changed files are embedded
+on later runs. The cache is tied to the backbone weights through a fingerprint,
+so a full retrain of the backbone invalidates it automatically.
+
+    <cache_dir>/meta.json     backbone fingerprint, feature dim, row keys
+    <cache_dir>/features.npy  float32 [N, dim]
+"""
+import hashlib
+import json
+import os
+
+import numpy as np
+
+
+def file_hash(path, chunk_size=1 << 20):
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def backbone_fingerprint(model):
+    """
+    Hash of the backbone weights. Head-only updates keep the same fingerprint.
+    """
+    h = hashlib.sha1()
+    for name, tensor in model.backbone.state_dict().items():
+        h.update(name.encode('utf-8'))
+        h.update(tensor.detach().cpu().contiguous().numpy().tobytes())
+    return h.hexdigest()
+
+
+class FeatureCache:
+    def __init__(self, cache_dir, backbone_id):
+        self.cache_dir = cache_dir
+        self.backbone_id = backbone_id
+        self.keys = []
+        self.key_to_row = {}
+        self.features = None
+        self._load()
+
+    def _load(self):
+        meta_path = os.path.join(self.cache_dir, "meta.json")
+        features_path = os.path.join(self.cache_dir, "features.npy")
+        if not (os.path.exists(meta_path) and os.path.exists(features_path)):
+            return
+
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get("backbone_id") != self.backbone_id:
+            print("Feature cache was built with a different backbone. Rebuilding.")
+            return
+
+        self.features = np.load(features_path)
+        self.keys = meta["keys"]
+        self.key_to_row = {k: i for i, k in enumerate(self.keys)}
+
+    def save(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        features_path = os.path.join(self.cache_dir, "features.npy")
+        meta_path = os.path.join(self.cache_dir, "meta.json")
+
+        # np.save appends .npy to names without it, so the temp file keeps the suffix
+        np.save(features_path + ".tmp.npy", self.features)
+        os.replace(features_path + ".tmp.npy", features_path)
+        with open(meta_path + ".tmp", 'w', encoding='utf-8') as f:
+            json.dump({"backbone_id": self.backbone_id, "dim": int(self.features.shape[1]), "keys": self.keys}, f)
+        os.replace(meta_path + ".tmp", meta_path)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def update(self, paths, embed_fn, batch_size=64):
+        """
+        Returns float32 [len(paths), dim] features, embedding only images whose
+        content hash is not cached yet. embed_fn maps a list of paths to an [n, dim] array.
+        """
+        hashes = [file_hash(p) for p in paths]
+
+        missing = {}
+        for path, key in zip(paths, hashes):
+            if key not in self.key_to_row and key not in missing:
+                missing[key] = path
+
+        if missing:
+            print(f"Embedding {len(missing)} new images ({len(self.keys)} cached)")
+            new_keys = list(missing)
+            new_rows = []
+            for i in range(0, len(new_keys), batch_size):
+                chunk = [missing[k] for k in new_keys[i:i + batch_size]]
+                new_rows.append(np.asarray(embed_fn(chunk), dtype=np.float32))
+
+            new_features = np.concatenate(new_rows)
+            self.features = new_features if self.features is None else np.concatenate([self.features, new_features])
+            for key in new_keys:
+                self.key_to_row[key] = len(self.keys)
+                self.keys.append(key)
+            self.save()
+
+        return self.features[[self.key_to_row[k] for k in hashes]]
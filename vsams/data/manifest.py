@@ -0,0 +1,190 @@
+"""
+Persistent dataset manifest (dataset/manifest.jsonl).
+
+One JSON line per image: path (relative to the manifest folder), class, size,
+sha1 and mtime. The labeler and the downloader append lines as they write files,
+so class statistics and SurfaceDataset start from a single file read instead of
+walking the whole tree. Later lines override earlier ones; {"path": ..., "deleted": true}
+removes an entry. rebuild() rescans the tree and writes a compacted file.
+
+    python -m vsams.data.manifest --root dataset/train
+"""
+import argparse
+import hashlib
+import json
+import os
+import threading
+
+MANIFEST_NAME = "manifest.jsonl"
+# The manifest sits next to the folder it indexes (dataset/manifest.jsonl -> dataset/train)
+TRAIN_DIR_NAME = "train"
+IMAGE_EXTS = ('.png', '.jpg', '.jpeg')
+
+
+def sha1_file(path, chunk_size=1 << 20):
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def manifest_path_for(train_dir):
+    # dataset/train -> dataset/manifest.jsonl
+    return os.path.join(os.path.dirname(os.path.abspath(train_dir)), MANIFEST_NAME)
+
+
+class DatasetManifest:
+    def __init__(self, path):
+        self.path = path
+        self.base_dir = os.path.dirname(os.path.abspath(path))
+        self.entries = {}
+        self._lock = threading.Lock()
+        self._stamp = None
+        self._load()
+
+    @classmethod
+    def for_train_dir(cls, train_dir):
+        return cls(manifest_path_for(train_dir))
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def covers(self, train_dir):
+        """
+        True if train_dir is the folder this manifest indexes (not e.g. dataset/val).
+        """
+        return os.path.realpath(train_dir) == os.path.realpath(os.path.join(self.base_dir, TRAIN_DIR_NAME))
+
+    def _file_stamp(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def reload_if_changed(self):
+        """
+        Re-reads the file if it changed since it was last read or written here
+        (e.g. lines appended by the downloader in another process).
+        """
+        with self._lock:
+            if self._file_stamp() != self._stamp:
+                self.entries = {}
+                self._load()
+
+    def _load(self):
+        self._stamp = self._file_stamp()
+        if self._stamp is None:
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # A torn last line from an interrupted append is ignored
+                    continue
+                if entry.get("deleted"):
+                    self.entries.pop(entry["path"], None)
+                else:
+                    self.entries[entry["path"]] = entry
+
+    def _rel(self, path):
+        return os.path.relpath(os.path.abspath(path), self.base_dir).replace(os.sep, "/")
+
+    def abspath(self, rel_path):
+        return os.path.join(self.base_dir, *rel_path.split("/"))
+
+    def _append(self, lines):
+        os.makedirs(self.base_dir, exist_ok=True)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            for line in lines:
+                f.write(json.dumps(line, ensure_ascii=False) + "\n")
+        self._stamp = self._file_stamp()
+
+    def make_entry(self, path, class_name=None, sha1=None):
+        st = os.stat(path)
+        return {
+            "path": self._rel(path),
+            "class": class_name or os.path.basename(os.path.dirname(path)),
+            "size": st.st_size,
+            "sha1": sha1 or sha1_file(path),
+            "mtime": st.st_mtime,
+        }
+
+    def add(self, path, class_name=None, sha1=None):
+        self.add_entries([self.make_entry(path, class_name, sha1)])
+
+    def add_entries(self, entries):
+        with self._lock:
+            for entry in entries:
+                self.entries[entry["path"]] = entry
+            self._append(entries)
+
+    def remove(self, path):
+        rel = self._rel(path)
+        with self._lock:
+            if self.entries.pop(rel, None) is not None:
+                self._append([{"path": rel, "deleted": True}])
+
+    def class_counts(self):
+        counts = {}
+        for entry in self.entries.values():
+            counts[entry["class"]] = counts.get(entry["class"], 0) + 1
+        return counts
+
+    def iter_files(self, train_dir=None):
+        """
+        Yields (abs_path, class_name), optionally restricted to one train_dir.
+        """
+        prefix = None
+        if train_dir is not None:
+            prefix = self._rel(train_dir).rstrip("/") + "/"
+        for rel in sorted(self.entries):
+            if prefix is None or rel.startswith(prefix):
+                yield self.abspath(rel), self.entries[rel]["class"]
+
+    def rebuild(self, train_dir):
+        """
+        Full rescan of train_dir. Unchanged files (same size and mtime) keep their
+        hash, so a rebuild only reads new or modified files.
+        """
+        previous = self.entries
+        entries = {}
+        for class_name in sorted(os.listdir(train_dir)) if os.path.exists(train_dir) else []:
+            class_dir = os.path.join(train_dir, class_name)
+            if not os.path.isdir(class_dir):
+                continue
+            for name in sorted(os.listdir(class_dir)):
+                if not name.lower().endswith(IMAGE_EXTS):
+                    continue
+                path = os.path.join(class_dir, name)
+                st = os.stat(path)
+                old = previous.get(self._rel(path))
+                sha1 = old["sha1"] if old and old["size"] == st.st_size and old["mtime"] == st.st_mtime else None
+                entry = self.make_entry(path, class_name, sha1)
+                entries[entry["path"]] = entry
+
+        os.makedirs(self.base_dir, exist_ok=True)
+        with self._lock:
+            with open(self.path + ".tmp", 'w', encoding='utf-8') as f:
+                for rel in sorted(entries):
+                    f.write(json.dumps(entries[rel], ensure_ascii=False) + "\n")
+            os.replace(self.path + ".tmp", self.path)
+            self.entries = entries
+            self._stamp = self._file_stamp()
+        return len(entries)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild the V-SAMS dataset manifest")
+    parser.add_argument("--root", default=os.path.join("dataset", "train"))
+    args = parser.parse_args()
+
+    manifest = DatasetManifest.for_train_dir(args.root)
+    count = manifest.rebuild(args.root)
+    print(f"Manifest rebuilt: {count} images -> {manifest.path}")
+    print(manifest.class_counts())
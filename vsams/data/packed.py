@@ -0,0 +1,260 @@
+"""
+One-time packing of dataset/train/Material_Finish into a memory-mapped uint8 array.
+
+Decoding and resizing every JPEG/PNG each epoch dominates epoch time on CPU boxes.
+pack_dataset() does that work once and writes:
+
+    <out_dir>/images.npy      uint8 [N, H, W, 3] (opened with mmap_mode='r')
+    <out_dir>/mat_labels.npy  int64 [N]
+    <out_dir>/fin_labels.npy  int64 [N]
+    <out_dir>/manifest.json   sizes, class lists, source paths and a source signature
+
+    python -m vsams.data.packed --root dataset/train --out dataset/packed
+"""
+import argparse
+import glob
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+from torch.utils.data import Dataset
+
+from vsams.labels import MATERIALS, FINISHES
+from vsams.data.manifest import DatasetManifest
+from vsams.preprocess import PreprocessPool
+
+MAT_MAP = {name: i for i, name in enumerate(MATERIALS)}
+FIN_MAP = {name: i for i, name in enumerate(FINISHES)}
+# Recorded in the pack manifest; packs made with another resize are rebuilt
+RESIZE_METHOD = "albumentations-linear"
+
+
+def resize_like_folder(image, size):
+    """
+    Same resize as the folder path (draft-decoded RGB array -> A.Resize in
+    train.build_eval_transform), so packed and folder training see the same pixels.
+    """
+    import albumentations as A
+    return A.Resize(size, size)(image=image)["image"]
+
+IMAGE_PATTERNS = ("*.[jJ][pP][gG]", "*.[pP][nN][gG]")
+
+
+def parse_class_folder(class_folder):
+    """
+    "Material_Finish" -> (mat_idx, fin_idx); unknown names map to "Other", malformed ones to None.
+    """
+    try:
+        mat_name, fin_name = class_folder.split('_')
+    except ValueError:
+        return None
+    return MAT_MAP.get(mat_name, MAT_MAP["Other"]), FIN_MAP.get(fin_name, FIN_MAP["Other"])
+
+
+def list_samples(root_dir, use_manifest=True, verify=False):
+    """
+    Returns [(img_path, mat_idx, fin_idx), ...] for the Material_Finish folder tree.
+    Reads dataset/manifest.jsonl instead of walking the tree when root_dir is the
+    folder that manifest indexes (dataset/train); other roots are always walked.
+
+    Manifest entries are trusted as-is. verify=True drops (and reports) entries whose
+    file no longer exists, at the cost of one stat per image; use it when every
+    file is going to be read anyway.
+    """
+    samples = []
+    if not os.path.exists(root_dir):
+        return samples
+
+    manifest = DatasetManifest.for_train_dir(root_dir) if use_manifest else None
+    if manifest is not None and manifest.exists() and manifest.covers(root_dir):
+        skipped = set()
+        missing = 0
+        for img_path, class_folder in manifest.iter_files(root_dir):
+            labels = parse_class_folder(class_folder)
+            if labels is None:
+                skipped.add(class_folder)
+                continue
+            # Files deleted or moved since they were recorded
+            if verify and not os.path.exists(img_path):
+                missing += 1
+                continue
+            samples.append((img_path, labels[0], labels[1]))
+        for class_folder in sorted(skipped):
+            print(f"Skipping folder with invalid format: {class_folder}")
+        if missing:
+            print(f"Warning: {missing} manifest entries no longer exist. "
+                  f"Run `python -m vsams.data.manifest --root {root_dir}` to rebuild it.")
+        return samples
+
+    for class_folder in sorted(os.listdir(root_dir)):
+        folder_path = os.path.join(root_dir, class_folder)
+        if not os.path.isdir(folder_path):
+            continue
+
+        # Parse labels from folder name
+        labels = parse_class_folder(class_folder)
+        if labels is None:
+            print(f"Skipping folder with invalid format: {class_folder}")
+            continue
+        mat_idx, fin_idx = labels
+
+        paths = []
+        for pattern in IMAGE_PATTERNS:
+            paths.extend(glob.glob(os.path.join(folder_path, pattern)))
+        for img_path in sorted(paths):
+            samples.append((img_path, mat_idx, fin_idx))
+    return samples
+
+
+def source_signature(samples):
+    """
+    Hash of the sample paths, labels, sizes and mtimes; None if a file is missing.
+    """
+    h = hashlib.sha1()
+    for img_path, mat_idx, fin_idx in samples:
+        try:
+            st = os.stat(img_path)
+        except FileNotFoundError:
+            return None
+        h.update(f"{img_path}|{st.st_size}|{st.st_mtime_ns}|{mat_idx}|{fin_idx}\n".encode('utf-8'))
+    return h.hexdigest()
+
+
+def pack_dataset(root_dir="dataset/train", out_dir="dataset/packed", size=224, force=False, workers=None):
+    """
+    Decodes and resizes every image under root_dir once, in a vsams.preprocess worker
+    pool. Skips the work if the existing pack was built from the same files (unless force=True).
+    """
+    samples = list_samples(root_dir, verify=True)
+    if not samples:
+        print(f"No images found under {root_dir}")
+        return None
+
+    signature = source_signature(samples)
+    manifest_path = os.path.join(out_dir, "manifest.json")
+    if not force and os.path.exists(manifest_path):
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if (manifest.get("signature") == signature and manifest.get("size") == size
+                and manifest.get("resize") == RESIZE_METHOD):
+            print(f"Pack is up to date: {out_dir} ({manifest['num_samples']} images)")
+            return manifest
+
+    os.makedirs(out_dir, exist_ok=True)
+    # Invalidate the old pack before its data files are replaced; the new manifest is
+    # only written once every file is complete, so an interrupted run leaves no manifest
+    if os.path.exists(manifest_path):
+        os.remove(manifest_path)
+    start = time.perf_counter()
+
+    images_tmp = os.path.join(out_dir, "images.tmp.npy")
+    images = np.lib.format.open_memmap(images_tmp, mode='w+', dtype=np.uint8, shape=(len(samples), size, size, 3))
+    offset = 0
+    with PreprocessPool(size=size, workers=workers, resize_fn=resize_like_folder) as pool:
+        for chunk, batch, errors, _ in pool.iter_batches([s[0] for s in samples], batch_size=64):
+            for img_path, error in zip(chunk, errors):
+                if error is not None:
+                    raise ValueError(f"Could not decode {img_path}: {error}")
+            images[offset:offset + len(chunk)] = batch
+            offset += len(chunk)
+            if offset // 500 != (offset - len(chunk)) // 500:
+                print(f"Packed {offset}/{len(samples)}")
+    images.flush()
+    del images
+    os.replace(images_tmp, os.path.join(out_dir, "images.npy"))
+
+    np.save(os.path.join(out_dir, "mat_labels.npy"), np.array([s[1] for s in samples], dtype=np.int64))
+    np.save(os.path.join(out_dir, "fin_labels.npy"), np.array([s[2] for s in samples], dtype=np.int64))
+
+    manifest = {
+        "num_samples": len(samples),
+        "size": size,
+        "resize": RESIZE_METHOD,
+        "materials": MATERIALS,
+        "finishes": FINISHES,
+        "root_dir": root_dir,
+        "paths": [s[0] for s in samples],
+        "signature": signature,
+        "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+    }
+    # Manifest is written last so a half-finished pack is never mistaken for a valid one
+    with open(manifest_path + ".tmp", 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False)
+    os.replace(manifest_path + ".tmp", manifest_path)
+
+    print(f"Packed {len(samples)} images into {out_dir} in {time.perf_counter() - start:.1f}s")
+    return manifest
+
+
+def pack_is_current(pack_dir, root_dir="dataset/train", samples=None):
+    """
+    True if pack_dir holds a complete pack built from the current files under root_dir.
+    samples: an existing list_samples(root_dir) result, to avoid listing the tree again.
+    """
+    manifest_path = os.path.join(pack_dir, "manifest.json")
+    if not os.path.exists(manifest_path):
+        return False
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    if samples is None:
+        samples = list_samples(root_dir)
+    signature = source_signature(samples)
+    return (signature is not None and manifest.get("signature") == signature
+            and manifest.get("resize") == RESIZE_METHOD)
+
+
+class PackedSurfaceDataset(Dataset):
+    """
+    Reads pre-resized uint8 images from a pack created by pack_dataset().
+
+    The image array is memory-mapped lazily in each DataLoader worker, so samples are
+    read zero-copy and only the per-step random augmentations are applied.
+    """
+    def __init__(self, pack_dir, transform=None):
+        self.pack_dir = pack_dir
+        self.transform = transform
+        with open(os.path.join(pack_dir, "manifest.json"), 'r', encoding='utf-8') as f:
+            self.manifest = json.load(f)
+        self.mat_labels = np.load(os.path.join(pack_dir, "mat_labels.npy"))
+        self.fin_labels = np.load(os.path.join(pack_dir, "fin_labels.npy"))
+        self._images = None
+        print(f"Loaded {len(self)} packed images from {pack_dir}")
+
+    @property
+    def images(self):
+        if self._images is None:
+            self._images = np.load(os.path.join(self.pack_dir, "images.npy"), mmap_mode='r')
+        return self._images
+
+    def __getstate__(self):
+        # Memory maps are re-opened in each worker instead of being pickled
+        state = self.__dict__.copy()
+        state["_images"] = None
+        return state
+
+    def __len__(self):
+        return len(self.mat_labels)
+
+    def get_labels(self):
+        return self.mat_labels, self.fin_labels
+
+    def __getitem__(self, idx):
+        image = self.images[idx]
+
+        if self.transform:
+            image = self.transform(image=np.asarray(image))['image']
+
+        return image, int(self.mat_labels[idx]), int(self.fin_labels[idx])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pack the V-SAMS training folder into a memory-mapped array")
+    parser.add_argument("--root", default="dataset/train")
+    parser.add_argument("--out", default="dataset/packed")
+    parser.add_argument("--size", type=int, default=224)
+    parser.add_argument("--force", action="store_true")
+    parser.add_argument("--workers", type=int, default=None, help="Decode threads (default: CPU count - 1, max 8)")
+    args = parser.parse_args()
+    pack_dataset(args.root, args.out, size=args.size, force=args.force, workers=args.workers)
@@ -0,0 +1,87 @@
+"""
+Exports SurfaceClassifier to a self-contained TorchScript or ONNX artifact.
+
+The exported graph takes a [N, 3, 224, 224] normalized batch and returns
+(material_logits, finish_logits, features). Load it with vsams.runtime.load_exported
+(no timm import, no pretrained weight download).
+
+    python -m vsams.export --format torchscript --out checkpoints/v_sams_model.ts
+    python -m vsams.export --format onnx --out checkpoints/v_sams_model.onnx
+"""
+import argparse
+import os
+
+import torch
+import torch.nn as nn
+
+EXPORTED_PATH = 'checkpoints/v_sams_model.ts'
+
+
+class ExportWrapper(nn.Module):
+    def __init__(self, model):
+        super(ExportWrapper, self).__init__()
+        self.model = model
+
+    def forward(self, x):
+        features = self.model.backbone(x)
+        return self.model.material_head(features), self.model.finish_head(features), features
+
+
+def export_torchscript(model, path=EXPORTED_PATH, input_size=224):
+    wrapper = ExportWrapper(model.cpu().eval()).eval()
+    example = torch.randn(2, 3, input_size, input_size)
+    with torch.no_grad():
+        traced = torch.jit.trace(wrapper, example)
+        traced = torch.jit.freeze(traced)
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    torch.jit.save(traced, path + ".tmp")
+    os.replace(path + ".tmp", path)
+    return path
+
+
+def export_onnx(model, path='checkpoints/v_sams_model.onnx', input_size=224, opset=17):
+    wrapper = ExportWrapper(model.cpu().eval()).eval()
+    example = torch.randn(1, 3, input_size, input_size)
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    torch.onnx.export(
+        wrapper, example, path + ".tmp",
+        input_names=["input"],
+        output_names=["material_logits", "finish_logits", "features"],
+        dynamic_axes={name: {0: "batch"} for name in ("input", "material_logits", "finish_logits", "features")},
+        opset_version=opset,
+    )
+    os.replace(path + ".tmp", path)
+    return path
+
+
+def verify(model, path, input_size=224):
+    from vsams.runtime import load_exported
+
+    exported = load_exported(path)
+    x = torch.randn(4, 3, input_size, input_size)
+    with torch.no_grad():
+        ref_mat, ref_fin = model(x)
+        exp_mat, exp_fin = exported(x)
+    return max((ref_mat - exp_mat).abs().max().item(), (ref_fin - exp_fin).abs().max().item())
+
+
+if __name__ == "__main__":
+    from vsams.inference import load_classifier
+
+    parser = argparse.ArgumentParser(description="Export V-SAMS to TorchScript / ONNX")
+    parser.add_argument("--checkpoint", default='checkpoints/v_sams_model.pth')
+    parser.add_argument("--format", choices=["torchscript", "onnx"], default="torchscript")
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+
+    model, status = load_classifier(args.checkpoint, device=torch.device("cpu"))
+    if status != "real":
+        print(f"Warning: {args.checkpoint} not found. Exporting untrained heads.")
+
+    if args.format == "onnx":
+        path = export_onnx(model, args.out or 'checkpoints/v_sams_model.onnx')
+    else:
+        path = export_torchscript(model, args.out or EXPORTED_PATH)
+
+    print(f"Exported {args.format} model to {path} ({os.path.getsize(path)/1e6:.1f} MB)")
+    print(f"Max logit diff vs eager model: {verify(model, path):.2e}")
@@ -0,0 +1,204 @@
+"""
+Top-k cosine similarity index over 2048-d surface feature vectors.
+
+Small sets are searched by brute force (one NumPy matmul). Large sets use an
+IVF-style partitioned index: vectors are clustered with spherical k-means and
+a query only scans the nprobe closest partitions. Vectors are persisted as .npy
+files and memory-mapped on load.
+
+    <index_dir>/vectors.npy    float32 [N, dim], L2-normalized (grouped by partition for IVF)
+    <index_dir>/centroids.npy  float32 [nlist, dim]  (IVF only)
+    <index_dir>/offsets.npy    int64 [nlist + 1]     (IVF only)
+    <index_dir>/meta.json      per-vector metadata (path, material, finish, product_id, ...)
+    <index_dir>/info.json      model_id of the checkpoint that produced the vectors
+
+The whole directory is written next to index_dir and swapped in at the end, so
+vectors and metadata always come from the same build.
+
+    python -m vsams.feature_index --train-dir dataset/train --out dataset/feature_index
+"""
+import argparse
+import json
+import os
+import shutil
+
+import numpy as np
+
+BRUTE_FORCE_LIMIT = 50000
+
+
+def normalize(x):
+    x = np.asarray(x, dtype=np.float32)
+    norms = np.linalg.norm(x, axis=-1, keepdims=True)
+    return x / np.maximum(norms, 1e-12)
+
+
+def spherical_kmeans(x, nlist, iters=10, sample_size=65536, seed=0):
+    """
+    Returns [nlist, dim] unit centroids fitted on a random subsample of x.
+    """
+    rng = np.random.default_rng(seed)
+    sample = x[rng.choice(len(x), size=min(sample_size, len(x)), replace=False)]
+    centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+
+    for _ in range(iters):
+        assign = np.argmax(sample @ centroids.T, axis=1)
+        for c in range(nlist):
+            members = sample[assign == c]
+            # Empty clusters are re-seeded from a random sample point
+            centroids[c] = members.sum(0) if len(members) else sample[rng.integers(len(sample))]
+        centroids = normalize(centroids)
+    return centroids
+
+
+def top_k(scores, k):
+    k = min(k, len(scores))
+    if k == 0:
+        return np.empty(0, dtype=np.int64)
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top], kind='stable')]
+
+
+class FeatureIndex:
+    def __init__(self, vectors, meta, centroids=None, offsets=None, model_id=None):
+        self.vectors = vectors
+        self.meta = meta
+        self.centroids = centroids
+        self.offsets = offsets
+        # vsams.prediction_cache.model_fingerprint of the checkpoint the vectors came from
+        self.model_id = model_id
+
+    @property
+    def is_ivf(self):
+        return self.centroids is not None
+
+    def __len__(self):
+        return len(self.meta)
+
+    @classmethod
+    def build(cls, features, meta, nlist=None, brute_force_limit=BRUTE_FORCE_LIMIT, model_id=None):
+        """
+        features: [N, dim] array, meta: list of N dicts. Sets larger than
+        brute_force_limit get an IVF partition (nlist defaults to ~sqrt(N)).
+        """
+        vectors = normalize(features)
+        if len(vectors) <= brute_force_limit:
+            return cls(vectors, list(meta), model_id=model_id)
+
+        nlist = nlist or int(np.sqrt(len(vectors)))
+        centroids = spherical_kmeans(vectors, nlist)
+        assign = np.argmax(vectors @ centroids.T, axis=1)
+
+        # Group vectors by partition so each list is one contiguous slice
+        order = np.argsort(assign, kind='stable')
+        offsets = np.zeros(nlist + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(assign, minlength=nlist))
+        return cls(vectors[order], [meta[i] for i in order], centroids, offsets, model_id=model_id)
+
+    def search(self, query, k=5, nprobe=8):
+        """
+        Returns [(score, meta), ...] for the k most similar vectors (cosine).
+        """
+        q = normalize(query).reshape(-1)
+        if not self.is_ivf:
+            scores = np.asarray(self.vectors @ q)
+            return [(float(scores[i]), self.meta[i]) for i in top_k(scores, k)]
+
+        probe = top_k(self.centroids @ q, nprobe)
+        candidates = np.concatenate([np.arange(self.offsets[c], self.offsets[c + 1]) for c in probe])
+        if len(candidates) == 0:
+            return []
+        scores = np.asarray(self.vectors[candidates] @ q)
+        return [(float(scores[i]), self.meta[candidates[i]]) for i in top_k(scores, k)]
+
+    def save(self, index_dir):
+        index_dir = os.path.abspath(index_dir)
+        tmp_dir, old_dir = index_dir + ".tmp", index_dir + ".old"
+        for path in (tmp_dir, old_dir):
+            if os.path.exists(path):
+                shutil.rmtree(path)
+        os.makedirs(tmp_dir)
+
+        np.save(os.path.join(tmp_dir, "vectors.npy"), np.ascontiguousarray(self.vectors))
+        if self.is_ivf:
+            np.save(os.path.join(tmp_dir, "centroids.npy"), self.centroids)
+            np.save(os.path.join(tmp_dir, "offsets.npy"), self.offsets)
+        with open(os.path.join(tmp_dir, "meta.json"), 'w', encoding='utf-8') as f:
+            json.dump(self.meta, f, ensure_ascii=False)
+        with open(os.path.join(tmp_dir, "info.json"), 'w', encoding='utf-8') as f:
+            json.dump({"model_id": self.model_id, "count": len(self.meta)}, f)
+
+        # A crash between the two renames leaves no index (rebuilt on the next run), never a mixed one
+        if os.path.exists(index_dir):
+            os.replace(index_dir, old_dir)
+        os.replace(tmp_dir, index_dir)
+        if os.path.exists(old_dir):
+            shutil.rmtree(old_dir)
+
+    @classmethod
+    def load(cls, index_dir, mmap=True):
+        vectors = np.load(os.path.join(index_dir, "vectors.npy"), mmap_mode='r' if mmap else None)
+        with open(os.path.join(index_dir, "meta.json"), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        centroids = offsets = None
+        if os.path.exists(os.path.join(index_dir, "centroids.npy")):
+            centroids = np.load(os.path.join(index_dir, "centroids.npy"))
+            offsets = np.load(os.path.join(index_dir, "offsets.npy"))
+        model_id = None
+        if os.path.exists(os.path.join(index_dir, "info.json")):
+            with open(os.path.join(index_dir, "info.json"), 'r', encoding='utf-8') as f:
+                model_id = json.load(f).get("model_id")
+        return cls(vectors, meta, centroids, offsets, model_id=model_id)
+
+
+def build_from_dataset(model, train_dir, out_dir, cache_dir, products=None, batch_size=64, model_id=None):
+    """
+    Embeds labeled samples (through the content-hash FeatureCache) and catalog
+    reference images, then builds and saves the index.
+    model_id (model_fingerprint of the checkpoint) is stored so stale indexes can be detected.
+    """
+    from vsams.data.feature_cache import FeatureCache, backbone_fingerprint
+    from vsams.data.packed import list_samples
+    from vsams.inference import BatchPredictor
+    from vsams.labels import MATERIALS, FINISHES
+
+    predictor = BatchPredictor(model, batch_size=batch_size, precision="fp32")
+    embed = lambda paths: predictor.extract_features(paths).float().cpu().numpy()
+    cache = FeatureCache(cache_dir, backbone_fingerprint(model))
+
+    paths, meta = [], []
+    for img_path, mat_idx, fin_idx in list_samples(train_dir, verify=True):
+        paths.append(img_path)
+        meta.append({"kind": "sample", "path": img_path, "material": MATERIALS[mat_idx], "finish": FINISHES[fin_idx]})
+
+    for product in products or []:
+        img_path = product.get("image_url", "")
+        if img_path and os.path.exists(img_path):
+            paths.append(img_path)
+            meta.append({"kind": "product", "path": img_path, "product_id": product.get("id")})
+
+    if not paths:
+        print("No images to index.")
+        return None
+
+    index = FeatureIndex.build(cache.update(paths, embed, batch_size=batch_size), meta, model_id=model_id)
+    index.save(out_dir)
+    print(f"Indexed {len(index)} vectors into {out_dir} ({'IVF' if index.is_ivf else 'brute-force'})")
+    return index
+
+
+if __name__ == "__main__":
+    from vsams.inference import load_classifier
+    from vsams.prediction_cache import model_fingerprint
+    from vsams.utils.db_handler import load_db
+
+    parser = argparse.ArgumentParser(description="Build the V-SAMS surface feature index")
+    parser.add_argument("--checkpoint", default='checkpoints/v_sams_model.pth')
+    parser.add_argument("--train-dir", default=os.path.join("dataset", "train"))
+    parser.add_argument("--out", default=os.path.join("dataset", "feature_index"))
+    parser.add_argument("--feature-cache", default=os.path.join("dataset", "feature_cache"))
+    args = parser.parse_args()
+
+    model, status = load_classifier(args.checkpoint)
+    build_from_dataset(model, args.train_dir, args.out, args.feature_cache, products=load_db(),
+                       model_id=model_fingerprint([args.checkpoint]))
@@ -0,0 +1,266 @@
+import contextlib
+import os
+import numpy as np
+import torch
+from PIL import Image
+from torchvision import transforms
+
+from vsams.labels import MATERIALS, FINISHES
+from vsams.checkpoint import check_compatible
+from vsams.preprocess import iter_chunks
+
+IMAGENET_MEAN = (0.485, 0.456, 0.406)
+IMAGENET_STD = (0.229, 0.224, 0.225)
+
+# fp32: reference path / bf16: bfloat16 autocast / channels_last: NHWC memory format
+PRECISION_MODES = ("fp32", "bf16", "channels_last", "bf16+channels_last")
+
+
+def get_device():
+    # MacBook Pro M2 Pro (Apple Silicon) MPS 가동
+    if torch.backends.mps.is_available():
+        return torch.device("mps")
+    return torch.device("cuda" if torch.cuda.is_available() else "cpu")
+
+
+def model_device(model):
+    # Exported graphs (vsams.runtime.ExportedClassifier) have no parameters but record their device
+    device = getattr(model, "device", None)
+    if isinstance(device, torch.device):
+        return device
+    # Quantized modules keep packed weights outside parameters(); they always run on CPU
+    param = next(model.parameters(), None)
+    return param.device if param is not None else torch.device("cpu")
+
+
+def load_classifier(checkpoint_path='checkpoints/v_sams_model.pth', device=None, exported_path=None):
+    """
+    Builds SurfaceClassifier and loads the checkpoint if it exists.
+    Returns (model, status) where status is "real" or "mock".
+
+    If exported_path (TorchScript/ONNX from vsams.export) exists and is not older than
+    the checkpoint, it is loaded instead and timm is never imported.
+
+    Raises ValueError if the checkpoint metadata (vsams.checkpoint) lists different classes.
+    """
+    device = device if device is not None else get_device()
+    has_checkpoint = bool(checkpoint_path) and os.path.exists(checkpoint_path)
+    if has_checkpoint:
+        check_compatible(checkpoint_path)
+
+    if exported_path and os.path.exists(exported_path):
+        if not has_checkpoint or os.path.getmtime(exported_path) >= os.path.getmtime(checkpoint_path):
+            from vsams.runtime import load_exported
+            return load_exported(exported_path, device=device), "real"
+        print(f"Warning: {exported_path} is older than {checkpoint_path}. Re-run `python -m vsams.export`.")
+
+    from vsams.models.classifier import SurfaceClassifier
+    model = SurfaceClassifier(num_materials=len(MATERIALS), num_finishes=len(FINISHES), pretrained=not has_checkpoint)
+    status = "mock"
+
+    if has_checkpoint:
+        state_dict = torch.load(checkpoint_path, map_location=device)
+        model.load_state_dict(state_dict)
+        status = "real"
+
+    model.to(device)
+    model.eval()
+    return model, status
+
+
+def build_transform(input_size=224):
+    return transforms.Compose([
+        transforms.Resize((input_size, input_size)),
+        transforms.ToTensor(),
+        transforms.Normalize(mean=IMAGENET_MEAN, std=IMAGENET_STD),
+    ])
+
+
+def uint8_to_input(batch):
+    """
+    Converts a uint8 [N, H, W, 3] array/tensor (already resized) into the normalized
+    float [N, 3, H, W] batch that build_transform would produce.
+    """
+    batch = torch.as_tensor(batch).permute(0, 3, 1, 2).float().div_(255)
+    mean = torch.tensor(IMAGENET_MEAN).view(1, 3, 1, 1)
+    std = torch.tensor(IMAGENET_STD).view(1, 3, 1, 1)
+    return batch.sub_(mean).div_(std)
+
+
+def format_result(mat_probs, fin_probs):
+    """
+    Converts one row of material/finish probabilities into the result dict used by app.py.
+    """
+    mat_probs = [float(p) for p in mat_probs]
+    fin_probs = [float(p) for p in fin_probs]
+    mat_idx = max(range(len(mat_probs)), key=mat_probs.__getitem__)
+    fin_idx = max(range(len(fin_probs)), key=fin_probs.__getitem__)
+
+    return {
+        "Material": MATERIALS[mat_idx],
+        "Finish": FINISHES[fin_idx],
+        "Scores": {
+            MATERIALS[mat_idx]: mat_probs[mat_idx],
+            FINISHES[fin_idx]: fin_probs[fin_idx]
+        },
+        "Probabilities": {
+            "Material": dict(zip(MATERIALS, mat_probs)),
+            "Finish": dict(zip(FINISHES, fin_probs))
+        }
+    }
+
+
+class BatchPredictor:
+    """
+    Runs SurfaceClassifier over many images in micro-batches.
+
+    Images may be PIL Images, file paths or uint8 [H, W, 3] arrays from
+    vsams.preprocess.decode_image. The preprocessing transform is built once and
+    reused for every batch.
+
+    precision selects the inference path (see PRECISION_MODES). Reduced precision
+    modes should be checked with utils/validate_precision.py before use.
+
+    With a vsams.preprocess.PreprocessPool, decoding and resizing run in the pool's
+    workers (reduced-size JPEG decode) and overlap with the forward passes.
+    """
+    def __init__(self, model, batch_size=32, device=None, input_size=224, precision="fp32", preprocess_pool=None):
+        if precision not in PRECISION_MODES:
+            raise ValueError(f"Unknown precision mode: {precision} (expected one of {PRECISION_MODES})")
+        if preprocess_pool is not None and preprocess_pool.size != input_size:
+            raise ValueError(f"Preprocess pool size {preprocess_pool.size} does not match input size {input_size}")
+        self.preprocess_pool = preprocess_pool
+        self.model = model
+        self.batch_size = batch_size
+        self.device = device if device is not None else model_device(model)
+        self.input_size = input_size
+        self.transform = build_transform(input_size)
+        self.precision = precision
+        self.channels_last = "channels_last" in precision
+        self.use_bf16 = "bf16" in precision
+        if self.channels_last:
+            self.model.to(memory_format=torch.channels_last)
+        self.model.eval()
+
+    def preprocess(self, image):
+        if isinstance(image, (str, os.PathLike)):
+            with Image.open(image) as img:
+                image = img.convert("RGB")
+        elif image.mode != "RGB":
+            # RGBA 이미지는 정규화 과정에서 채널 수 불일치 에러가 발생하므로 RGB로 변환
+            image = image.convert("RGB")
+        return self.transform(image)
+
+    def stack(self, images):
+        if all(isinstance(img, np.ndarray) for img in images):
+            # Already decoded and resized to uint8 by vsams.preprocess
+            return uint8_to_input(np.stack(images))
+        return torch.stack([self.preprocess(img) for img in images])
+
+    def _autocast(self):
+        if self.use_bf16:
+            return torch.autocast(device_type=self.device.type, dtype=torch.bfloat16)
+        return contextlib.nullcontext()
+
+    def _to_input(self, batch):
+        batch = batch.to(self.device)
+        if self.channels_last:
+            batch = batch.contiguous(memory_format=torch.channels_last)
+        return batch
+
+    def forward_probs(self, batch):
+        """
+        Returns (material_probs, finish_probs) as CPU tensors of shape [N, C].
+        """
+        with torch.inference_mode(), self._autocast():
+            mat_logits, fin_logits = self.model(self._to_input(batch))
+            mat_logits, fin_logits = mat_logits.float(), fin_logits.float()
+            mat_probs = torch.softmax(mat_logits, dim=1)
+            fin_probs = torch.softmax(fin_logits, dim=1)
+        return mat_probs.float().cpu(), fin_probs.float().cpu()
+
+    def _stack_checked(self, chunk, errors):
+        # Per-image preprocessing: a failed image gets a zero slot and its error is recorded
+        tensors = []
+        for img in chunk:
+            try:
+                tensors.append(self.stack([img])[0])
+                errors.append(None)
+            except Exception as e:
+                tensors.append(torch.zeros(3, self.input_size, self.input_size))
+                errors.append(f"{type(e).__name__}: {e}")
+        return torch.stack(tensors)
+
+    def iter_probs(self, images, errors=None):
+        """
+        Yields (material_probs, finish_probs) per micro-batch.
+
+        An image that cannot be decoded raises ValueError, unless an errors list is
+        passed: it then receives one entry per image (None or the error message) and
+        the failed rows hold meaningless probabilities.
+        """
+        if self.preprocess_pool is not None:
+            for chunk, batch, chunk_errors, _ in self.preprocess_pool.iter_batches(images, self.batch_size):
+                if errors is not None:
+                    errors.extend(chunk_errors)
+                else:
+                    failed = [e for e in chunk_errors if e is not None]
+                    if failed:
+                        raise ValueError(f"Could not decode image: {failed[0]}")
+                yield self.forward_probs(uint8_to_input(batch))
+            return
+        for chunk in iter_chunks(images, self.batch_size):
+            batch = self.stack(chunk) if errors is None else self._stack_checked(chunk, errors)
+            yield self.forward_probs(batch)
+
+    def predict_probs(self, images):
+        """
+        Returns full probability vectors for every image as two [N, C] tensors.
+        """
+        mat_parts, fin_parts = [], []
+        for mat_probs, fin_probs in self.iter_probs(images):
+            mat_parts.append(mat_probs)
+            fin_parts.append(fin_probs)
+        if not mat_parts:
+            return torch.empty(0, len(MATERIALS)), torch.empty(0, len(FINISHES))
+        return torch.cat(mat_parts), torch.cat(fin_parts)
+
+    def iter_predict(self, images, return_errors=False):
+        """
+        Yields one result dict per image. With return_errors=True, an image that cannot
+        be decoded yields a ValueError instance in its place instead of failing the batch.
+        """
+        errors = [] if return_errors else None
+        index = 0
+        for mat_probs, fin_probs in self.iter_probs(images, errors):
+            for mat_row, fin_row in zip(mat_probs.tolist(), fin_probs.tolist()):
+                if errors is not None and errors[index] is not None:
+                    yield ValueError(f"Could not decode image: {errors[index]}")
+                else:
+                    yield format_result(mat_row, fin_row)
+                index += 1
+
+    def predict(self, images, return_errors=False):
+        return list(self.iter_predict(images, return_errors))
+
+    def predict_one(self, image):
+        return self.predict([image])[0]
+
+    def extract_features(self, images):
+        """
+        Returns backbone feature vectors (e.g. [N, 2048] for ResNet50).
+        Accepts a preprocessed [N, 3, H, W] tensor or an iterable of images.
+        """
+        if isinstance(images, torch.Tensor):
+            batches = images.split(self.batch_size)
+        else:
+            batches = (self.stack(chunk) for chunk in iter_chunks(images, self.batch_size))
+
+        parts = []
+        with torch.inference_mode(), self._autocast():
+            for batch in batches:
+                parts.append(self.model(self._to_input(batch), return_features=True).float())
+        if not parts:
+            # Exported/quantized wrappers do not record the feature width
+            return torch.empty(0, getattr(self.model, "num_features", 0))
+        return torch.cat(parts)
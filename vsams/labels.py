@@ -0,0 +1,3 @@
+# Class Mappings (Synchronized with train.py and labeler.py)
+MATERIALS = ["Metal", "Plastic", "Glass", "Painted", "Wood", "Other"]
+FINISHES = ["Mirror", "Rough", "Hairline", "Matte", "Glossy", "Pattern", "Other"]
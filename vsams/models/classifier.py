@@ -3,10 +3,11 @@ import torch.nn as nn
 import timm
 
 class SurfaceClassifier(nn.Module):
-    def __init__(self, num_materials=6, num_finishes=7, backbone_name='resnet50'):
+    def __init__(self, num_materials=6, num_finishes=7, backbone_name='resnet50', pretrained=True):
         super(SurfaceClassifier, self).__init__()
         # Load Pre-trained Backbone
-        self.backbone = timm.create_model(backbone_name, pretrained=True, num_classes=0) # num_classes=0 removes the head
+        # pretrained=False skips the ImageNet download when a checkpoint will overwrite the weights anyway
+        self.backbone = timm.create_model(backbone_name, pretrained=pretrained, num_classes=0) # num_classes=0 removes the head
         self.num_features = self.backbone.num_features
         
         # Multi-Head Architecture
@@ -0,0 +1,155 @@
+"""
+Content-addressed prediction cache.
+
+Keys combine the image content hash, the model checkpoint hash and a variant
+string (e.g. tiled mode / precision), so identical uploads skip inference while
+a new checkpoint never serves stale results. Two layers:
+
+- in-memory LRU (max_items entries)
+- optional on-disk layer (pickled results under disk_dir, evicted oldest-first
+  once max_disk_mb is exceeded)
+"""
+import hashlib
+import os
+import pickle
+import threading
+from collections import OrderedDict
+
+from vsams.data.feature_cache import file_hash
+
+
+def content_hash(data):
+    """
+    sha1 of raw image bytes (preferred) or of a file path's contents.
+    """
+    if isinstance(data, (str, os.PathLike)):
+        return file_hash(data)
+    return hashlib.sha1(bytes(data)).hexdigest()
+
+
+def model_fingerprint(paths):
+    """
+    Combined hash of the model artifacts that exist among paths.
+    """
+    h = hashlib.sha1()
+    for path in paths:
+        if path and os.path.exists(path):
+            h.update(os.path.basename(path).encode('utf-8'))
+            h.update(file_hash(path).encode('utf-8'))
+    return h.hexdigest()
+
+
+class PredictionCache:
+    def __init__(self, model_id, max_items=1024, disk_dir=None, max_disk_mb=512):
+        self.model_id = model_id
+        self.max_items = max_items
+        self.disk_dir = disk_dir
+        self.max_disk_bytes = int(max_disk_mb * 1024 * 1024)
+        self.memory = OrderedDict()
+        self.counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+        self._lock = threading.Lock()
+        self._disk_bytes = 0
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+            self._disk_bytes = sum(e.stat().st_size for e in os.scandir(disk_dir) if e.name.endswith(".pkl"))
+
+    def key(self, image_hash, variant=""):
+        return hashlib.sha1(f"{self.model_id}|{variant}|{image_hash}".encode('utf-8')).hexdigest()
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, f"{key}.pkl")
+
+    def get(self, key):
+        with self._lock:
+            if key in self.memory:
+                self.memory.move_to_end(key)
+                self.counters["memory_hits"] += 1
+                return self.memory[key]
+
+        if self.disk_dir and os.path.exists(self._disk_path(key)):
+            try:
+                with open(self._disk_path(key), 'rb') as f:
+                    value = pickle.load(f)
+            except (OSError, EOFError, pickle.UnpicklingError):
+                value = None
+            if value is not None:
+                # Touch so eviction keeps recently used entries
+                os.utime(self._disk_path(key))
+                with self._lock:
+                    self.counters["disk_hits"] += 1
+                self._put_memory(key, value)
+                return value
+
+        with self._lock:
+            self.counters["misses"] += 1
+        return None
+
+    def _put_memory(self, key, value):
+        with self._lock:
+            self.memory[key] = value
+            self.memory.move_to_end(key)
+            while len(self.memory) > self.max_items:
+                self.memory.popitem(last=False)
+                self.counters["evictions"] += 1
+
+    def put(self, key, value):
+        self._put_memory(key, value)
+        if not self.disk_dir:
+            return
+
+        path = self._disk_path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        size = os.path.getsize(tmp_path)
+        if os.path.exists(path):
+            size -= os.path.getsize(path)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._disk_bytes += size
+            over_limit = self._disk_bytes > self.max_disk_bytes
+        if over_limit:
+            self._evict_disk()
+
+    def _evict_disk(self):
+        entries = sorted((e for e in os.scandir(self.disk_dir) if e.name.endswith(".pkl")), key=lambda e: e.stat().st_mtime)
+        total = sum(e.stat().st_size for e in entries)
+        # Evict down to 90% so every put does not trigger another scan
+        target = int(self.max_disk_bytes * 0.9)
+        for entry in entries:
+            if total <= target:
+                break
+            size = entry.stat().st_size
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                continue
+            total -= size
+            with self._lock:
+                self.counters["evictions"] += 1
+        with self._lock:
+            self._disk_bytes = total
+
+    def predict(self, predict_fn, images, image_hashes, variant=""):
+        """
+        Returns results for images, running predict_fn (list in, list out) once
+        on the cache misses only.
+        """
+        keys = [self.key(h, variant) for h in image_hashes]
+        results = [self.get(k) for k in keys]
+        missing = [i for i, r in enumerate(results) if r is None]
+        if missing:
+            computed = predict_fn([images[i] for i in missing])
+            for i, value in zip(missing, computed):
+                self.put(keys[i], value)
+                results[i] = value
+        return results
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+            stats["memory_items"] = len(self.memory)
+            stats["disk_mb"] = self._disk_bytes / (1024 * 1024)
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        return stats
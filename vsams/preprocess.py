@@ -0,0 +1,153 @@
+"""
+Parallel image decode / resize stage shared by inference and dataset packing.
+
+Decoding is the expensive part for large uploads (a 12 MP PNG takes longer to
+decode than a ResNet50 forward pass), so it runs in a worker pool ahead of the
+consumer:
+
+- JPEGs are opened with Image.draft, which lets libjpeg decode directly at a
+  1/2, 1/4 or 1/8 scale that is still at least the target size.
+- Workers return ready-to-stack uint8 [N, S, S, 3] batches; normalization to
+  float happens on the model side (vsams.inference.uint8_to_input).
+- At most queue_size batches are in flight, so decode runs ahead of the
+  model without buffering an entire folder in memory.
+
+PIL releases the GIL while decoding and resizing, so the default thread pool
+scales across cores without pickling images between processes.
+"""
+import hashlib
+import io
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+
+def open_rgb(source, draft_size=None):
+    """
+    Opens a path, raw bytes, file-like object or PIL Image as an RGB PIL Image.
+    With draft_size=(w, h), JPEGs are decoded at the smallest scale >= draft_size.
+    """
+    if isinstance(source, Image.Image):
+        return source if source.mode == "RGB" else source.convert("RGB")
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+    with Image.open(source) as img:
+        if draft_size is not None:
+            img.draft("RGB", draft_size)
+        return img.convert("RGB")
+
+
+def decode_image(source, size=224, draft=True, resize_fn=None):
+    """
+    Returns a uint8 [size, size, 3] array (same resize as vsams.inference.build_transform).
+    resize_fn(rgb_array, size) replaces the PIL bilinear resize (e.g. to match a training transform).
+    """
+    img = open_rgb(source, draft_size=(size, size) if draft else None)
+    if resize_fn is not None:
+        return np.ascontiguousarray(resize_fn(np.asarray(img, dtype=np.uint8), size), dtype=np.uint8)
+    return np.asarray(img.resize((size, size), Image.BILINEAR), dtype=np.uint8)
+
+
+def decode_batch(items, size=224, draft=True, reader=None, with_hash=False, resize_fn=None):
+    """
+    Decodes a list of images into one uint8 [N, size, size, 3] array.
+    reader(item) maps an item to a path/bytes/Image (e.g. a ZIP member reader).
+    Returns (batch, errors, hashes): failed images keep a zero slot and an error
+    string; hashes are sha1 of the raw bytes when with_hash is set, else None.
+    """
+    batch = np.zeros((len(items), size, size, 3), dtype=np.uint8)
+    errors = [None] * len(items)
+    hashes = [None] * len(items) if with_hash else None
+    for i, item in enumerate(items):
+        try:
+            source = reader(item) if reader is not None else item
+            if with_hash:
+                if isinstance(source, (str, os.PathLike)):
+                    with open(source, 'rb') as f:
+                        source = f.read()
+                hashes[i] = hashlib.sha1(bytes(source)).hexdigest()
+            batch[i] = decode_image(source, size, draft, resize_fn)
+        except Exception as e:
+            errors[i] = f"{type(e).__name__}: {e}"
+    return batch, errors, hashes
+
+
+def iter_chunks(items, size):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class PreprocessPool:
+    """
+    Worker pool that turns image sources into uint8 batches ahead of the consumer.
+
+        with PreprocessPool(size=224, workers=8) as pool:
+            for items, batch, errors, hashes in pool.iter_batches(paths, batch_size=64):
+                ...
+
+    use_processes=True switches to a process pool (reader and resize_fn must then be picklable).
+    """
+    def __init__(self, size=224, workers=None, queue_size=4, draft=True, use_processes=False,
+                 reader=None, with_hash=False, resize_fn=None):
+        self.size = size
+        self.resize_fn = resize_fn
+        self.workers = workers or max(1, min(8, (os.cpu_count() or 2) - 1))
+        self.queue_size = max(1, queue_size)
+        self.draft = draft
+        self.reader = reader
+        self.with_hash = with_hash
+        executor_cls = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+        self._executor = executor_cls(max_workers=self.workers)
+
+    def submit(self, items):
+        return self._executor.submit(decode_batch, list(items), self.size, self.draft, self.reader, self.with_hash,
+                                     self.resize_fn)
+
+    def iter_batches(self, items, batch_size=32):
+        """
+        Yields (items, uint8 batch, errors, hashes) per chunk, in input order.
+        """
+        pending = deque()
+        for chunk in iter_chunks(items, batch_size):
+            pending.append((chunk, self.submit(chunk)))
+            if len(pending) > self.queue_size:
+                chunk_done, future = pending.popleft()
+                yield (chunk_done,) + future.result()
+        while pending:
+            chunk_done, future = pending.popleft()
+            yield (chunk_done,) + future.result()
+
+    def decode(self, items):
+        """
+        Decodes all items in one call; raises on the first failed image.
+        """
+        items = list(items)
+        # Spread a single call across all workers
+        batch_size = max(1, -(-len(items) // self.workers))
+        parts = []
+        for chunk, batch, errors, _ in self.iter_batches(items, batch_size=batch_size):
+            for item, error in zip(chunk, errors):
+                if error is not None:
+                    raise ValueError(f"Could not decode {item if isinstance(item, (str, os.PathLike)) else 'image'}: {error}")
+            parts.append(batch)
+        if not parts:
+            return np.zeros((0, self.size, self.size, 3), dtype=np.uint8)
+        return np.concatenate(parts)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
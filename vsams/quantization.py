@@ -0,0 +1,160 @@
+"""
+INT8 quantization pipeline for SurfaceClassifier (CPU deployment).
+
+- Backbone: post-training static quantization (FX graph mode) calibrated on dataset/train.
+- Heads: dynamic quantization of the Linear layers.
+
+The quantized model is saved as a separate, self-contained artifact and never
+overwrites the fp32 checkpoint.
+
+    python -m vsams.quantization --calib dataset/train --out checkpoints/v_sams_model_int8.pt
+"""
+import argparse
+import copy
+import os
+import random
+import time
+
+import torch
+import torch.nn as nn
+from torch.ao.quantization import get_default_qconfig_mapping, quantize_dynamic
+from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+
+from vsams.inference import BatchPredictor, iter_chunks
+
+QUANTIZED_PATH = 'checkpoints/v_sams_model_int8.pt'
+
+
+def select_engine():
+    engines = torch.backends.quantized.supported_engines
+    for engine in ("x86", "fbgemm", "qnnpack"):
+        if engine in engines:
+            return engine
+    raise RuntimeError(f"No supported quantization engine found: {engines}")
+
+
+class QuantizedSurfaceClassifier(nn.Module):
+    """
+    Same call interface as SurfaceClassifier, built from quantized parts.
+    """
+    def __init__(self, backbone, material_head, finish_head, engine):
+        super(QuantizedSurfaceClassifier, self).__init__()
+        self.backbone = backbone
+        self.material_head = material_head
+        self.finish_head = finish_head
+        self.engine = engine
+
+    def forward(self, x, return_features=False):
+        features = self.backbone(x)
+
+        if return_features:
+            return features
+
+        return self.material_head(features), self.finish_head(features)
+
+    def extract_features(self, x):
+        self.eval()
+        with torch.no_grad():
+            return self.backbone(x)
+
+
+def quantize_classifier(model, calibration_images, batch_size=16):
+    """
+    Returns a QuantizedSurfaceClassifier. model is left untouched.
+    calibration_images: PIL images or paths used to collect activation ranges.
+    """
+    engine = select_engine()
+    torch.backends.quantized.engine = engine
+
+    model = copy.deepcopy(model).cpu().eval()
+    example_inputs = (torch.randn(1, 3, 224, 224),)
+
+    # 1. Backbone: static PTQ with a calibration pass
+    prepared = prepare_fx(model.backbone, get_default_qconfig_mapping(engine), example_inputs)
+    preprocess = BatchPredictor(model, batch_size=batch_size, device=torch.device("cpu"))
+    with torch.inference_mode():
+        for chunk in iter_chunks(calibration_images, batch_size):
+            prepared(preprocess.stack(chunk))
+    backbone = convert_fx(prepared)
+
+    # 2. Heads: dynamic quantization of Linear layers
+    material_head = quantize_dynamic(model.material_head, {nn.Linear}, dtype=torch.qint8)
+    finish_head = quantize_dynamic(model.finish_head, {nn.Linear}, dtype=torch.qint8)
+
+    return QuantizedSurfaceClassifier(backbone, material_head, finish_head, engine).eval()
+
+
+def save_quantized(qmodel, path=QUANTIZED_PATH):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = path + ".tmp"
+    torch.save(qmodel, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def load_quantized(path=QUANTIZED_PATH):
+    """
+    Loads the INT8 artifact (CPU only) without the fp32 checkpoint. The artifact is a
+    pickled module, so unpickling still imports the modules it was built from (timm).
+    """
+    qmodel = torch.load(path, map_location='cpu', weights_only=False)
+    torch.backends.quantized.engine = qmodel.engine
+    return qmodel.eval()
+
+
+def measure_latency(model, batch_size, repeats=10):
+    x = torch.randn(batch_size, 3, 224, 224)
+    with torch.inference_mode():
+        model(x)
+        start = time.perf_counter()
+        for _ in range(repeats):
+            model(x)
+    return (time.perf_counter() - start) / repeats * 1000.0
+
+
+def report(fp32_model, qmodel, eval_images, fp32_path, int8_path):
+    fp32_size = os.path.getsize(fp32_path) / 1e6 if os.path.exists(fp32_path) else float("nan")
+    int8_size = os.path.getsize(int8_path) / 1e6
+    print(f"Size     : fp32 {fp32_size:.1f} MB -> int8 {int8_size:.1f} MB")
+
+    for batch_size in (1, 16):
+        fp32_ms = measure_latency(fp32_model, batch_size)
+        int8_ms = measure_latency(qmodel, batch_size)
+        print(f"Latency  : batch {batch_size:>2} fp32 {fp32_ms:.1f} ms -> int8 {int8_ms:.1f} ms ({fp32_ms/int8_ms:.2f}x)")
+
+    if eval_images:
+        cpu = torch.device("cpu")
+        ref_mat, ref_fin = BatchPredictor(fp32_model, device=cpu).predict_probs(eval_images)
+        q_mat, q_fin = BatchPredictor(qmodel, device=cpu).predict_probs(eval_images)
+        mat_agree = (ref_mat.argmax(1) == q_mat.argmax(1)).float().mean().item()
+        fin_agree = (ref_fin.argmax(1) == q_fin.argmax(1)).float().mean().item()
+        print(f"Agreement: material {mat_agree*100:.2f}% / finish {fin_agree*100:.2f}% on {len(eval_images)} images")
+
+
+if __name__ == "__main__":
+    from vsams.data.packed import list_samples
+    from vsams.inference import load_classifier
+
+    parser = argparse.ArgumentParser(description="Build the INT8 V-SAMS model")
+    parser.add_argument("--checkpoint", default='checkpoints/v_sams_model.pth')
+    parser.add_argument("--calib", default=os.path.join("dataset", "train"), help="Calibration image folder")
+    parser.add_argument("--num-calib", type=int, default=256)
+    parser.add_argument("--num-eval", type=int, default=256, help="Held-out images for the agreement report")
+    parser.add_argument("--out", default=QUANTIZED_PATH)
+    args = parser.parse_args()
+
+    model, status = load_classifier(args.checkpoint, device=torch.device("cpu"))
+    if status != "real":
+        print(f"Warning: {args.checkpoint} not found. Quantizing untrained heads.")
+
+    paths = [s[0] for s in list_samples(args.calib, verify=True)]
+    random.Random(0).shuffle(paths)
+    calib_paths = paths[:args.num_calib]
+    eval_paths = paths[args.num_calib:args.num_calib + args.num_eval]
+    if not calib_paths:
+        print(f"No calibration images found under {args.calib}")
+    else:
+        print(f"Calibrating on {len(calib_paths)} images ({select_engine()})...")
+        qmodel = quantize_classifier(model, calib_paths)
+        save_quantized(qmodel, args.out)
+        print(f"Saved INT8 model to {args.out}")
+        report(model, qmodel, eval_paths, args.checkpoint, args.out)
@@ -0,0 +1,59 @@
+"""
+Lightweight runtime for exported V-SAMS models.
+
+Loads a TorchScript (.ts / .pt) or ONNX (.onnx) artifact produced by vsams.export
+without importing timm or downloading pretrained weights. The loaded object has
+the same call interface as SurfaceClassifier, so it plugs into BatchPredictor.
+"""
+import os
+
+import torch
+import torch.nn as nn
+
+
+class ExportedClassifier(nn.Module):
+    """
+    Wraps an exported graph that returns (material_logits, finish_logits, features).
+    """
+    def __init__(self, path, device=None):
+        super(ExportedClassifier, self).__init__()
+        self.path = path
+        self.device = device if device is not None else torch.device("cpu")
+        self.backend = "onnx" if path.endswith(".onnx") else "torchscript"
+
+        if self.backend == "onnx":
+            try:
+                import onnxruntime as ort
+            except ImportError:
+                raise ImportError("onnxruntime is required to run .onnx models (pip install onnxruntime)")
+            providers = ["CUDAExecutionProvider", "CPUExecutionProvider"] if self.device.type == "cuda" else ["CPUExecutionProvider"]
+            self.session = ort.InferenceSession(path, providers=providers)
+            self.module = None
+        else:
+            self.session = None
+            self.module = torch.jit.load(path, map_location=self.device)
+            self.module.eval()
+
+    def _run(self, x):
+        if self.backend == "onnx":
+            outputs = self.session.run(None, {"input": x.detach().cpu().numpy()})
+            return tuple(torch.from_numpy(o) for o in outputs)
+        return self.module(x)
+
+    def forward(self, x, return_features=False):
+        material_logits, finish_logits, features = self._run(x)
+
+        if return_features:
+            return features
+
+        return material_logits, finish_logits
+
+    def extract_features(self, x):
+        with torch.no_grad():
+            return self._run(x)[2]
+
+
+def load_exported(path, device=None):
+    if not os.path.exists(path):
+        raise FileNotFoundError(path)
+    return ExportedClassifier(path, device=device).eval()
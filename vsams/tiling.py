@@ -0,0 +1,87 @@
+"""
+Tiled full-resolution surface analysis.
+
+Resizing a whole upload to 224x224 destroys micro-texture (hairline grooves,
+sandblast pitting). Instead, the image is cut into overlapping 224 patches at
+native resolution, patches are streamed through BatchPredictor in bounded batches,
+and patch probabilities are aggregated (mean + vote) with a per-patch heatmap.
+"""
+import torch
+
+from vsams.inference import format_result, iter_chunks
+from vsams.labels import MATERIALS, FINISHES
+
+
+def tile_positions(length, tile_size, stride):
+    positions = list(range(0, max(length - tile_size, 0) + 1, stride))
+    # Make sure the last tile reaches the image edge
+    if positions[-1] + tile_size < length:
+        positions.append(length - tile_size)
+    return positions
+
+
+def iter_tiles(image, tile_size=224, overlap=0.25):
+    """
+    Yields (row, col, crop) for overlapping tile_size patches of a PIL image.
+    Crops are produced lazily so only the current batch is held in memory.
+    """
+    stride = max(1, int(tile_size * (1.0 - overlap)))
+    xs = tile_positions(image.width, tile_size, stride)
+    ys = tile_positions(image.height, tile_size, stride)
+    for row, y in enumerate(ys):
+        for col, x in enumerate(xs):
+            yield row, col, image.crop((x, y, x + tile_size, y + tile_size))
+
+
+def prepare_image(image, tile_size=224, max_side=None):
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    # Images smaller than one tile are upscaled so the short side fits a tile
+    short_side = min(image.size)
+    if short_side < tile_size:
+        scale = tile_size / short_side
+        image = image.resize((max(tile_size, round(image.width * scale)), max(tile_size, round(image.height * scale))))
+    # Optional cap on resolution (bounds the number of tiles for huge scans)
+    if max_side and max(image.size) > max_side:
+        scale = max_side / max(image.size)
+        image = image.resize((max(tile_size, round(image.width * scale)), max(tile_size, round(image.height * scale))))
+    return image
+
+
+def predict_tiled(predictor, image, tile_size=224, overlap=0.25, max_side=None):
+    """
+    Runs every patch of image through predictor (a BatchPredictor) in batches of
+    predictor.batch_size and returns the usual result dict plus:
+
+        "Votes":   share of patches voting for each material / finish
+        "Heatmap": {"Material": [rows, cols, M], "Finish": [rows, cols, F]} patch probabilities
+        "Tiles":   number of patches and grid shape
+    """
+    image = prepare_image(image, tile_size=tile_size, max_side=max_side)
+
+    stride = max(1, int(tile_size * (1.0 - overlap)))
+    rows = len(tile_positions(image.height, tile_size, stride))
+    cols = len(tile_positions(image.width, tile_size, stride))
+    mat_map = torch.zeros(rows, cols, len(MATERIALS))
+    fin_map = torch.zeros(rows, cols, len(FINISHES))
+
+    for chunk in iter_chunks(iter_tiles(image, tile_size, overlap), predictor.batch_size):
+        mat_probs, fin_probs = predictor.forward_probs(predictor.stack([crop for _, _, crop in chunk]))
+        for i, (row, col, _) in enumerate(chunk):
+            mat_map[row, col] = mat_probs[i]
+            fin_map[row, col] = fin_probs[i]
+
+    mat_flat = mat_map.reshape(-1, len(MATERIALS))
+    fin_flat = fin_map.reshape(-1, len(FINISHES))
+    num_tiles = mat_flat.shape[0]
+
+    result = format_result(mat_flat.mean(0).tolist(), fin_flat.mean(0).tolist())
+    mat_votes = torch.bincount(mat_flat.argmax(1), minlength=len(MATERIALS)).float() / num_tiles
+    fin_votes = torch.bincount(fin_flat.argmax(1), minlength=len(FINISHES)).float() / num_tiles
+    result["Votes"] = {
+        "Material": dict(zip(MATERIALS, mat_votes.tolist())),
+        "Finish": dict(zip(FINISHES, fin_votes.tolist()))
+    }
+    result["Heatmap"] = {"Material": mat_map.numpy(), "Finish": fin_map.numpy()}
+    result["Tiles"] = {"count": num_tiles, "grid": (rows, cols), "size": tile_size}
+    return result
@@ -1,49 +1,286 @@
 import json
 import os
+import threading
+
+import numpy as np
+
+from vsams.labels import MATERIALS, FINISHES
+from vsams.utils.product_store import SQLiteProductStore
 
 DB_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'database.json')
+SQLITE_PATH = os.path.splitext(DB_PATH)[0] + '.sqlite'
+# The catalog shipped with the repository (database.json next to app.py)
+REPO_DB_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'database.json')
+
+
+def json_catalog_path():
+    """
+    JSON catalog to import into SQLite: DB_PATH once the admin mode has saved there,
+    otherwise the repository's database.json.
+    """
+    return DB_PATH if os.path.exists(DB_PATH) else REPO_DB_PATH
+
+
+def db_backend():
+    """
+    "sqlite" or "json". VSAMS_DB_BACKEND overrides; otherwise SQLite is used once
+    the database has been imported (python -m vsams.utils.product_store).
+    """
+    backend = os.environ.get("VSAMS_DB_BACKEND")
+    if backend:
+        return backend
+    return "sqlite" if os.path.exists(SQLITE_PATH) else "json"
+
+
+def _normalize(value):
+    return str(value).strip().lower()
+
+
+def _prob_vector(probs, labels):
+    """
+    Accepts a {label: prob} dict or a sequence ordered like labels.
+    """
+    if isinstance(probs, dict):
+        return np.array([probs.get(label, 0.0) for label in labels], dtype=np.float32)
+    return np.asarray(probs, dtype=np.float32).reshape(len(labels))
+
+
+class ProductCatalog:
+    """
+    In-memory product catalog with an inverted index keyed by (material, finish).
+
+    The JSON file is parsed once and re-parsed only when its mtime/size changes,
+    so repeated queries cost O(matches) instead of a full file load and scan.
+    With a SQLiteProductStore, the store revision replaces the file signature and
+    query() goes straight to the indexed target_conditions table.
+    """
+    def __init__(self, path=DB_PATH, store=None):
+        self.path = path
+        self.store = store
+        self.products = []
+        self.index = {}
+        self._signature = None
+        self._compat = None
+        self._lock = threading.Lock()
+
+    def _file_signature(self):
+        if self.store is not None:
+            return self.store.revision()
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def _build_index(self, products):
+        index = {}
+        for i, product in enumerate(products):
+            conditions = product.get('target_condition', {})
+            materials = {_normalize(m) for m in conditions.get('material_category', [])}
+            finishes = {_normalize(f) for f in conditions.get('finish_type', [])}
+            for m in materials:
+                for f in finishes:
+                    index.setdefault((m, f), []).append(i)
+        return index
+
+    def refresh(self):
+        """
+        Reloads the catalog if the underlying file changed since the last load.
+        """
+        signature = self._file_signature()
+        if signature == self._signature:
+            return
+        with self._lock:
+            if signature == self._signature:
+                return
+            if self.store is not None:
+                products = self.store.all()
+            elif signature is None:
+                products = []
+            else:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    products = json.load(f)
+            self.index = self._build_index(products)
+            self.products = products
+            self._compat = None
+            self._signature = signature
+
+    def invalidate(self):
+        self._signature = None
+
+    def all(self):
+        self.refresh()
+        return self.products
+
+    def query(self, material, finish):
+        if self.store is not None:
+            return self.store.query(material, finish)
+        self.refresh()
+        products = self.products
+        return [products[i] for i in self.index.get((_normalize(material), _normalize(finish)), [])]
+
+    def compatibility_matrix(self):
+        """
+        Returns a [num_products, num_materials * num_finishes] float32 matrix where
+        cell (p, m * num_finishes + f) is 1 if product p targets material m with finish f.
+        Labels outside MATERIALS/FINISHES (e.g. "Sandblast") are ignored.
+        """
+        self.refresh()
+        if self._compat is not None:
+            return self._compat
+
+        mat_pos = {_normalize(m): i for i, m in enumerate(MATERIALS)}
+        fin_pos = {_normalize(f): i for i, f in enumerate(FINISHES)}
+        compat = np.zeros((len(self.products), len(MATERIALS) * len(FINISHES)), dtype=np.float32)
+        for (m, f), product_ids in self.index.items():
+            if m in mat_pos and f in fin_pos:
+                compat[product_ids, mat_pos[m] * len(FINISHES) + fin_pos[f]] = 1.0
+        self._compat = compat
+        return compat
+
+    def rank(self, material_probs, finish_probs, top_k=3):
+        """
+        Ranks products by expected match: the joint material x finish probability mass
+        that falls on each product's target conditions. Returns up to top_k
+        {"product", "score"} dicts sorted by descending score.
+        """
+        compat = self.compatibility_matrix()
+        if compat.shape[0] == 0 or top_k <= 0:
+            return []
+
+        joint = np.outer(_prob_vector(material_probs, MATERIALS), _prob_vector(finish_probs, FINISHES))
+        scores = compat @ joint.ravel()
+
+        k = min(top_k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        # Ties keep catalog order
+        top = top[np.lexsort((top, -scores[top]))]
+        return [{"product": self.products[i], "score": float(scores[i])} for i in top]
+
+
+_catalog = None
+
+
+_json_write_lock = threading.Lock()
+
+
+def get_catalog():
+    global _catalog
+    if _catalog is None:
+        store = None
+        if db_backend() == "sqlite":
+            created = not os.path.exists(SQLITE_PATH)
+            store = SQLiteProductStore(SQLITE_PATH)
+            if not store.all():
+                # VSAMS_DB_BACKEND=sqlite before any import: an empty store would make every recommendation empty.
+                # Only a new database is filled automatically, so deleted products do not come back.
+                source = json_catalog_path()
+                if created and os.path.exists(source):
+                    count = store.import_json(source)
+                    print(f"Product store {SQLITE_PATH} was empty; imported {count} products from {source}")
+                else:
+                    print(f"Warning: product store {SQLITE_PATH} is empty. "
+                          f"Import a catalog with `python -m vsams.utils.product_store --import <catalog.json>`")
+        _catalog = ProductCatalog(DB_PATH, store=store)
+    return _catalog
+
 
 def load_db():
-    if not os.path.exists(DB_PATH):
-        return []
-    with open(DB_PATH, 'r', encoding='utf-8') as f:
-        return json.load(f)
+    # Return a copy so callers can append without touching the cached catalog
+    return list(get_catalog().all())
+
+def _write_json(data):
+    # Write to a temp file and swap it in so readers never see a half-written file
+    tmp = DB_PATH + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+    os.replace(tmp, DB_PATH)
 
 def save_db(data):
     """
-    Saves the list of products back to the JSON file.
+    Saves the list of products (replacing the whole catalog).
+    Prefer upsert_product / delete_product for single-product edits.
     """
-    with open(DB_PATH, 'w', encoding='utf-8') as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
+    catalog = get_catalog()
+    if catalog.store is not None:
+        catalog.store.replace_all(data)
+    else:
+        with _json_write_lock:
+            _write_json(data)
+    catalog.invalidate()
+
+def upsert_product(product):
+    """
+    Adds a product or replaces the one with the same id.
+    On SQLite this is a single-row transaction, so concurrent admins do not lose writes.
+    """
+    catalog = get_catalog()
+    if catalog.store is not None:
+        catalog.store.upsert(product)
+    else:
+        with _json_write_lock:
+            catalog.invalidate()
+            products = list(catalog.all())
+            ids = [p.get('id') for p in products]
+            if product.get('id') in ids:
+                products[ids.index(product.get('id'))] = product
+            else:
+                products.append(product)
+            _write_json(products)
+    catalog.invalidate()
+
+def delete_product(product_id):
+    catalog = get_catalog()
+    if catalog.store is not None:
+        catalog.store.delete(product_id)
+    else:
+        with _json_write_lock:
+            catalog.invalidate()
+            _write_json([p for p in catalog.all() if p.get('id') != product_id])
+    catalog.invalidate()
+
+
+def recommend_from_neighbors(neighbors):
+    """
+    Returns products for the most similar previously labeled surfaces.
+    neighbors: [(score, meta), ...] from FeatureIndex.search, most similar first.
+    """
+    catalog = get_catalog()
+    by_id = {p['id']: p for p in catalog.all() if p.get('id') is not None}
+    for _, meta in neighbors:
+        # Neighbors without a product_id fall through to the material/finish lookup
+        product_id = meta.get('product_id')
+        if product_id is not None and product_id in by_id:
+            return [by_id[product_id]]
+        if 'material' in meta and 'finish' in meta:
+            matches = catalog.query(meta['material'], meta['finish'])
+            if matches:
+                return matches
+    return []
 
 
-def query_recommendation(ai_material, ai_finish):
+def query_recommendation(ai_material, ai_finish, neighbors=None):
     """
     Returns a list of recommended products based on AI prediction.
+    If nothing matches, falls back on the products of the nearest labeled
+    surfaces (neighbors) before the generic default.
     """
-    db = load_db()
-    recommendations = []
-    
-    for product in db:
-        conditions = product.get('target_condition', {})
-        target_materials = conditions.get('material_category', [])
-        target_finishes = conditions.get('finish_type', [])
-        
-        # Simple logical matching: if material matches AND finish matches, it's a candidate
-        # We can implement fuzzy matching or fallback logic here
-        
-        # Material matching (Case insensitive)
-        mat_match = any(m.lower() == ai_material.lower() for m in target_materials)
-        
-        # Finish matching (Case insensitive)
-        fin_match = any(f.lower() == ai_finish.lower() for f in target_finishes)
-        
-        if mat_match and fin_match:
-            recommendations.append(product)
-            
+    catalog = get_catalog()
+    recommendations = catalog.query(ai_material, ai_finish)
+
+    if not recommendations and neighbors:
+        recommendations = recommend_from_neighbors(neighbors)
+
     # Fallback: if no exact match, return at least one default product
-    if not recommendations and db:
-         # Return a generic one (e.g., the first one) but mark it as 'Generic Recommendation'
-        return [db[0]]
-        
+    if not recommendations and catalog.all():
+        # Return a generic one (e.g., the first one) but mark it as 'Generic Recommendation'
+        return [catalog.products[0]]
+
     return recommendations
+
+
+def rank_recommendations(material_probs, finish_probs, top_k=3):
+    """
+    Returns the top_k products with scores based on full softmax outputs.
+    """
+    return get_catalog().rank(material_probs, finish_probs, top_k=top_k)
@@ -0,0 +1,169 @@
+"""
+Deduplication index for the labeling ingest path.
+
+- Exact duplicates: sha1 of the file bytes (dict lookup).
+- Near duplicates: 64-bit difference hash (dHash). Hashes are split into 4 bands
+  of 16 bits; two hashes within Hamming distance 3 always share at least one
+  band, so candidates are found through band lookups instead of a full scan.
+
+The index is a JSON file stored next to the dataset (dataset/ingest_index.json).
+"""
+import hashlib
+import io
+import json
+import os
+
+from PIL import Image, UnidentifiedImageError
+
+NUM_BANDS = 4
+BAND_BITS = 16
+IMAGE_EXTS = ('.png', '.jpg', '.jpeg')
+
+
+def sha1_bytes(data):
+    return hashlib.sha1(data).hexdigest()
+
+
+def dhash(image, hash_size=8):
+    """
+    64-bit difference hash of a PIL image, as an int.
+    """
+    gray = image.convert("L").resize((hash_size + 1, hash_size), Image.BILINEAR)
+    pixels = list(gray.getdata())
+    value = 0
+    for row in range(hash_size):
+        for col in range(hash_size):
+            left = pixels[row * (hash_size + 1) + col]
+            right = pixels[row * (hash_size + 1) + col + 1]
+            value = (value << 1) | (1 if left > right else 0)
+    return value
+
+
+def file_hashes(path):
+    """
+    (sha1, dhash) of an image file; dhash is None if the file is not a readable image.
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            phash = dhash(img)
+    except Exception:
+        phash = None
+    return sha1_bytes(data), phash
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+def bands(value):
+    mask = (1 << BAND_BITS) - 1
+    return [(i, (value >> (i * BAND_BITS)) & mask) for i in range(NUM_BANDS)]
+
+
+class IngestIndex:
+    def __init__(self, path, max_distance=3):
+        self.path = path
+        # Band lookup only guarantees recall up to NUM_BANDS - 1 differing bits
+        self.max_distance = min(max_distance, NUM_BANDS - 1)
+        self.by_sha = {}
+        self.by_phash = {}
+        self.band_index = {}
+        self._stamp = None
+        self._load()
+
+    def _file_stamp(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def reload_if_changed(self):
+        """
+        Re-reads the file if another process (e.g. utils/download_datasets.py) saved it.
+        """
+        if self._file_stamp() != self._stamp:
+            self.by_sha, self.by_phash, self.band_index = {}, {}, {}
+            self._load()
+
+    def _load(self):
+        self._stamp = self._file_stamp()
+        if self._stamp is None:
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        self.by_sha = data.get("sha1", {})
+        for phash_hex, path in data.get("phash", {}).items():
+            self._index_phash(int(phash_hex, 16), path)
+
+    def _index_phash(self, phash, path):
+        self.by_phash[phash] = path
+        for band in bands(phash):
+            self.band_index.setdefault(band, set()).add(phash)
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        data = {"sha1": self.by_sha, "phash": {f"{h:016x}": p for h, p in self.by_phash.items()}}
+        with open(self.path + ".tmp", 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(self.path + ".tmp", self.path)
+        self._stamp = self._file_stamp()
+
+    def __len__(self):
+        return len(self.by_sha)
+
+    def find_near(self, phash):
+        candidates = set()
+        for band in bands(phash):
+            candidates |= self.band_index.get(band, set())
+        best = None
+        for other in candidates:
+            dist = hamming(phash, other)
+            if dist <= self.max_distance and (best is None or dist < best[0]):
+                best = (dist, other)
+        return (self.by_phash[best[1]], best[0]) if best else (None, None)
+
+    def check(self, data):
+        """
+        Returns (status, existing_path, sha1, phash) for raw image bytes, where
+        status is "duplicate", "near_duplicate", "new" or "invalid" (not a readable image).
+        """
+        sha = sha1_bytes(data)
+        if sha in self.by_sha:
+            return "duplicate", self.by_sha[sha], sha, None
+
+        try:
+            with Image.open(io.BytesIO(data)) as img:
+                phash = dhash(img)
+        except (UnidentifiedImageError, OSError):
+            return "invalid", None, sha, None
+        existing, _ = self.find_near(phash)
+        if existing is not None:
+            return "near_duplicate", existing, sha, phash
+        return "new", None, sha, phash
+
+    def add(self, sha, phash, path):
+        self.by_sha[sha] = path
+        if phash is not None:
+            self._index_phash(phash, path)
+
+    def add_file(self, path):
+        sha, phash = file_hashes(path)
+        if sha not in self.by_sha:
+            self.add(sha, phash, path)
+
+    def rebuild(self, train_dir):
+        """
+        Re-indexes every image under train_dir (e.g. after DTD/MINC bootstrapping).
+        """
+        self.by_sha, self.by_phash, self.band_index = {}, {}, {}
+        for class_name in sorted(os.listdir(train_dir)) if os.path.exists(train_dir) else []:
+            class_dir = os.path.join(train_dir, class_name)
+            if not os.path.isdir(class_dir):
+                continue
+            for name in sorted(os.listdir(class_dir)):
+                if name.lower().endswith(IMAGE_EXTS):
+                    self.add_file(os.path.join(class_dir, name))
+        self.save()
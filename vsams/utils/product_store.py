@@ -0,0 +1,181 @@
+"""
+SQLite product store (stdlib sqlite3) used by db_handler instead of database.json.
+
+- products: one row per product id, the product dict stored as JSON, plus its
+  catalog position so ordering matches the JSON file.
+- target_conditions: one (material, finish) row per targeted pair, indexed so
+  query() is a single index lookup instead of a scan over every product.
+- meta.revision: bumped by every write so in-memory caches (ProductCatalog)
+  know when to reload, including writes from other processes.
+
+The database runs in WAL mode: readers never block the writer, and concurrent
+writers are serialized by BEGIN IMMEDIATE instead of overwriting each other.
+
+One-time import of the JSON catalog:
+
+    python -m vsams.utils.product_store --import database.json
+"""
+import argparse
+import json
+import os
+import sqlite3
+import threading
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS products (
+    id TEXT PRIMARY KEY,
+    position INTEGER NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS target_conditions (
+    product_id TEXT NOT NULL REFERENCES products(id) ON DELETE CASCADE,
+    material TEXT NOT NULL,
+    finish TEXT NOT NULL,
+    PRIMARY KEY (material, finish, product_id)
+);
+CREATE INDEX IF NOT EXISTS idx_target_product ON target_conditions(product_id);
+CREATE INDEX IF NOT EXISTS idx_products_position ON products(position);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO meta(key, value) VALUES ('revision', 0);
+"""
+
+
+def _normalize(value):
+    return str(value).strip().lower()
+
+
+def _target_pairs(product):
+    conditions = product.get('target_condition', {})
+    materials = {_normalize(m) for m in conditions.get('material_category', [])}
+    finishes = {_normalize(f) for f in conditions.get('finish_type', [])}
+    return [(m, f) for m in materials for f in finishes]
+
+
+class SQLiteProductStore:
+    """
+    Thread-safe access to the product database (one connection per thread).
+    """
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._connect().executescript(SCHEMA)
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # isolation_level=None: autocommit, transactions are opened explicitly
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+        return conn
+
+    def _write(self, fn):
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = fn(conn)
+            conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'revision'")
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return result
+
+    @staticmethod
+    def _upsert(conn, product):
+        product_id = product.get('id')
+        if not product_id:
+            raise ValueError("Product id is required")
+        conn.execute(
+            "INSERT INTO products(id, position, data) "
+            "VALUES (?, (SELECT COALESCE(MAX(position), -1) + 1 FROM products), ?) "
+            "ON CONFLICT(id) DO UPDATE SET data = excluded.data",
+            (product_id, json.dumps(product, ensure_ascii=False)),
+        )
+        conn.execute("DELETE FROM target_conditions WHERE product_id = ?", (product_id,))
+        conn.executemany(
+            "INSERT INTO target_conditions(product_id, material, finish) VALUES (?, ?, ?)",
+            [(product_id, m, f) for m, f in _target_pairs(product)],
+        )
+
+    def revision(self):
+        return self._connect().execute("SELECT value FROM meta WHERE key = 'revision'").fetchone()[0]
+
+    def all(self):
+        rows = self._connect().execute("SELECT data FROM products ORDER BY position").fetchall()
+        return [json.loads(data) for (data,) in rows]
+
+    def get(self, product_id):
+        row = self._connect().execute("SELECT data FROM products WHERE id = ?", (product_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def query(self, material, finish):
+        rows = self._connect().execute(
+            "SELECT p.data FROM target_conditions t JOIN products p ON p.id = t.product_id "
+            "WHERE t.material = ? AND t.finish = ? ORDER BY p.position",
+            (_normalize(material), _normalize(finish)),
+        ).fetchall()
+        return [json.loads(data) for (data,) in rows]
+
+    def upsert(self, product):
+        """
+        Inserts a new product or replaces the one with the same id (keeping its position).
+        """
+        self._write(lambda conn: self._upsert(conn, product))
+
+    def upsert_many(self, products):
+        def fn(conn):
+            for product in products:
+                self._upsert(conn, product)
+        self._write(fn)
+
+    def delete(self, product_id):
+        """
+        Returns True if a product was removed.
+        """
+        return self._write(lambda conn: conn.execute("DELETE FROM products WHERE id = ?", (product_id,)).rowcount > 0)
+
+    def replace_all(self, products):
+        """
+        Replaces the whole catalog in one transaction (save_db semantics).
+        """
+        def fn(conn):
+            conn.execute("DELETE FROM products")
+            for product in products:
+                self._upsert(conn, product)
+        self._write(fn)
+
+    def import_json(self, json_path):
+        with open(json_path, 'r', encoding='utf-8') as f:
+            products = json.load(f)
+        self.replace_all(products)
+        return len(products)
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+def main():
+    from vsams.utils.db_handler import SQLITE_PATH, json_catalog_path
+
+    parser = argparse.ArgumentParser(description="V-SAMS SQLite product store")
+    parser.add_argument("--import", dest="import_path", default=json_catalog_path(),
+                        help="JSON catalog to import (default: the repository's database.json)")
+    parser.add_argument("--db", default=SQLITE_PATH, help="SQLite database path")
+    args = parser.parse_args()
+
+    count = SQLiteProductStore(args.db).import_json(args.import_path)
+    print(f"Imported {count} products from {args.import_path} into {args.db}")
+
+
+if __name__ == "__main__":
+    main()
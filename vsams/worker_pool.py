@@ -0,0 +1,244 @@
+"""
+Multi-process CPU inference with shared-memory model weights.
+
+One Python process cannot keep a many-core CPU busy: intra-op threads contend for
+the same batch and the per-op overhead stays serial. InferenceWorkerPool runs N
+worker processes, each with torch.set_num_threads(threads_per_worker), and splits
+every request across them.
+
+The weights are moved to shared memory once (model.share_memory()) and handed to
+the workers through torch.multiprocessing, so each worker maps the same pages
+instead of holding its own copy of the ~100 MB ResNet50 state. Input batches are
+uint8 tensors, which torch.multiprocessing also passes through shared memory.
+
+Eager FP32 models only: TorchScript/ONNX artifacts and INT8 modules keep their
+weights outside parameters() and cannot be shared this way.
+
+Pick processes x threads for the host with:
+
+    python -m vsams.worker_pool --checkpoint checkpoints/v_sams_model.pth
+"""
+import argparse
+import itertools
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+import torch
+import torch.multiprocessing as mp
+
+from vsams.inference import format_result, uint8_to_input
+from vsams.labels import MATERIALS, FINISHES
+from vsams.preprocess import decode_image
+
+
+def _worker_loop(model, num_threads, task_queue, result_queue):
+    torch.set_num_threads(num_threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass
+    model.eval()
+
+    while True:
+        task = task_queue.get()
+        if task is None:
+            break
+        task_id, batch = task
+        try:
+            with torch.inference_mode():
+                mat_logits, fin_logits = model(uint8_to_input(batch))
+                mat_probs = torch.softmax(mat_logits.float(), dim=1).numpy()
+                fin_probs = torch.softmax(fin_logits.float(), dim=1).numpy()
+            result_queue.put((task_id, mat_probs, fin_probs, None))
+        except Exception as e:
+            result_queue.put((task_id, None, None, f"{type(e).__name__}: {e}"))
+
+
+class InferenceWorkerPool:
+    """
+    Drop-in for BatchPredictor.predict / predict_probs backed by worker processes.
+
+    Images may be uint8 [H, W, 3] arrays (vsams.preprocess.decode_image output),
+    PIL Images, paths or raw bytes; the latter are decoded in the calling thread.
+    """
+    # Seconds between worker liveness checks while waiting for results
+    poll_interval = 1.0
+
+    def __init__(self, model, num_workers=2, threads_per_worker=None, batch_size=32, input_size=224):
+        if not any(True for _ in model.parameters()):
+            raise ValueError("InferenceWorkerPool needs an eager model with parameters (not TorchScript/ONNX/INT8)")
+        self.num_workers = num_workers
+        self.threads_per_worker = threads_per_worker or max(1, (os.cpu_count() or 1) // num_workers)
+        self.batch_size = batch_size
+        self.input_size = input_size
+        self.precision = "fp32"
+
+        model = model.cpu().eval()
+        model.share_memory()
+
+        # spawn: forking after torch has started its OpenMP pool can deadlock
+        ctx = mp.get_context("spawn")
+        self._tasks = ctx.Queue()
+        self._results = ctx.Queue()
+        self._processes = [
+            ctx.Process(target=_worker_loop, args=(model, self.threads_per_worker, self._tasks, self._results), daemon=True)
+            for _ in range(num_workers)
+        ]
+        for p in self._processes:
+            p.start()
+
+        self._futures = {}
+        self._lock = threading.Lock()
+        self._broken = None
+        self._closing = False
+        self._ids = itertools.count()
+        self._collector = threading.Thread(target=self._collect, name="vsams-pool-results", daemon=True)
+        self._collector.start()
+
+    def _collect(self):
+        while True:
+            try:
+                item = self._results.get(timeout=self.poll_interval)
+            except queue.Empty:
+                if not self._closing and not all(p.is_alive() for p in self._processes):
+                    self._fail_pending(RuntimeError("An inference worker process died"))
+                    break
+                continue
+            if item is None:
+                break
+            task_id, mat_probs, fin_probs, error = item
+            with self._lock:
+                future = self._futures.pop(task_id, None)
+            if future is None:
+                continue
+            if error is not None:
+                future.set_exception(RuntimeError(error))
+            else:
+                future.set_result((mat_probs, fin_probs))
+
+    def _fail_pending(self, error):
+        with self._lock:
+            self._broken = error
+            futures, self._futures = self._futures, {}
+        for future in futures.values():
+            future.set_exception(error)
+
+    def _submit(self, batch):
+        future = Future()
+        task_id = next(self._ids)
+        with self._lock:
+            if self._broken is not None:
+                raise self._broken
+            self._futures[task_id] = future
+        self._tasks.put((task_id, torch.from_numpy(np.ascontiguousarray(batch))))
+        return future
+
+    def _to_uint8(self, images):
+        if isinstance(images, np.ndarray) and images.ndim == 4:
+            return images
+        if len(images) == 0:
+            return np.zeros((0, self.input_size, self.input_size, 3), dtype=np.uint8)
+        return np.stack([img if isinstance(img, np.ndarray) else decode_image(img, self.input_size) for img in images])
+
+    def predict_probs(self, images):
+        """
+        Returns (material_probs [N, 6], finish_probs [N, 7]) as float32 numpy arrays.
+        Requests are split so every worker gets a share (at most batch_size per task).
+        Raises RuntimeError if a worker process dies while the request is pending.
+        """
+        batch = self._to_uint8(images)
+        if len(batch) == 0:
+            return np.zeros((0, len(MATERIALS)), np.float32), np.zeros((0, len(FINISHES)), np.float32)
+
+        chunk = min(self.batch_size, -(-len(batch) // self.num_workers))
+        futures = [self._submit(batch[i:i + chunk]) for i in range(0, len(batch), chunk)]
+        results = [f.result() for f in futures]
+        return np.concatenate([r[0] for r in results]), np.concatenate([r[1] for r in results])
+
+    def predict(self, images):
+        mat_probs, fin_probs = self.predict_probs(images)
+        return [format_result(m, f) for m, f in zip(mat_probs.tolist(), fin_probs.tolist())]
+
+    def predict_one(self, image):
+        return self.predict([image])[0]
+
+    def close(self):
+        self._closing = True
+        for _ in self._processes:
+            self._tasks.put(None)
+        for p in self._processes:
+            p.join(timeout=10)
+        self._results.put(None)
+        self._collector.join(timeout=10)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def candidate_configs(cores=None):
+    """
+    (processes, threads) pairs that use the whole core budget, powers of two.
+    """
+    cores = cores or os.cpu_count() or 1
+    configs = []
+    procs = 1
+    while procs <= cores:
+        configs.append((procs, max(1, cores // procs)))
+        procs *= 2
+    return configs
+
+
+def measure_throughput(model, num_workers, threads_per_worker, batch_size=32, num_images=256, rounds=3, input_size=224):
+    images = np.random.randint(0, 256, size=(num_images, input_size, input_size, 3), dtype=np.uint8)
+    with InferenceWorkerPool(model, num_workers, threads_per_worker, batch_size=batch_size, input_size=input_size) as pool:
+        # Warm-up: worker start-up and first-call allocations are not measured
+        pool.predict_probs(images[:num_workers * 2])
+        start = time.perf_counter()
+        for _ in range(rounds):
+            pool.predict_probs(images)
+        elapsed = time.perf_counter() - start
+    return num_images * rounds / elapsed
+
+
+def autotune(model, configs=None, batch_size=32, num_images=256, rounds=3):
+    """
+    Benchmarks every (processes, threads) config. Returns (best, [(procs, threads, images/sec), ...]).
+    """
+    results = []
+    for procs, threads in configs or candidate_configs():
+        ips = measure_throughput(model, procs, threads, batch_size=batch_size, num_images=num_images, rounds=rounds)
+        print(f"  {procs:>3} processes x {threads:>3} threads: {ips:8.1f} images/sec")
+        results.append((procs, threads, ips))
+    best = max(results, key=lambda r: r[2])
+    return best, results
+
+
+def main():
+    from vsams.inference import load_classifier
+
+    parser = argparse.ArgumentParser(description="Pick processes x threads for CPU inference on this host")
+    parser.add_argument("--checkpoint", default='checkpoints/v_sams_model.pth')
+    parser.add_argument("--cores", type=int, default=None, help="Core budget (default: all CPUs)")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--images", type=int, default=256, help="Images per timed round")
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    model, status = load_classifier(args.checkpoint, device=torch.device("cpu"))
+    print(f"Model: {status} | cores: {args.cores or os.cpu_count()}")
+    (procs, threads, ips), _ = autotune(model, candidate_configs(args.cores), batch_size=args.batch_size,
+                                       num_images=args.images, rounds=args.rounds)
+    print(f"Best: {procs} processes x {threads} threads ({ips:.1f} images/sec)")
+    print(f"  VSAMS_WORKERS={procs} VSAMS_THREADS={threads} python server.py")
+    print(f"  vsams analyze <input> --procs {procs} --threads {threads}")
+
+
+if __name__ == "__main__":
+    main()